@@ -0,0 +1,369 @@
+"""
+Benchmark of webflow-aws publish against moto, a local stand-in of S3, CloudFront and CloudFormation.
+
+A synthetic Webflow-like export (pages linking each other, images, css and js) is generated and published with every
+scenario, each one in a fresh process and a fresh moto backend. For every scenario the wall time, the bytes sent, the
+AWS requests by operation, the peak RSS and the invalidated paths are reported and written to a JSON file, so that
+the results of different versions can be compared.
+
+The artifacts AWS Lambda function is not run by moto: the full-upload scenarios measure the cli side of the publish,
+up to the upload of the package.
+
+    pip3 install -r dev-requirements.txt
+    python3 benchmarks/publish_benchmark.py run --pages 500 --images 200 --output results.json
+"""
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import click
+
+# the scenarios of the benchmark: publish mode, processing stages enabled and if a previous publish is updated
+SCENARIOS = {
+    'full': {'incremental': False},
+    'full-compression': {'incremental': False, 'compression': True},
+    'full-images': {'incremental': False, 'images': True},
+    'incremental-initial': {'incremental': True},
+    'incremental-update': {'incremental': True, 'update': True},
+    'incremental-compression-update': {'incremental': True, 'compression': True, 'update': True}
+}
+RESULTS_VERSION = 1
+BENCHMARK_CONFIGURATION = {
+    'bucket_name': 'webflow-aws-benchmark',
+    'domain_name': 'benchmark.example.com',
+    'CNAMEs': [],
+    'route_53_hosted_zone_id': 'Z0000000000000',
+    'route_53_hosted_zone_name': 'example.com',
+    'stack_name': 'WebflowAwsBenchmark'
+}
+LOREM = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et '
+         'dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip. ')
+
+
+def _random_bytes(rng: random.Random, size: int) -> bytes:
+    return rng.getrandbits(size * 8).to_bytes(size, 'little') if size else b''
+
+
+def _make_image(rng: random.Random, size: int, image_format: str) -> bytes:
+    """
+    :param rng: the random generator
+    :param size: the approximate size of the image in bytes
+    :param image_format: JPEG or PNG
+    :return: a noise image, or random bytes if Pillow is not installed
+    """
+    try:
+        from io import BytesIO
+        from PIL import Image
+    except ImportError:
+        return _random_bytes(rng, size)
+    # noise doesn't compress: the encoded image is about as big as its pixels
+    side = max(int((size / 3) ** 0.5), 8)
+    image = Image.frombytes('RGB', (side, side), _random_bytes(rng, side * side * 3))
+    output = BytesIO()
+    if image_format == 'JPEG':
+        image.save(output, image_format, quality=85)
+    else:
+        image.save(output, image_format)
+    return output.getvalue()
+
+
+def _page_keys(pages: int) -> List[str]:
+    # like Webflow, the pages of the collections are in folders
+    return ['index.html'] + [
+        f'blog/post-{i}.html' if i % 3 == 0 else f'page-{i}.html' for i in range(1, pages)]
+
+
+def _make_page(rng: random.Random, key: str, keys: List[str], image_keys: List[str], size: int, revision: int) -> str:
+    depth = key.count('/')
+    prefix = '../' * depth
+    links = ''.join(f'<a href="{prefix}{link}">{link}</a>' for link in rng.sample(keys, min(len(keys), 10)))
+    images = ''.join(
+        f'<img src="{prefix}{image}" loading="lazy" alt="">'
+        for image in rng.sample(image_keys, min(len(image_keys), 4)))
+    head = (f'<!DOCTYPE html><html data-wf-page="{rng.getrandbits(48):012x}"><head><meta charset="utf-8">'
+            f'<title>{key}</title><link href="{prefix}css/site.webflow.css" rel="stylesheet"></head>'
+            f'<body><nav>{links}</nav><main>{images}')
+    tail = f'</main><!-- revision {revision} --><script src="{prefix}js/webflow.js"></script></body></html>'
+    text = ''
+    while len(head) + len(text) + len(tail) < size:
+        text += f'<p>{LOREM}</p>'
+    return head + text + tail
+
+
+def generate_export(zip_path: str, pages: int, images: int, page_size: int, image_size: int, seed: int,
+                    changed_pages: Optional[List[str]] = None):
+    """
+    Generate a synthetic Webflow export
+
+    :param zip_path: the path of the zip file to create
+    :param pages: the number of html pages
+    :param images: the number of images, one PNG every four JPEG
+    :param page_size: the approximate size of every page in bytes
+    :param image_size: the approximate size of every image in bytes
+    :param seed: the seed of the random generator: the same seed generates the same export
+    :param changed_pages: the keys of the pages to change, to simulate an update of the website
+    """
+    rng = random.Random(seed)
+    keys = _page_keys(pages)
+    image_keys = [f'images/image-{i}.png' if i % 5 == 4 else f'images/image-{i}.jpg' for i in range(images)]
+    changed_pages = set(changed_pages or [])
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for key in keys:
+            zip_file.writestr(key, _make_page(rng, key, keys, image_keys, page_size, int(key in changed_pages)))
+        for key in image_keys:
+            zip_file.writestr(key, _make_image(rng, image_size, 'PNG' if key.endswith('.png') else 'JPEG'))
+        zip_file.writestr('css/site.webflow.css', ''.join(
+            f'.class-{i} {{ margin: {i}px; color: #{rng.getrandbits(24):06x}; }}\n' for i in range(2000)))
+        zip_file.writestr('js/webflow.js', ''.join(
+            f'function f{i}(a, b) {{ return a * {i} + b; }}\n' for i in range(3000)))
+
+
+class RequestCounter(object):
+    """
+    Count the AWS requests and the bytes of the uploaded bodies, from the events of a boto3 session.
+
+    Attributes:
+        requests: Counter       the number of requests by operation (ex. s3.PutObject)
+        bytes_sent: int         the total size of the Body parameters (objects and parts uploaded)
+    """
+
+    def __init__(self):
+        self.requests: Counter = Counter()
+        self.bytes_sent: int = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_body_size(body) -> int:
+        if body is None:
+            return 0
+        if isinstance(body, str):
+            return len(body.encode('utf-8'))
+        try:
+            return len(body)
+        except TypeError:
+            pass
+        try:
+            position = body.tell()
+            body.seek(0, os.SEEK_END)
+            size = body.tell() - position
+            body.seek(position)
+            return size
+        except (AttributeError, OSError):
+            return 0
+
+    def on_parameter_build(self, params: Dict, model, event_name: str, **kwargs):
+        service = event_name.split('.')[1]
+        size = self._get_body_size(params.get('Body'))
+        with self._lock:
+            self.requests[f'{service}.{model.name}'] += 1
+            self.bytes_sent += size
+
+
+def _get_peak_rss_kb(who: int) -> int:
+    # ru_maxrss is in bytes on macOS, in KB elsewhere
+    peak_rss = resource.getrusage(who).ru_maxrss
+    return peak_rss // 1024 if sys.platform == 'darwin' else peak_rss
+
+
+def run_scenario(name: str, zip_path: str, updated_zip_path: str) -> Dict:
+    """
+    Publish the export with a scenario, inside a moto backend
+
+    :param name: the name of the scenario
+    :param zip_path: the Webflow export
+    :param updated_zip_path: the updated Webflow export, published after zip_path by the update scenarios
+    :return: the metrics of the publish
+    """
+    for variable in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SECURITY_TOKEN', 'AWS_SESSION_TOKEN'):
+        os.environ[variable] = 'testing'
+    import boto3
+    from moto import mock_aws
+
+    from webflow_aws.global_variables import AWS_REGION_NAME
+    from webflow_aws.utils.aws_utils import DISTRIBUTION_ID_OUTPUT_KEY, CachedSession
+    from webflow_aws.utils.infra import compute_infra_fingerprint, save_deployed_fingerprint
+    from webflow_aws.utils.localization import LOCALIZED_PAGES_CONFIGURATION_KEY
+    from webflow_aws.utils.redirects import REDIRECTS_CONFIGURATION_KEY
+    from webflow_aws.utils.site_publisher import publish_site
+
+    scenario = SCENARIOS[name]
+    configuration = dict(BENCHMARK_CONFIGURATION)
+    configuration['compression'] = {'enabled': scenario.get('compression', False)}
+    configuration['images'] = {'enabled': scenario.get('images', False)}
+    with mock_aws(), tempfile.TemporaryDirectory() as folder:
+        boto_session = boto3.session.Session(region_name=AWS_REGION_NAME)
+        counter = RequestCounter()
+        boto_session.events.register('before-parameter-build', counter.on_parameter_build)
+        session = CachedSession(boto_session)
+        s3_client = session.client('s3')
+        s3_client.create_bucket(Bucket=configuration['bucket_name'])
+        cloudfront_client = session.client('cloudfront')
+        distribution_id = cloudfront_client.create_distribution(DistributionConfig={
+            'CallerReference': name, 'Comment': '', 'Enabled': True,
+            'Origins': {'Quantity': 1, 'Items': [{
+                'Id': 'origin', 'DomainName': f'{configuration["bucket_name"]}.s3.amazonaws.com',
+                'OriginPath': '/src/prod', 'S3OriginConfig': {'OriginAccessIdentity': ''}}]},
+            'DefaultCacheBehavior': {
+                'TargetOriginId': 'origin', 'ViewerProtocolPolicy': 'redirect-to-https', 'MinTTL': 0,
+                'ForwardedValues': {'QueryString': False, 'Cookies': {'Forward': 'none'}}}
+        })['Distribution']['Id']
+        session.client('cloudformation').create_stack(StackName=configuration['stack_name'], TemplateBody=json.dumps({
+            'Resources': {'Placeholder': {'Type': 'AWS::S3::Bucket'}},
+            'Outputs': {DISTRIBUTION_ID_OUTPUT_KEY: {'Value': distribution_id}}
+        }))
+        # the infrastructure is considered deployed: cdk is never run. publish_site adds the redirects and the
+        # translated pages of the website, none here, to the configuration
+        deployed_configuration = dict(configuration, **{
+            REDIRECTS_CONFIGURATION_KEY: {}, LOCALIZED_PAGES_CONFIGURATION_KEY: None})
+        save_deployed_fingerprint(
+            s3_client, configuration['bucket_name'], compute_infra_fingerprint(deployed_configuration), folder=folder)
+        site_zip_path = os.path.join(folder, 'website.zip')
+        if scenario.get('update'):
+            os.symlink(os.path.abspath(zip_path), site_zip_path)
+            publish_site(session, configuration, folder=folder, incremental=scenario['incremental'], quiet=True)
+            os.remove(site_zip_path)
+            zip_path = updated_zip_path
+        os.symlink(os.path.abspath(zip_path), site_zip_path)
+        invalidations_before = cloudfront_client.list_invalidations(
+            DistributionId=distribution_id)['InvalidationList'].get('Items', [])
+        counter.requests.clear()
+        counter.bytes_sent = 0
+        start = time.perf_counter()
+        release_id = publish_site(
+            session, configuration, folder=folder, incremental=scenario['incremental'], quiet=True)
+        wall_seconds = time.perf_counter() - start
+        # the counters are read before listing the invalidations, that are requests of the benchmark
+        requests = dict(counter.requests)
+        bytes_sent = counter.bytes_sent
+        invalidation_paths = []
+        before_ids = set(invalidation['Id'] for invalidation in invalidations_before)
+        for invalidation in cloudfront_client.list_invalidations(
+                DistributionId=distribution_id)['InvalidationList'].get('Items', []):
+            if invalidation['Id'] not in before_ids:
+                invalidation_paths += cloudfront_client.get_invalidation(
+                    DistributionId=distribution_id, Id=invalidation['Id'])[
+                    'Invalidation']['InvalidationBatch']['Paths'].get('Items', [])
+    return {
+        'name': name,
+        'release_id': release_id,
+        'wall_seconds': round(wall_seconds, 3),
+        'bytes_sent': bytes_sent,
+        'requests': sum(requests.values()),
+        'requests_by_operation': dict(sorted(requests.items())),
+        'peak_rss_kb': _get_peak_rss_kb(resource.RUSAGE_SELF),
+        'peak_rss_workers_kb': _get_peak_rss_kb(resource.RUSAGE_CHILDREN),
+        'invalidation_paths': len(invalidation_paths),
+        'invalidation_wildcard': '/*' in invalidation_paths
+    }
+
+
+def format_results(results: List[Dict]) -> str:
+    """
+    :param results: the metrics of every scenario
+    :return: a table with one row per scenario
+    """
+    rows = [('SCENARIO', 'TIME', 'SENT', 'REQUESTS', 'PEAK RSS', 'INVALIDATED')] + [(
+        result['name'], f'{result["wall_seconds"]:.2f}s', f'{result["bytes_sent"] / 1024 / 1024:.1f} MB',
+        str(result['requests']), f'{max(result["peak_rss_kb"], result["peak_rss_workers_kb"]) / 1024:.0f} MB',
+        '/*' if result['invalidation_wildcard'] else str(result['invalidation_paths'])) for result in results]
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+    return '\n'.join('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command(short_help='Run the benchmark')
+@click.option('--pages', type=click.IntRange(min=1), default=200, show_default=True, help='Number of html pages')
+@click.option('--images', type=click.IntRange(min=0), default=100, show_default=True, help='Number of images')
+@click.option('--page-size', type=click.IntRange(min=0), default=20 * 1024, show_default=True,
+              help='Approximate size of every page in bytes')
+@click.option('--image-size', type=click.IntRange(min=0), default=100 * 1024, show_default=True,
+              help='Approximate size of every image in bytes')
+@click.option('--changed-ratio', type=click.FloatRange(min=0, max=1), default=0.1, show_default=True,
+              help='Ratio of the pages changed by the update scenarios')
+@click.option('--seed', type=int, default=0, show_default=True, help='Seed of the generated export')
+@click.option('--scenario', 'scenarios', type=click.Choice(list(SCENARIOS)), multiple=True,
+              help='Scenario to run, can be repeated. By default all the scenarios are run')
+@click.option('--output', type=click.Path(dir_okay=False), default='benchmark-results.json', show_default=True,
+              help='The JSON file where the results are written')
+@click.option('--verbose', is_flag=True, default=False, help='Show the output of the publish')
+def run(pages: int, images: int, page_size: int, image_size: int, changed_ratio: float, seed: int,
+        scenarios: List[str], output: str, verbose: bool):
+    """
+    Generate a synthetic Webflow export and publish it with every scenario, each one in a new process
+    """
+    scenarios = list(scenarios) if scenarios else list(SCENARIOS)
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        if 'full-images' in scenarios:
+            click.echo('Pillow is not installed: the images are random bytes and full-images is skipped', err=True)
+            scenarios.remove('full-images')
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        zip_path = os.path.join(work_dir, 'export.zip')
+        updated_zip_path = os.path.join(work_dir, 'export-updated.zip')
+        generate_export(zip_path, pages, images, page_size, image_size, seed)
+        changed_pages = random.Random(seed).sample(_page_keys(pages), int(pages * changed_ratio))
+        generate_export(updated_zip_path, pages, images, page_size, image_size, seed, changed_pages=changed_pages)
+        click.echo(f'Generated an export of {pages} pages and {images} images: '
+                   f'{os.path.getsize(zip_path) / 1024 / 1024:.1f} MB')
+        for name in scenarios:
+            click.echo(f'Running {name}')
+            result_path = os.path.join(work_dir, f'{name}.json')
+            # a new process for every scenario, so that its peak RSS is measured alone
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'scenario', name, zip_path, updated_zip_path,
+                 result_path],
+                check=True, stdout=None if verbose else subprocess.DEVNULL)
+            with open(result_path) as f:
+                results.append(json.load(f))
+    with open(output, 'w') as f:
+        json.dump({
+            'version': RESULTS_VERSION,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'parameters': {
+                'pages': pages, 'images': images, 'page_size': page_size, 'image_size': image_size,
+                'changed_ratio': changed_ratio, 'seed': seed},
+            'scenarios': results
+        }, f, indent=2)
+    click.echo('')
+    click.echo(format_results(results))
+    click.echo(f'\nResults written in {output}')
+
+
+@cli.command(hidden=True)
+@click.argument('name', type=click.Choice(list(SCENARIOS)))
+@click.argument('zip_path')
+@click.argument('updated_zip_path')
+@click.argument('result_path')
+def scenario(name: str, zip_path: str, updated_zip_path: str, result_path: str):
+    """
+    Run a single scenario and write its metrics in RESULT_PATH
+    """
+    result = run_scenario(name, zip_path, updated_zip_path)
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+
+if __name__ == '__main__':
+    # the benchmark runs from a clone of the repository
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    cli()
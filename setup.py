@@ -12,9 +12,14 @@ setup(
     author='odfdata',
     author_email='fc@oracleofde.fi',
     url='https://github.com/odfdata/webflow-aws',
-    packages=find_namespace_packages(),
+    packages=find_namespace_packages(exclude=['benchmarks', 'benchmarks.*', 'tests', 'tests.*']),
     python_requires='>=3.6',
     install_requires=requirements,
+    extras_require={
+        'brotli': ['brotli~=1.0.9'],
+        'images': ['Pillow>=8.4'],
+        'minify': ['rcssmin>=1.1', 'rjsmin>=1.2']
+    },
     include_package_data=True,
     license="Apache License 2.0",
     classifiers=[
@@ -0,0 +1,63 @@
+import hashlib
+
+import pytest
+
+from webflow_aws.utils.artifact import ArtifactObject
+from webflow_aws.utils.blobs import BlobStore, get_blob_key
+from webflow_aws.utils.garbage_collection import collect_garbage
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+BUCKET_NAME = 'example.com-123'
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN'):
+        monkeypatch.setenv(name, 'testing')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET_NAME)
+        yield client
+
+
+def _write_objects(folder, contents):
+    objects = []
+    for key, content in contents.items():
+        path = folder / key
+        path.write_bytes(content)
+        objects.append(ArtifactObject(key=key, path=str(path)))
+    return objects
+
+
+def test_store_uploads_new_contents_once(s3_client, tmp_path):
+    blob_store = BlobStore(s3_client, BUCKET_NAME)
+    objects = _write_objects(tmp_path, {'index.html': b'index', 'about.html': b'about', 'copy.html': b'about'})
+    assert sorted(obj.key for obj in blob_store.store(objects)) == ['about.html', 'index.html']
+    assert blob_store.load_catalog() == {obj.sha256 for obj in objects}
+    objects += _write_objects(tmp_path, {'new.html': b'new'})
+    assert [obj.key for obj in blob_store.store(objects)] == ['new.html']
+    assert blob_store.load_catalog() == {obj.sha256 for obj in objects}
+
+
+def test_store_reads_catalog_instead_of_listing(s3_client, tmp_path):
+    blob_store = BlobStore(s3_client, BUCKET_NAME)
+    sha256 = hashlib.sha256(b'index').hexdigest()
+    # stored before the catalog existed: found by listing the blobs, once
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=get_blob_key(sha256), Body=b'index')
+    assert blob_store.get_stored_hashes() == {sha256}
+    # stored without updating the catalog: the catalog is trusted, the content is uploaded again
+    other_sha256 = hashlib.sha256(b'about').hexdigest()
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=get_blob_key(other_sha256), Body=b'about')
+    objects = _write_objects(tmp_path, {'index.html': b'index', 'about.html': b'about'})
+    assert [obj.key for obj in blob_store.store(objects)] == ['about.html']
+
+
+def test_garbage_collection_rewrites_catalog(s3_client, tmp_path):
+    blob_store = BlobStore(s3_client, BUCKET_NAME)
+    objects = _write_objects(tmp_path, {'index.html': b'index'})
+    blob_store.store(objects)
+    assert collect_garbage(s3_client, BUCKET_NAME, grace_period=0).deleted_blobs == 1
+    assert blob_store.load_catalog() == set()
+    assert [obj.key for obj in blob_store.store(objects)] == ['index.html']
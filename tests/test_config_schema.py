@@ -0,0 +1,84 @@
+import pytest
+
+from webflow_aws.utils.config_schema import validate_configuration
+
+CONFIGURATION = {
+    'CNAMEs': ['www.example.com'],
+    'bucket_name': 'example.com-123',
+    'domain_name': 'example.com',
+    'route_53_hosted_zone_id': 'Z123',
+    'route_53_hosted_zone_name': 'example.com.',
+    'stack_name': 'example-com'
+}
+
+
+def test_valid_configuration():
+    assert validate_configuration(CONFIGURATION) == []
+    assert validate_configuration(dict(
+        CONFIGURATION, edge_runtime='cloudfront_function', invalidation_max_paths=100,
+        compression={'enabled': True, 'encodings': ['br']},
+        staging={'enabled': True, 'domain_name': 'alpha.example.com'},
+        cache_tiers={'fonts': {'extensions': ['woff2'], 'max_age': 31536000}})) == []
+
+
+def test_required_settings():
+    configuration = dict(CONFIGURATION, stack_name=None)
+    del configuration['bucket_name']
+    assert validate_configuration(configuration) == ['bucket_name is required', 'stack_name is required']
+    assert validate_configuration(['example.com']) == ['The configuration must contain the settings of the website']
+
+
+def test_setting_types():
+    assert validate_configuration(dict(
+        CONFIGURATION, CNAMEs='www.example.com', invalidation_max_paths=True, compression={'enabled': 'yes'},
+        images={'webp_quality': '80'}, budgets=10, cache_tiers={'fonts': None})) == [
+        "CNAMEs must be a list, found 'www.example.com'",
+        'invalidation_max_paths must be a number, found True',
+        "compression.enabled must be true or false, found 'yes'",
+        "images.webp_quality must be a number, found '80'",
+        'budgets must be a section with the settings page_weight_kb, image_size_kb, asset_size_kb, broken_links, '
+        'duplicate_assets',
+        'cache_tiers.fonts must be a section with the settings extensions, pattern, max_age, s_maxage, '
+        'stale_while_revalidate, immutable']
+
+
+def test_unknown_settings():
+    assert validate_configuration(dict(CONFIGURATION, bucket='example', staging={'enable': True})) == [
+        'bucket is not a valid setting',
+        'staging.enable is not a valid setting, the settings are enabled, domain_name']
+
+
+def test_setting_values():
+    assert validate_configuration(dict(
+        CONFIGURATION, bucket_name='Example_Bucket', edge_runtime='lambda', performance={'error_ttl': -1},
+        localization={'enabled': True, 'default_locale': 'en', 'locales': ['en', 'it_IT']},
+        storage={'region': 'europe', 'transfer_acceleration': True})) == [
+        'bucket_name Example_Bucket is not a valid S3 bucket name',
+        'edge_runtime must be one of lambda_edge, cloudfront_function',
+        'performance.error_ttl must be 0 or more seconds',
+        'localization.locales it_IT is not a valid locale (ex. it, pt-br)',
+        'localization.locales must not contain the default_locale, served from the root',
+        'storage.region europe is not a valid AWS region']
+
+
+@pytest.mark.parametrize('section', [
+    'artifacts_lambda', 'budgets', 'cache_tiers', 'compression', 'images', 'localization', 'minify', 'performance',
+    'staging', 'storage'])
+def test_empty_section(section):
+    from webflow_aws.utils.analyzer import get_budgets_configuration
+    from webflow_aws.utils.cache_tiers import get_cache_tiers
+    from webflow_aws.utils.compression import get_compression_configuration
+    from webflow_aws.utils.images import get_images_configuration
+    from webflow_aws.utils.localization import get_localization_configuration
+    from webflow_aws.utils.minify import get_minify_configuration
+    from webflow_aws.utils.performance import get_performance_configuration
+    from webflow_aws.utils.stages import get_staging_configuration
+    from webflow_aws.utils.storage import get_storage_configuration
+
+    # a section without settings (ex. `staging:`) is read as null and uses the default values
+    configuration = dict(CONFIGURATION, **{section: None})
+    assert validate_configuration(configuration) == []
+    for getter in (get_budgets_configuration, get_cache_tiers, get_compression_configuration,
+                   get_images_configuration, get_localization_configuration, get_minify_configuration,
+                   get_performance_configuration, get_staging_configuration, get_storage_configuration):
+        assert getter(configuration) == getter(CONFIGURATION)
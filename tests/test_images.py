@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from webflow_aws.utils.artifact import ArtifactObject
+from webflow_aws.utils.images import WEBP_SUFFIX, _process_image, optimize_images
+
+Image = pytest.importorskip('PIL.Image')
+SETTINGS = {'enabled': True, 'webp': True, 'webp_quality': 80, 'picture': True}
+
+
+def _save_noise_jpeg(path: str):
+    # a heavily compressed noise: at quality 80 the WebP is larger than the JPEG
+    Image.effect_noise((64, 64), 100).convert('RGB').save(path, 'JPEG', quality=10)
+
+
+def _save_gradient_jpeg(path: str):
+    Image.linear_gradient('L').resize((512, 512)).convert('RGB').save(path, 'JPEG', quality=95)
+
+
+def test_webp_not_smaller_is_dropped(tmp_path):
+    path = str(tmp_path / 'noise.jpg')
+    _save_noise_jpeg(path)
+    cache_folder = str(tmp_path / 'cache')
+    os.makedirs(cache_folder)
+    for cached in (False, True):
+        report = _process_image(path, cache_folder, SETTINGS)
+        assert report['error'] is None
+        assert report['cached'] is cached
+        assert report['webp_size'] is None
+        assert not os.path.exists(path + WEBP_SUFFIX)
+    assert not any(name.endswith(WEBP_SUFFIX) for name in os.listdir(cache_folder))
+
+
+def test_webp_smaller_is_kept(tmp_path):
+    path = str(tmp_path / 'gradient.jpg')
+    _save_gradient_jpeg(path)
+    cache_folder = str(tmp_path / 'cache')
+    os.makedirs(cache_folder)
+    report = _process_image(path, cache_folder, SETTINGS)
+    assert report['error'] is None
+    assert report['webp_size'] is not None
+    assert report['webp_size'] < report['size']
+    assert os.path.getsize(path + WEBP_SUFFIX) == report['webp_size']
+
+
+def test_picture_only_references_kept_variants(tmp_path):
+    _save_noise_jpeg(str(tmp_path / 'noise.jpg'))
+    _save_gradient_jpeg(str(tmp_path / 'gradient.jpg'))
+    page_path = tmp_path / 'index.html'
+    page_path.write_text('<html><body><img src="noise.jpg"><img src="gradient.jpg"></body></html>')
+    objects = [ArtifactObject(key=name, path=str(tmp_path / name), content_type=content_type)
+               for name, content_type in (('index.html', 'text/html'), ('noise.jpg', 'image/jpeg'),
+                                          ('gradient.jpg', 'image/jpeg'))]
+    variants = optimize_images(objects, SETTINGS, cache_folder=str(tmp_path / 'cache'), workers=1)
+    assert [variant.key for variant in variants] == ['gradient.jpg' + WEBP_SUFFIX]
+    content = page_path.read_text()
+    assert 'noise.jpg' + WEBP_SUFFIX not in content
+    assert '<source type="image/webp" srcset="gradient.jpg.webp">' in content
+    assert '<img src="noise.jpg">' in content
@@ -0,0 +1,26 @@
+from webflow_aws.utils.infra import compute_infra_fingerprint
+from webflow_aws.utils.localization import LOCALIZED_PAGES_CONFIGURATION_KEY
+from webflow_aws.utils.redirects import REDIRECTS_CONFIGURATION_KEY
+
+CONFIGURATION = {'bucket_name': 'example.com-123', 'domain_name': 'example.com', 'stack_name': 'example-com'}
+
+
+def test_fingerprint_ignores_the_publish_time_values():
+    configuration = dict(CONFIGURATION, edge_runtime='cloudfront_function')
+    fingerprint = compute_infra_fingerprint(configuration)
+    # the CloudFront Function gets the redirects and the translated pages at publish time
+    assert compute_infra_fingerprint(dict(configuration, **{
+        REDIRECTS_CONFIGURATION_KEY: {'/old': '/new'},
+        LOCALIZED_PAGES_CONFIGURATION_KEY: ['/it/about']})) == fingerprint
+    assert compute_infra_fingerprint(dict(configuration, aws_profile_name='other')) == fingerprint
+
+
+def test_fingerprint_of_the_lambda_edge_code():
+    configuration = dict(CONFIGURATION, edge_runtime='lambda_edge')
+    fingerprint = compute_infra_fingerprint(dict(configuration, **{LOCALIZED_PAGES_CONFIGURATION_KEY: ['/it/about']}))
+    # the AWS Lambda @edge is deployed again when the translated pages change
+    assert compute_infra_fingerprint(dict(configuration, **{
+        LOCALIZED_PAGES_CONFIGURATION_KEY: ['/it/about', '/it/blog/index']})) != fingerprint
+    assert compute_infra_fingerprint(dict(configuration, **{
+        LOCALIZED_PAGES_CONFIGURATION_KEY: ['/it/about'],
+        REDIRECTS_CONFIGURATION_KEY: {'/old': '/new'}})) != fingerprint
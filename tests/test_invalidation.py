@@ -0,0 +1,31 @@
+from webflow_aws.utils.invalidation import WILDCARD_PATH, get_object_paths, plan_invalidation
+from webflow_aws.utils.manifest import Manifest
+
+
+def test_object_paths():
+    assert get_object_paths('css/style.css') == ['/css/style.css']
+    assert get_object_paths('about.html') == ['/about.html', '/about']
+    assert get_object_paths('index.html') == ['/index.html', '/index', '/']
+    assert get_object_paths('blog/index.html') == ['/blog/index.html', '/blog/index', '/blog/', '/blog']
+    assert get_object_paths('news (1).html') == ['/news%20%281%29.html', '/news%20%281%29']
+
+
+def test_plan_invalidation():
+    assert plan_invalidation([]) == []
+    assert plan_invalidation(['blog/index.html', 'about.html', 'about.html']) == [
+        '/about', '/about.html', '/blog', '/blog/', '/blog/index', '/blog/index.html']
+    # 3 paths for 2 keys
+    assert plan_invalidation(['a.css', 'b.html'], max_paths=3) == ['/a.css', '/b', '/b.html']
+    assert plan_invalidation(['a.css', 'b.html'], max_paths=2) == [WILDCARD_PATH]
+
+
+def test_manifest_diff_to_invalidate():
+    published = Manifest({
+        'index.html': {'sha256': '1'}, 'style.css': {'sha256': '2'}, 'style.css.br': {'sha256': '3'},
+        'old.html': {'sha256': '4'}, 'archive.gz': {'sha256': '5'}})
+    manifest = Manifest({
+        'index.html': {'sha256': '1'}, 'style.css': {'sha256': '6'}, 'style.css.br': {'sha256': '7'},
+        'new.html': {'sha256': '8'}, 'logo.png': {'sha256': '9'}, 'archive.gz': {'sha256': '10'}})
+    # the new files other than the pages have never been cached, the compressed variants are served by the path of
+    # the original file
+    assert sorted(manifest.diff(published).to_invalidate) == ['archive.gz', 'new.html', 'old.html', 'style.css']
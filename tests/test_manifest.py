@@ -0,0 +1,60 @@
+import zipfile
+
+from webflow_aws.utils.artifact import unpack_artifact
+from webflow_aws.utils.manifest import Manifest
+from webflow_aws.utils.releases import get_release_id
+
+
+def _write_export(path, files):
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for key, content in files.items():
+            zip_file.writestr(key, content)
+    return path
+
+
+def test_diff():
+    published = Manifest({
+        'index.html': {'sha256': '1', 'cache_control': 'no-cache'},
+        'about.html': {'sha256': '2', 'cache_control': 'no-cache'},
+        'css/style.css': {'sha256': '3', 'cache_control': 'no-cache'},
+        'old.html': {'sha256': '4', 'cache_control': 'no-cache'}})
+    manifest = Manifest({
+        'index.html': {'sha256': '1', 'cache_control': 'no-cache'},
+        'about.html': {'sha256': '5', 'cache_control': 'no-cache'},
+        # same content, served with different metadata
+        'css/style.css': {'sha256': '3', 'cache_control': 'max-age=31536000'},
+        'new.html': {'sha256': '6', 'cache_control': 'no-cache'},
+        'images/logo.png': {'sha256': '7', 'cache_control': 'no-cache'}})
+    diff = manifest.diff(published)
+    assert diff.added == ['images/logo.png', 'new.html']
+    assert diff.changed == ['about.html', 'css/style.css']
+    assert diff.removed == ['old.html']
+    assert diff.to_upload == ['images/logo.png', 'new.html', 'about.html', 'css/style.css']
+    assert not diff.is_empty
+    assert manifest.diff(manifest).is_empty
+    # nothing published yet
+    assert manifest.diff(Manifest()).added == sorted(manifest.entries)
+
+
+def test_release_id_is_deterministic(tmp_path):
+    files = {'index.html': '<html>home</html>', 'css/style.css': 'body {}', 'images/logo.png': b'\x89PNG'}
+    first = unpack_artifact(str(_write_export(tmp_path / 'first.zip', files)), str(tmp_path / 'first'))
+    # the same export, unpacked in another folder with the files in another order
+    second = unpack_artifact(
+        str(_write_export(tmp_path / 'second.zip', dict(reversed(list(files.items()))))), str(tmp_path / 'second'))
+    release_id = get_release_id(Manifest.from_objects(first))
+    assert get_release_id(Manifest.from_objects(second)) == release_id
+    assert get_release_id(Manifest(dict(reversed(list(Manifest.from_objects(first).entries.items()))))) == release_id
+
+
+def test_release_id_changes_with_the_website(tmp_path):
+    files = {'index.html': '<html>home</html>', 'css/style.css': 'body {}'}
+    objects = unpack_artifact(str(_write_export(tmp_path / 'site.zip', files)), str(tmp_path / 'site'))
+    release_id = get_release_id(Manifest.from_objects(objects))
+    changed = unpack_artifact(
+        str(_write_export(tmp_path / 'changed.zip', dict(files, **{'index.html': '<html>new</html>'}))),
+        str(tmp_path / 'changed'))
+    assert get_release_id(Manifest.from_objects(changed)) != release_id
+    # the metadata the objects are served with is part of the release
+    objects[1].cache_control = 'max-age=31536000'
+    assert get_release_id(Manifest.from_objects(objects)) != release_id
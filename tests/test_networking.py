@@ -0,0 +1,96 @@
+import pytest
+
+from webflow_aws.utils.cache_tiers import ASSET_EXTENSIONS, ONE_YEAR
+
+cdk = pytest.importorskip('aws_cdk')
+assertions = pytest.importorskip('aws_cdk.assertions')
+
+CONFIGURATION = {
+    'CNAMEs': ['www.example.com'],
+    'bucket_name': 'example.com-123',
+    'domain_name': 'example.com',
+    'route_53_hosted_zone_id': 'Z123',
+    'route_53_hosted_zone_name': 'example.com.',
+    'stack_name': 'example-com',
+    'edge_runtime': 'cloudfront_function'
+}
+
+
+def _synth(**configuration):
+    from webflow_aws.backend.networking.infrastructure import Networking
+
+    stack = cdk.Stack(cdk.App(), 'Website', env={'region': 'us-east-1', 'account': '123456789012'})
+    networking = Networking(stack, 'Networking', configuration=dict(CONFIGURATION, **configuration))
+    return networking, assertions.Template.from_stack(stack)
+
+
+def _get_logical_id(stack, construct):
+    return stack.get_logical_id(construct.node.default_child)
+
+
+def test_cache_policies_ttl():
+    _, template = _synth()
+    template.resource_count_is('AWS::CloudFront::CachePolicy', 2)
+    encodings = assertions.Match.object_like({'EnableAcceptEncodingBrotli': True, 'EnableAcceptEncodingGzip': True})
+    # the pages are served by the default behavior with the html tier
+    template.has_resource_properties('AWS::CloudFront::CachePolicy', {
+        'CachePolicyConfig': assertions.Match.object_like({
+            'Comment': 'The CloudFront cache policy used by the DefaultCacheBehavior',
+            'DefaultTTL': 86400, 'MaxTTL': ONE_YEAR, 'MinTTL': 0,
+            'ParametersInCacheKeyAndForwardedToOrigin': encodings})})
+    template.has_resource_properties('AWS::CloudFront::CachePolicy', {
+        'CachePolicyConfig': assertions.Match.object_like({
+            'Comment': 'The CloudFront cache policy used by the assets files',
+            'DefaultTTL': ONE_YEAR, 'MaxTTL': ONE_YEAR, 'MinTTL': 0,
+            'ParametersInCacheKeyAndForwardedToOrigin': encodings})})
+
+
+def test_behaviors_by_extension():
+    networking, template = _synth()
+    stack = cdk.Stack.of(networking)
+    default_policy_id = _get_logical_id(stack, networking.cloud_front_cache_policy)
+    assets_policy_id = _get_logical_id(stack, networking.cloud_front_cache_tier_policies[tuple(ASSET_EXTENSIONS)])
+    function_id = _get_logical_id(stack, networking.cloud_front_edit_path_for_origin_function)
+    distribution = template.find_resources('AWS::CloudFront::Distribution')[
+        _get_logical_id(stack, networking.main_cloud_front_distribution)]['Properties']['DistributionConfig']
+    assert distribution['DefaultCacheBehavior']['CachePolicyId'] == {'Ref': default_policy_id}
+    behaviors = {behavior['PathPattern']: behavior for behavior in distribution['CacheBehaviors']}
+    assert sorted(behaviors) == sorted(f'*.{extension}' for extension in ASSET_EXTENSIONS)
+    for behavior in behaviors.values():
+        assert behavior['CachePolicyId'] == {'Ref': assets_policy_id}
+        assert behavior['ViewerProtocolPolicy'] == 'redirect-to-https'
+        # every file goes through the edge function, that selects the compressed variants
+        assert behavior['FunctionAssociations'] == [{
+            'EventType': 'viewer-request', 'FunctionARN': {'Fn::GetAtt': [function_id, 'FunctionARN']}}]
+
+
+def test_response_headers_policy():
+    networking, template = _synth(
+        compression={'enabled': True}, staging={'enabled': True},
+        performance={'response_headers': {'X-Content-Type-Options': 'nosniff'}})
+    stack = cdk.Stack.of(networking)
+    template.has_resource_properties('AWS::CloudFront::ResponseHeadersPolicy', {
+        'ResponseHeadersPolicyConfig': assertions.Match.object_like({
+            'Comment': 'Response headers of the website',
+            'CustomHeadersConfig': {'Items': [
+                {'Header': 'Vary', 'Override': True, 'Value': 'Accept-Encoding'},
+                {'Header': 'X-Content-Type-Options', 'Override': True, 'Value': 'nosniff'}]}})})
+    template.has_resource_properties('AWS::CloudFront::ResponseHeadersPolicy', {
+        'ResponseHeadersPolicyConfig': assertions.Match.object_like({
+            'CustomHeadersConfig': {'Items': assertions.Match.array_with([
+                {'Header': 'X-Robots-Tag', 'Override': True, 'Value': 'noindex'}])}})})
+    distributions = template.find_resources('AWS::CloudFront::Distribution')
+    for distribution, policy in ((networking.main_cloud_front_distribution, networking.response_headers_policy), (
+            networking.staging_cloud_front_distribution, networking.staging_response_headers_policy)):
+        config = distributions[_get_logical_id(stack, distribution)]['Properties']['DistributionConfig']
+        for behavior in [config['DefaultCacheBehavior']] + config['CacheBehaviors']:
+            assert behavior['ResponseHeadersPolicyId'] == {'Ref': _get_logical_id(stack, policy)}
+
+
+def test_no_response_headers_policy():
+    _, template = _synth()
+    template.resource_count_is('AWS::CloudFront::ResponseHeadersPolicy', 0)
+    template.has_resource_properties('AWS::CloudFront::Distribution', {
+        'DistributionConfig': assertions.Match.object_like({
+            'DefaultCacheBehavior': assertions.Match.object_like({
+                'ResponseHeadersPolicyId': assertions.Match.absent()})})})
@@ -0,0 +1,33 @@
+import click
+import pytest
+
+from webflow_aws.utils.redirects import compile_redirects
+
+
+def test_chains_are_collapsed():
+    table, warnings = compile_redirects([('/a', '/b'), ('/b/', '/c?ref=old'), ('/old', 'https://example.com/')])
+    assert table == {'/a': '/c?ref=old', '/b': '/c?ref=old', '/old': 'https://example.com/'}
+    assert warnings == ['redirect chain /a -> /b -> /c?ref=old served as /a -> /c?ref=old']
+
+
+def test_loop_is_reported_once():
+    with pytest.raises(click.ClickException) as error:
+        compile_redirects([('/start', '/a'), ('/a', '/b'), ('/b', '/c/'), ('/c', '/a#top')])
+    assert error.value.message.count('redirect loop') == 1
+    assert 'redirect loop: /a -> /b -> /c -> /a' in error.value.message
+
+
+def test_self_redirect_is_a_loop():
+    with pytest.raises(click.ClickException) as error:
+        compile_redirects([('/a/', '/a')])
+    assert 'redirect loop: /a -> /a' in error.value.message
+
+
+def test_all_errors_are_reported():
+    with pytest.raises(click.ClickException) as error:
+        compile_redirects([('a', '/b'), ('/c', 'ftp://example.com'), ('/d', '/e'), ('/d', '/f'), ('/g', '/g')])
+    message = error.value.message
+    assert 'a is not a valid source path' in message
+    assert 'ftp://example.com is not a valid target' in message
+    assert '/d is redirected both to /e and to /f' in message
+    assert 'redirect loop: /g -> /g' in message
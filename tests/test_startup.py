@@ -0,0 +1,73 @@
+"""
+Startup time budget of the webflow-aws cli.
+
+The cli imports boto3, yaml and the processing stages only inside the commands that use them, so that --help,
+--version and the argument errors start fast (the tool runs many times in a CI pipeline). These tests measure the
+import of the cli module with `python -X importtime` and the wall time of the trivial commands, and fail if they
+exceed the budget or if a heavy dependency is imported at startup, so that a module level import doesn't bring
+the slow startup back.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import pytest
+
+CLI_MODULE = 'webflow_aws.webflow_aws_tool'
+# the dependencies that must not be loaded by the trivial commands
+HEAVY_MODULES = ('boto3', 'botocore', 's3transfer', 'yaml', 'emoji', 'tqdm', 'aws_cdk')
+TRIVIAL_COMMANDS = (['--help'], ['--version'], ['publish', '--help'])
+# the median of the runs is compared with the budget
+IMPORT_BUDGET_MS = 100
+# including the interpreter startup
+COMMAND_BUDGET_MS = 250
+RUNS = 5
+REPOSITORY_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import() -> Dict:
+    """
+    Import the cli module in a new process with `python -X importtime`
+
+    :return: a dict with the cumulative import time of the cli module in ms and the modules it imported
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {CLI_MODULE}'], cwd=REPOSITORY_FOLDER,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    modules = {}
+    # the lines are "import time: <self us> | <cumulative us> | <indented module name>"
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative) / 1000
+    return {'milliseconds': modules[CLI_MODULE], 'modules': list(modules)}
+
+
+def measure_command(args: List[str]) -> float:
+    """
+    :param args: the arguments of the cli
+    :return: the wall time in ms of the cli run in a new process, including the interpreter startup
+    """
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', f'from {CLI_MODULE} import cli; cli()'] + args, cwd=REPOSITORY_FOLDER,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def test_import_budget():
+    imports = [measure_import() for _ in range(RUNS)]
+    heavy_modules = sorted({name.split('.')[0] for name in imports[0]['modules']} & set(HEAVY_MODULES))
+    assert not heavy_modules, f'the cli module imports {", ".join(heavy_modules)} at startup'
+    import_ms = statistics.median(result['milliseconds'] for result in imports)
+    assert import_ms <= IMPORT_BUDGET_MS, f'the import of the cli takes {import_ms:.1f}ms'
+
+
+@pytest.mark.parametrize('args', TRIVIAL_COMMANDS, ids=' '.join)
+def test_command_budget(args):
+    command_ms = statistics.median(measure_command(args) for _ in range(RUNS))
+    assert command_ms <= COMMAND_BUDGET_MS, f'webflow-aws {" ".join(args)} takes {command_ms:.1f}ms'
@@ -0,0 +1,121 @@
+import json
+import os
+
+import pytest
+
+from webflow_aws.utils.transfer import MIN_PART_SIZE, MultipartUploader
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+BUCKET_NAME = 'example.com-123'
+KEY = 'artifacts/prod/release.zip'
+
+
+class InterruptedUpload(Exception):
+    pass
+
+
+class RecordingClient(object):
+    """
+    An S3 client recording the uploaded parts, that fails the upload of a part to interrupt the upload
+    """
+
+    def __init__(self, client, failing_part=None):
+        self.uploaded_parts = []
+        self._client = client
+        self._failing_part = failing_part
+
+    def upload_part(self, **kwargs):
+        if kwargs['PartNumber'] == self._failing_part:
+            raise InterruptedUpload()
+        self.uploaded_parts.append(kwargs['PartNumber'])
+        return self._client.upload_part(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN'):
+        monkeypatch.setenv(name, 'testing')
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET_NAME)
+        yield client
+
+
+@pytest.fixture
+def package(tmp_path):
+    path = tmp_path / 'package.zip'
+    # 3 parts, the last one smaller
+    path.write_bytes(os.urandom(2 * MIN_PART_SIZE + 1024))
+    return str(path)
+
+
+def _upload(s3_client, filename: str, checkpoint_folder: str, failing_part=None) -> RecordingClient:
+    client = RecordingClient(s3_client, failing_part=failing_part)
+    uploader = MultipartUploader(
+        client, concurrency=1, part_size=MIN_PART_SIZE, checkpoint_folder=checkpoint_folder, show_progress=False)
+    if failing_part:
+        with pytest.raises(InterruptedUpload):
+            uploader.upload(filename, BUCKET_NAME, KEY)
+    else:
+        uploader.upload(filename, BUCKET_NAME, KEY)
+    return client
+
+
+def _get_checkpoint_path(checkpoint_folder: str) -> str:
+    checkpoints = [name for name in os.listdir(checkpoint_folder) if name.startswith('upload-')]
+    assert len(checkpoints) == 1
+    return os.path.join(checkpoint_folder, checkpoints[0])
+
+
+def _assert_uploaded(s3_client, filename: str, checkpoint_folder: str):
+    with open(filename, 'rb') as f:
+        assert s3_client.get_object(Bucket=BUCKET_NAME, Key=KEY)['Body'].read() == f.read()
+    # the checkpoint is removed once the upload is complete
+    assert not os.listdir(checkpoint_folder)
+
+
+def test_upload_resumes_from_checkpoint(s3_client, package, tmp_path):
+    checkpoint_folder = str(tmp_path / 'state')
+    assert _upload(s3_client, package, checkpoint_folder, failing_part=3).uploaded_parts == [1, 2]
+    with open(_get_checkpoint_path(checkpoint_folder)) as f:
+        assert sorted(json.load(f)['parts']) == ['1', '2']
+    assert _upload(s3_client, package, checkpoint_folder).uploaded_parts == [3]
+    _assert_uploaded(s3_client, package, checkpoint_folder)
+
+
+def test_upload_sends_again_parts_with_other_etag(s3_client, package, tmp_path):
+    checkpoint_folder = str(tmp_path / 'state')
+    _upload(s3_client, package, checkpoint_folder, failing_part=3)
+    checkpoint_path = _get_checkpoint_path(checkpoint_folder)
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    # S3 doesn't have the part stored in the checkpoint
+    checkpoint['parts']['1'] = '"0123456789abcdef0123456789abcdef"'
+    with open(checkpoint_path, 'w') as f:
+        json.dump(checkpoint, f)
+    assert _upload(s3_client, package, checkpoint_folder).uploaded_parts == [1, 3]
+    _assert_uploaded(s3_client, package, checkpoint_folder)
+
+
+@pytest.mark.parametrize('change', ['size', 'mtime'])
+def test_upload_discards_checkpoint_of_changed_file(s3_client, package, tmp_path, change):
+    checkpoint_folder = str(tmp_path / 'state')
+    _upload(s3_client, package, checkpoint_folder, failing_part=3)
+    with open(_get_checkpoint_path(checkpoint_folder)) as f:
+        upload_id = json.load(f)['upload_id']
+    if change == 'size':
+        with open(package, 'ab') as f:
+            f.write(b'new content')
+    else:
+        os.utime(package, (os.path.getatime(package), os.path.getmtime(package) + 60))
+    client = _upload(s3_client, package, checkpoint_folder, failing_part=3)
+    assert client.uploaded_parts == [1, 2]
+    with open(_get_checkpoint_path(checkpoint_folder)) as f:
+        assert json.load(f)['upload_id'] != upload_id
+    assert _upload(s3_client, package, checkpoint_folder).uploaded_parts == [3]
+    _assert_uploaded(s3_client, package, checkpoint_folder)
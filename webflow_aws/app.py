@@ -1,7 +1,11 @@
 import aws_cdk as cdk
 
-from backend.component import Backend
+from backend.component import Backend, Edge
 from utils.base_utils import configuration_yaml_exists, get_configuration
+from utils.localization import LOCALIZED_PAGES_CONFIGURATION_KEY, load_localized_pages
+from utils.redirects import REDIRECTS_CONFIGURATION_KEY, load_website_redirects
+from utils.site_publisher import find_zip_file
+from utils.storage import EDGE_REGION_NAME, get_edge_stack_name, get_region_name
 
 app = cdk.App()
 
@@ -10,12 +14,31 @@ if not configuration_yaml_exists:
     exit()
 # load the configuration
 configuration = get_configuration()
+# the releases served by the distributions, passed by the cli with --context
+configuration['current_release'] = app.node.try_get_context('current_release')
+configuration['current_staging_release'] = app.node.try_get_context('current_staging_release')
+# the redirects answered by the AWS Lambda @edge
+configuration[REDIRECTS_CONFIGURATION_KEY] = load_website_redirects(show_warnings=False)
+# the translated pages, the AWS Lambda @edge redirects the visitors only to them
+configuration[LOCALIZED_PAGES_CONFIGURATION_KEY] = load_localized_pages(configuration, find_zip_file('.'))
+
+# outside us-east-1, the certificate and the AWS Lambda @edge are deployed in their own stack in us-east-1
+edge_stack_name = get_edge_stack_name(configuration)
+edge = Edge(
+    app,
+    edge_stack_name,
+    configuration=configuration,
+    env={"region": EDGE_REGION_NAME},
+    cross_region_references=True
+) if edge_stack_name else None
 
 Backend(
     app,
     configuration['stack_name'],
     configuration=configuration,
-    env={"region": "us-east-1"}
+    ssl_certificate=edge.ssl_certificate if edge else None,
+    env={"region": get_region_name(configuration)},
+    cross_region_references=edge is not None
 )
 
 app.synth()
@@ -1,20 +1,26 @@
-from typing import List
+from typing import List, Optional
 
 from aws_cdk import (
+    aws_certificatemanager,
     aws_cloudfront,
     aws_lambda,
     aws_route53,
     aws_route53_targets,
     aws_s3,
     aws_s3_notifications,
+    CfnOutput,
     Fn,
     Stack
 )
 from constructs import Construct
 
 from webflow_aws.backend.compute.infrastructure import Compute
-from webflow_aws.backend.networking.infrastructure import Networking
+from webflow_aws.backend.networking.infrastructure import Networking, get_alternative_domain_names
 from webflow_aws.backend.storage.infrastructure import Storage
+from webflow_aws.utils.aws_utils import (
+    DISTRIBUTION_ID_OUTPUT_KEY, EDGE_FUNCTION_NAME_OUTPUT_KEY, STAGING_DISTRIBUTION_ID_OUTPUT_KEY,
+    STAGING_DOMAIN_NAME_OUTPUT_KEY, STAGING_EDGE_FUNCTION_NAME_OUTPUT_KEY)
+from webflow_aws.utils.stages import get_staging_configuration
 
 
 class Backend(Stack):
@@ -25,11 +31,16 @@ class Backend(Stack):
         + storage: contains all storage services used for WebflowAWS
     """
 
-    def __init__(self, scope: Construct, construct_id: str, configuration: dict, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, configuration: dict,
+                 ssl_certificate: Optional[aws_certificatemanager.ICertificate] = None, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
-        self.networking = Networking(self, "WebflowAwsNetworking", configuration=configuration)
+        self.networking = Networking(
+            self, "WebflowAwsNetworking", configuration=configuration, ssl_certificate=ssl_certificate)
         self.compute = Compute(
             self, "WebflowAwsCompute", cloud_front_distribution=self.networking.main_cloud_front_distribution,
+            staging_cloud_front_distribution=self.networking.staging_cloud_front_distribution,
+            cloud_front_function=self.networking.cloud_front_edit_path_for_origin_function,
+            staging_cloud_front_function=self.networking.staging_cloud_front_edit_path_for_origin_function,
             configuration=configuration)
         self.storage = Storage(self, "WebflowAwsStorage", configuration=configuration)
         self.__add_s3_bucket_event_notification(
@@ -44,6 +55,20 @@ class Backend(Stack):
             domain_name=configuration['domain_name'],
             alternative_domain_names=configuration['CNAMEs'],
             cloud_front_distribution=self.networking.main_cloud_front_distribution)
+        staging_domain_name = get_staging_configuration(configuration)['domain_name']
+        if self.networking.staging_cloud_front_distribution and staging_domain_name:
+            self.__create_route_53_record_group(
+                route_53_hosted_zone=self.networking.route_53_hosted_zone,
+                domain_name=staging_domain_name,
+                alternative_domain_names=[],
+                cloud_front_distribution=self.networking.staging_cloud_front_distribution)
+        self.__create_outputs(
+            cloud_front_distribution=self.networking.main_cloud_front_distribution,
+            cloud_front_function=self.networking.cloud_front_edit_path_for_origin_function)
+        if self.networking.staging_cloud_front_distribution:
+            self.__create_staging_outputs(
+                cloud_front_distribution=self.networking.staging_cloud_front_distribution,
+                cloud_front_function=self.networking.staging_cloud_front_edit_path_for_origin_function)
 
     @staticmethod
     def __add_s3_bucket_event_notification(
@@ -61,6 +86,56 @@ class Backend(Stack):
             aws_s3_notifications.LambdaDestination(s3_trigger_lambda_function),
             (aws_s3.NotificationKeyFilter(prefix='artifacts/', suffix='.zip')))
 
+    def __create_outputs(
+            self, cloud_front_distribution: aws_cloudfront.Distribution,
+            cloud_front_function: Optional[aws_cloudfront.Function]):
+        """
+        Export the values needed by the webflow-aws cli to publish the website without going through the
+        artifacts AWS Lambda function.
+
+        :param cloud_front_distribution: the cloudfront distribution serving the website
+        :param cloud_front_function: the CloudFront Function rewriting the viewer requests, if used. Its lookup
+        table of the pages is updated at publish time
+        """
+        CfnOutput(
+            self,
+            DISTRIBUTION_ID_OUTPUT_KEY,
+            value=cloud_front_distribution.distribution_id,
+            description='The id of the CloudFront distribution serving the website')
+        if cloud_front_function:
+            CfnOutput(
+                self,
+                EDGE_FUNCTION_NAME_OUTPUT_KEY,
+                value=cloud_front_function.function_name,
+                description='The name of the CloudFront Function rewriting the viewer requests')
+
+    def __create_staging_outputs(
+            self, cloud_front_distribution: aws_cloudfront.Distribution,
+            cloud_front_function: Optional[aws_cloudfront.Function]):
+        """
+        Export the values needed by the webflow-aws cli to publish and promote the alpha stage, served by the
+        staging distribution.
+
+        :param cloud_front_distribution: the cloudfront distribution serving the staging version of the website
+        :param cloud_front_function: the CloudFront Function of the staging distribution, if used
+        """
+        CfnOutput(
+            self,
+            STAGING_DISTRIBUTION_ID_OUTPUT_KEY,
+            value=cloud_front_distribution.distribution_id,
+            description='The id of the CloudFront distribution serving the staging version of the website')
+        CfnOutput(
+            self,
+            STAGING_DOMAIN_NAME_OUTPUT_KEY,
+            value=cloud_front_distribution.distribution_domain_name,
+            description='The CloudFront domain of the staging distribution')
+        if cloud_front_function:
+            CfnOutput(
+                self,
+                STAGING_EDGE_FUNCTION_NAME_OUTPUT_KEY,
+                value=cloud_front_function.function_name,
+                description='The name of the CloudFront Function of the staging distribution')
+
     def __create_route_53_record_group(
             self, route_53_hosted_zone: aws_route53.HostedZone, domain_name: str, alternative_domain_names: List[str],
             cloud_front_distribution: aws_cloudfront.Distribution
@@ -119,3 +194,28 @@ class Backend(Stack):
             source_account=Fn.ref('AWS::AccountId'),
             source_arn=f'arn:aws:s3:::{bucket_name}'
         )
+
+
+class Edge(Stack):
+    """
+    The resources CloudFront reads from us-east-1 only, when the website is deployed in another region (see the
+    storage section of the configuration). The Backend stack references them across regions:
+        + the SSL certificate of the distributions
+        + the edit path for origin AWS Lambda @edge, added to this stack by the networking construct
+    """
+
+    def __init__(self, scope: Construct, construct_id: str, configuration: dict, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        route_53_hosted_zone = aws_route53.HostedZone.from_hosted_zone_attributes(
+            self,
+            'HostedZone',
+            hosted_zone_id=configuration['route_53_hosted_zone_id'],
+            zone_name=configuration['route_53_hosted_zone_name']
+        )
+        self.ssl_certificate = aws_certificatemanager.Certificate(
+            self,
+            'SSLCertificate',
+            domain_name=configuration['domain_name'],
+            validation=aws_certificatemanager.CertificateValidation.from_dns(hosted_zone=route_53_hosted_zone),
+            subject_alternative_names=get_alternative_domain_names(configuration)
+        )
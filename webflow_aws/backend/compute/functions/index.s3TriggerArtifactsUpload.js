@@ -1,15 +1,67 @@
 const AWS = require('aws-sdk');
+const stream = require('stream');
 const util = require('util');
-const AdmZip = require('adm-zip');
+const zlib = require('zlib');
 
 // get reference to S3 client
 var s3 = new AWS.S3();
 var cf = new AWS.CloudFront();
 
+const pipeline = util.promisify(stream.pipeline);
+
+// number of zip entries extracted and uploaded at the same time
+const UPLOAD_CONCURRENCY = parseInt(process.env.UPLOAD_CONCURRENCY || "16");
+// part size used when streaming big entries to S3. Memory usage is bounded by UPLOAD_CONCURRENCY * UPLOAD_PART_SIZE
+const UPLOAD_PART_SIZE = 5 * 1024 * 1024;
+
+// zip format constants, see https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT
+const EOCD_SIGNATURE = 0x06054b50;
+const EOCD_SIZE = 22;
+const EOCD_MAX_COMMENT_SIZE = 65535;
+const ZIP64_EOCD_LOCATOR_SIGNATURE = 0x07064b50;
+const ZIP64_EOCD_LOCATOR_SIZE = 20;
+const ZIP64_EOCD_SIZE = 56;
+const CENTRAL_DIRECTORY_SIGNATURE = 0x02014b50;
+const CENTRAL_DIRECTORY_HEADER_SIZE = 46;
+const LOCAL_FILE_HEADER_SIZE = 30;
+const ZIP64_EXTRA_FIELD_ID = 0x0001;
+const METHOD_STORED = 0;
+const METHOD_DEFLATED = 8;
+
+// entry added by the webflow-aws cli with the metadata of every object. When present, the files have already been
+// processed by the cli and are uploaded as they are
+const OBJECTS_METADATA_FILE_NAME = ".webflow-aws-objects.json";
+// entry added by the webflow-aws cli with the code of the CloudFront Function of the release, and its lookup table of
+// the pages. It is published only once the CDN serves the release, so the table never lists pages not yet served
+const EDGE_FUNCTION_CODE_FILE_NAME = ".webflow-aws-edge-function.js";
+// manifest of the release, uploaded last: its presence marks the release as complete
+const MANIFEST_FILE_NAME = ".webflow-aws-manifest.json";
+const RELEASE_INDEX_VERSION = 1;
+// namespace of the CloudWatch metrics with the duration of every phase, logged in Embedded Metric Format
+const METRICS_NAMESPACE = "WebflowAws";
+const RELEASE_STATUS_LIVE = "live";
+const RELEASE_STATUS_FAILED = "failed";
+// above this number of paths a single wildcard invalidation is cheaper and faster (invalidation_max_paths)
+const MAX_INVALIDATION_PATHS = parseInt(process.env.INVALIDATION_MAX_PATHS || "300");
+const WILDCARD_PATH = "/*";
+// the compressed variants of the files, served by the path of the original file
+const ENCODING_SUFFIXES = [".br", ".gz"];
+// every distinct content is stored once in blobs/<sha256>, listed by the catalog (see blobs.py), so that the garbage
+// collection can empty the folders of the releases not served
+const BLOBS_PREFIX = "blobs/";
+const BLOBS_CATALOG_KEY = "releases/blobs.json";
+const BLOBS_CATALOG_VERSION = 1;
+
 /**
- * Once a file is uploaded in the S3 bucket www.ianum under /artifacts/alpha or /artifacts/prod, that operation triggers this function.
- * The zip file is read, unzipped, moved the files in the /src/alpha (or /src/prod) folder, invalidated the related CDN and removed the
- * artifact file
+ * Once a file is uploaded in the S3 bucket www.ianum under /artifacts/alpha or /artifacts/prod, that operation
+ * triggers this function. The zip file (artifacts/<stage>/<release id>.zip) is read and unzipped in the immutable
+ * /src/releases/<release id> folder. Then the CDN of the stage (the main distribution for prod, the staging one for
+ * alpha) is switched to the new release, its CloudFront Function (if any) is published with the pages of the release,
+ * the changed paths of the CDN are invalidated, the release is recorded in the index of the stage and the artifact file
+ * removed. At last, the outcome is written in the status object of the release, awaited by
+ * `webflow-aws publish --wait`.
+ * The zip file is never loaded in memory: its central directory is read with a ranged GET and every entry is streamed
+ * from S3, inflated and uploaded by a bounded pool of workers, so the memory usage doesn't depend on the archive size.
  **/
 
 
@@ -17,74 +69,514 @@ exports.lambdaHandler = async (event) => {
 
   let srcBucket = event.Records[0].s3.bucket.name;
   let srcKey    = decodeURIComponent(event.Records[0].s3.object.key.replace(/\+/g, " "));
-  let dstBucket = event.Records[0].s3.bucket.name;
-  let cloudfrontDistributionId = process.env.CDN_DISTRIBUTION_ID;
   console.log(srcBucket);
   console.log(srcKey);
   //alpha o prod?
   let stage = srcKey.split("/")[1] === 'prod' ? 'prod' : 'alpha';
-  let dstFolder = "src/"+stage+"/";
+  let releaseId = srcKey.split("/").pop().replace(/\.zip$/, "");
 
-  // prendo il file
-  let zipData = await s3.getObject({
-    Bucket: srcBucket,
-    Key: srcKey
-  }).promise();
+  try {
+    let invalidationId = await publishRelease(srcBucket, srcKey, stage, releaseId);
+    await writeReleaseStatus(srcBucket, stage, releaseId, {status: RELEASE_STATUS_LIVE, invalidation_id: invalidationId});
+  } catch (e) {
+    // the cli waiting for the release (publish --wait) fails right away instead of timing out
+    await writeReleaseStatus(srcBucket, stage, releaseId, {status: RELEASE_STATUS_FAILED, error: e.message})
+      .catch((statusError) => console.log("Unable to write the release status", statusError));
+    throw e;
+  }
+  console.log("DONE");
+};
 
-  // unzip and upload the files
-  let zip = new AdmZip(zipData.Body);
-  var zipEntries = zip.getEntries(); // an array of ZipEntry records
 
-  // uploads will go in parallel, with a Promise.all approach
-  let promiseUploads = [];
-  for (let zipEntry of zipEntries) {
+/**
+ * Extract the zip file of a release, serve it and return the id of the CDN invalidation
+ **/
+async function publishRelease (srcBucket, srcKey, stage, releaseId) {
+  let timer = new PhaseTimer();
+  let dstBucket = srcBucket;
+  // the alpha stage is served by the staging distribution
+  let cloudfrontDistributionId = stage === 'prod' ? process.env.CDN_DISTRIBUTION_ID : process.env.STAGING_CDN_DISTRIBUTION_ID;
+  if (!cloudfrontDistributionId) throw new Error("No CloudFront distribution serves the "+stage+" stage, enable staging");
+  let edgeFunctionName = stage === 'prod' ? process.env.EDGE_FUNCTION_NAME : process.env.STAGING_EDGE_FUNCTION_NAME;
+  let dstFolder = "src/releases/"+releaseId+"/";
 
-    // replace all .html in the links
-    let buf = zipEntry.getData();
-    if (zipEntry.name.split(".").pop() === "html") {
-      buf = await replaceHtmlLink(zipEntry.getData());
-    }
+  // read the list of files without downloading the zip
+  let zipEntries = await timer.phase("ReadDirectory", () => readZipEntries(srcBucket, srcKey));
+  let metadataEntry = zipEntries.find((e) => e.entryName === OBJECTS_METADATA_FILE_NAME);
+  let objectsMetadata = null;
+  if (metadataEntry) {
+    objectsMetadata = await timer.phase("ReadDirectory", async () =>
+      JSON.parse((await streamToBuffer(openZipEntryStream(srcBucket, srcKey, metadataEntry))).toString("utf8")));
+  }
+  // the manifests of the release and of the one served now, compared to invalidate only the changed paths
+  let manifestEntry = zipEntries.find((e) => e.entryName === MANIFEST_FILE_NAME);
+  let manifest = null;
+  if (manifestEntry) {
+    manifest = await timer.phase("ReadDirectory", async () => JSON.parse(
+      (await streamToBuffer(openZipEntryStream(srcBucket, srcKey, manifestEntry))).toString("utf8")));
+  }
+  let invalidationPaths = await timer.phase("ReadDirectory", async () => {
+    if (!manifest) return [WILDCARD_PATH];
+    let current = (await readReleaseIndex(srcBucket, stage)).current;
+    let published = current ? await readManifest(srcBucket, "src/releases/"+current+"/"+MANIFEST_FILE_NAME) : null;
+    return published ? planInvalidation(published.files, manifest.files) : [WILDCARD_PATH];
+  });
 
-    promiseUploads.push(s3.putObject({
-      Body: buf,
+  // extract and upload the files, UPLOAD_CONCURRENCY at a time, the manifest last
+  let edgeFunctionEntry = zipEntries.find((e) => e.entryName === EDGE_FUNCTION_CODE_FILE_NAME);
+  let fileEntries = zipEntries.filter((e) => !e.entryName.endsWith("/") && e !== metadataEntry && e !== manifestEntry &&
+    e !== edgeFunctionEntry);
+  let uploadEntry = async (zipEntry) => {
+    let params = Object.assign({
       Bucket: dstBucket,
       Key: dstFolder + zipEntry.entryName,
+    }, objectsMetadata ? objectsMetadata[zipEntry.entryName] : {
       ContentType: getContentType(zipEntry.entryName),
       CacheControl: "public, max-age=3600",
-    }).promise());
+    });
+    // the html links are rewritten by the cli before the upload, the files are copied as they are
+    params.Body = openZipEntryStream(srcBucket, srcKey, zipEntry);
+    await s3.upload(params, {partSize: UPLOAD_PART_SIZE, queueSize: 1}).promise();
+  };
+  // the entries are downloaded, inflated and uploaded as streams, so the three steps are measured together
+  await timer.phase("ExtractUpload", async () => {
+    await runWithConcurrency(fileEntries, UPLOAD_CONCURRENCY, uploadEntry);
+    if (manifestEntry) await uploadEntry(manifestEntry);
+  });
+  if (manifest) await timer.phase("StoreBlobs", () => storeBlobs(dstBucket, dstFolder, manifest.files));
+
+  // atomically serve the new release
+  await timer.phase("SwitchOrigin", () => switchOriginPath(cloudfrontDistributionId, "/src/releases/"+releaseId));
+  if (edgeFunctionEntry && edgeFunctionName) {
+    await timer.phase("EdgeFunction", async () => publishEdgeFunction(
+      edgeFunctionName, await streamToBuffer(openZipEntryStream(srcBucket, srcKey, edgeFunctionEntry))));
   }
-  await Promise.all(promiseUploads);
   // invalidate CDN
-  await cf.createInvalidation({
-    DistributionId: cloudfrontDistributionId,
-    InvalidationBatch: {
-      CallerReference: Date.now()+"",
-      Paths: {
-        Quantity: 1,
-        Items: [
-          "/*"
-        ]
+  let invalidation = null;
+  if (invalidationPaths.length) {
+    invalidation = await timer.phase("Invalidate", () => cf.createInvalidation({
+      DistributionId: cloudfrontDistributionId,
+      InvalidationBatch: {
+        CallerReference: Date.now()+"",
+        Paths: {
+          Quantity: invalidationPaths.length,
+          Items: invalidationPaths
+        }
       }
-    }
-  }).promise();
+    }).promise());
+  }
+
+  await timer.phase("RecordRelease", () => addRelease(srcBucket, stage, releaseId, fileEntries.length));
 
   // remove artifacts
   await s3.deleteObject({
     Bucket: srcBucket,
     Key: srcKey
   }).promise();
-  console.log("DONE");
-};
+  timer.log({Stage: stage}, {ReleaseId: releaseId}, {
+    Files: fileEntries.length,
+    Bytes: fileEntries.reduce((total, e) => total + e.uncompressedSize, 0)
+  });
+  return invalidation ? invalidation.Invalidation.Id : null;
+}
+
+
+/**
+ * Write the outcome of the publish of a release (releases/<stage>/<release id>.json), awaited by the cli
+ **/
+async function writeReleaseStatus (bucket, stage, releaseId, status) {
+  await s3.putObject({
+    Bucket: bucket,
+    Key: "releases/"+stage+"/"+releaseId+".json",
+    Body: JSON.stringify(Object.assign({release_id: releaseId, stage: stage}, status, {
+      finished: new Date().toISOString().replace(/\.\d{3}Z$/, "+00:00")
+    })),
+    ContentType: "application/json"
+  }).promise();
+}
+
+
+/**
+ * Measure the duration of the phases of the publish and log them as CloudWatch metrics, in Embedded Metric Format.
+ * A phase run more than once is summed.
+ **/
+class PhaseTimer {
+
+  constructor () {
+    this.started = Date.now();
+    this.phases = {};
+  }
+
+  async phase (name, run) {
+    let start = Date.now();
+    try {
+      return await run();
+    } finally {
+      this.phases[name] = (this.phases[name] || 0) + Date.now() - start;
+    }
+  }
+
+  log (dimensions, properties, counts) {
+    let milliseconds = Object.assign({}, this.phases, {Total: Date.now() - this.started});
+    console.log(JSON.stringify(Object.assign({
+      _aws: {
+        Timestamp: Date.now(),
+        CloudWatchMetrics: [{
+          Namespace: METRICS_NAMESPACE,
+          Dimensions: [Object.keys(dimensions)],
+          Metrics: Object.keys(milliseconds).map((name) => ({Name: name, Unit: "Milliseconds"})).concat(
+            Object.keys(counts).map((name) => ({Name: name, Unit: name === "Bytes" ? "Bytes" : "Count"})))
+        }]
+      }
+    }, dimensions, properties, milliseconds, counts)));
+  }
+}
+
+
+/**
+ * Point the S3 origin of the CloudFront distribution to the folder of a release
+ **/
+async function switchOriginPath (distributionId, originPath) {
+  let {DistributionConfig, ETag} = await cf.getDistributionConfig({Id: distributionId}).promise();
+  let origins = DistributionConfig.Origins.Items.filter((o) => o.S3OriginConfig);
+  if (origins.every((o) => o.OriginPath === originPath)) return;
+  origins.forEach((o) => o.OriginPath = originPath);
+  await cf.updateDistribution({Id: distributionId, IfMatch: ETag, DistributionConfig: DistributionConfig}).promise();
+}
+
+
+/**
+ * Publish the code of a CloudFront Function, unless it is already the live one
+ **/
+async function publishEdgeFunction (functionName, code) {
+  let live = await cf.getFunction({Name: functionName, Stage: "LIVE"}).promise();
+  if (Buffer.from(live.FunctionCode).equals(code)) return;
+  let {FunctionSummary, ETag} = await cf.describeFunction({Name: functionName}).promise();
+  let updated = await cf.updateFunction({
+    Name: functionName,
+    IfMatch: ETag,
+    FunctionConfig: {
+      Comment: FunctionSummary.FunctionConfig.Comment,
+      Runtime: FunctionSummary.FunctionConfig.Runtime
+    },
+    FunctionCode: code
+  }).promise();
+  await cf.publishFunction({Name: functionName, IfMatch: updated.ETag}).promise();
+}
+
+
+/**
+ * Read the manifest of a published release, null if it doesn't exist
+ **/
+async function readManifest (bucket, key) {
+  try {
+    return JSON.parse((await s3.getObject({Bucket: bucket, Key: key}).promise()).Body.toString("utf8"));
+  } catch (e) {
+    if (e.code !== "NoSuchKey") throw e;
+    return null;
+  }
+}
+
+
+/**
+ * Return the paths to invalidate going from the published files to the new ones (object key -> entry of the
+ * manifest), the same computed by ManifestDiff.to_invalidate and plan_invalidation in the cli. The new objects are
+ * never cached, except the pages whose 404 response may have been
+ **/
+function planInvalidation (published, files) {
+  let keys = Object.keys(files).filter((key) =>
+    published[key] ? !sameEntry(published[key], files[key]) : key.endsWith(".html"));
+  keys = keys.concat(Object.keys(published).filter((key) => !files[key]));
+  let originals = new Set(keys);
+  let paths = new Set();
+  keys.filter((key) => !ENCODING_SUFFIXES.some((suffix) =>
+    key.endsWith(suffix) && originals.has(key.slice(0, -suffix.length))))
+    .forEach((key) => getObjectPaths(key).forEach((path) => paths.add(path)));
+  return paths.size > MAX_INVALIDATION_PATHS ? [WILDCARD_PATH] : Array.from(paths).sort();
+}
+
+
+function sameEntry (a, b) {
+  let keys = Object.keys(a);
+  return keys.length === Object.keys(b).length && keys.every((key) => a[key] === b[key]);
+}
+
+
+/**
+ * Return the URL paths serving an object: an html page is also served without extension, an index.html page also
+ * by its folder path, with and without the trailing slash
+ **/
+function getObjectPaths (key) {
+  // the same escaping of urllib.parse.quote
+  let path = "/" + key.split("/").map((part) => encodeURIComponent(part).replace(
+    /[!'()*]/g, (c) => "%" + c.charCodeAt(0).toString(16).toUpperCase())).join("/");
+  let paths = [path];
+  if (key.endsWith(".html")) {
+    paths.push(path.slice(0, -".html".length));
+    if (key === "index.html" || key.endsWith("/index.html")) {
+      paths.push(path.slice(0, -"index.html".length));
+      if (path !== "/index.html") paths.push(path.slice(0, -"/index.html".length));
+    }
+  }
+  return paths;
+}
 
 
+/**
+ * Store the contents of the release not in the blobs yet, copying them from the release folder inside S3: only the
+ * new contents are copied, once whatever the number of paths using them
+ **/
+async function storeBlobs (bucket, folder, files) {
+  let catalog = await readBlobsCatalog(bucket);
+  let missing = {};
+  for (let key of Object.keys(files)) {
+    if (!catalog.has(files[key].sha256) && !missing[files[key].sha256]) missing[files[key].sha256] = key;
+  }
+  let hashes = Object.keys(missing);
+  if (!hashes.length) return;
+  await runWithConcurrency(hashes, UPLOAD_CONCURRENCY, (sha256) => s3.copyObject({
+    Bucket: bucket,
+    CopySource: bucket + "/" + (folder + missing[sha256]).split("/").map(encodeURIComponent).join("/"),
+    Key: BLOBS_PREFIX + sha256,
+    ContentType: "application/octet-stream",
+    MetadataDirective: "REPLACE"
+  }).promise());
+  // read again, another publish may have stored other blobs in the meantime
+  catalog = await readBlobsCatalog(bucket);
+  hashes.forEach((sha256) => catalog.add(sha256));
+  await s3.putObject({
+    Bucket: bucket,
+    Key: BLOBS_CATALOG_KEY,
+    Body: JSON.stringify({version: BLOBS_CATALOG_VERSION, blobs: Array.from(catalog).sort()}),
+    ContentType: "application/json"
+  }).promise();
+}
+
+
+/**
+ * Read the hashes of the stored blobs, empty if the catalog doesn't exist yet
+ **/
+async function readBlobsCatalog (bucket) {
+  try {
+    let stored = JSON.parse(
+      (await s3.getObject({Bucket: bucket, Key: BLOBS_CATALOG_KEY}).promise()).Body.toString("utf8"));
+    if (stored.version === BLOBS_CATALOG_VERSION) return new Set(stored.blobs);
+  } catch (e) {
+    if (e.code !== "NoSuchKey") throw e;
+  }
+  return new Set();
+}
+
+
+/**
+ * Read the index of the releases of a stage (releases/<stage>.json), empty if it doesn't exist yet
+ **/
+async function readReleaseIndex (bucket, stage) {
+  try {
+    let stored = JSON.parse(
+      (await s3.getObject({Bucket: bucket, Key: "releases/"+stage+".json"}).promise()).Body.toString("utf8"));
+    if (stored.version === RELEASE_INDEX_VERSION) return stored;
+  } catch (e) {
+    if (e.code !== "NoSuchKey") throw e;
+  }
+  return {version: RELEASE_INDEX_VERSION, current: null, releases: []};
+}
+
+
+/**
+ * Record the new release in the index of the stage (releases/<stage>.json), read by the webflow-aws cli
+ **/
+async function addRelease (bucket, stage, releaseId, files) {
+  let key = "releases/"+stage+".json";
+  let index = await readReleaseIndex(bucket, stage);
+  index.releases.push({
+    id: releaseId,
+    published: new Date().toISOString().replace(/\.\d{3}Z$/, "+00:00"),
+    files: files
+  });
+  index.current = releaseId;
+  await s3.putObject({
+    Bucket: bucket,
+    Key: key,
+    Body: JSON.stringify(index, null, 2),
+    ContentType: "application/json"
+  }).promise();
+}
+
+
+/**
+ * Run the worker on every item, with at most `concurrency` workers running at the same time
+ **/
+async function runWithConcurrency (items, concurrency, worker) {
+  let nextIndex = 0;
+  let runners = [];
+  for (let i = 0; i < Math.min(concurrency, items.length); i++) {
+    runners.push((async () => {
+      while (nextIndex < items.length) {
+        await worker(items[nextIndex++]);
+      }
+    })());
+  }
+  await Promise.all(runners);
+}
+
+
+/**
+ * Read a byte range of an S3 object. The end is excluded
+ **/
+async function getRange (bucket, key, start, end) {
+  let data = await s3.getObject({
+    Bucket: bucket,
+    Key: key,
+    Range: "bytes="+start+"-"+(end - 1)
+  }).promise();
+  return data.Body;
+}
+
+
+/**
+ * Read the central directory of a zip file stored in S3 and return its entries, sorted by position in the archive.
+ * Every entry has the entryName, the compression method, the compressedSize, the offset of its local header and
+ * the dataEnd, the offset where the next entry (or the central directory) starts.
+ **/
+async function readZipEntries (bucket, key) {
+  let head = await s3.headObject({Bucket: bucket, Key: key}).promise();
+  let archiveSize = head.ContentLength;
+
+  // the end of central directory record is at the end of the file, followed by an optional comment
+  let tailStart = Math.max(0, archiveSize - EOCD_SIZE - EOCD_MAX_COMMENT_SIZE);
+  let tail = await getRange(bucket, key, tailStart, archiveSize);
+  let eocdPos = tail.length - EOCD_SIZE;
+  while (eocdPos >= 0 && tail.readUInt32LE(eocdPos) !== EOCD_SIGNATURE) eocdPos--;
+  if (eocdPos < 0) throw new Error("Invalid zip file: end of central directory not found");
+  let cdSize = tail.readUInt32LE(eocdPos + 12);
+  let cdOffset = tail.readUInt32LE(eocdPos + 16);
+
+  // zip64 archives store the real values in the zip64 end of central directory record
+  let locatorPos = eocdPos - ZIP64_EOCD_LOCATOR_SIZE;
+  if (locatorPos >= 0 && tail.readUInt32LE(locatorPos) === ZIP64_EOCD_LOCATOR_SIGNATURE) {
+    let zip64EocdOffset = Number(tail.readBigUInt64LE(locatorPos + 8));
+    let zip64Eocd = await getRange(bucket, key, zip64EocdOffset, zip64EocdOffset + ZIP64_EOCD_SIZE);
+    cdSize = Number(zip64Eocd.readBigUInt64LE(40));
+    cdOffset = Number(zip64Eocd.readBigUInt64LE(48));
+  }
+
+  let cd = await getRange(bucket, key, cdOffset, cdOffset + cdSize);
+  let entries = [];
+  let pos = 0;
+  while (pos + CENTRAL_DIRECTORY_HEADER_SIZE <= cd.length && cd.readUInt32LE(pos) === CENTRAL_DIRECTORY_SIGNATURE) {
+    let nameLength = cd.readUInt16LE(pos + 28);
+    let extraLength = cd.readUInt16LE(pos + 30);
+    let commentLength = cd.readUInt16LE(pos + 32);
+    let entry = {
+      method: cd.readUInt16LE(pos + 10),
+      compressedSize: cd.readUInt32LE(pos + 20),
+      uncompressedSize: cd.readUInt32LE(pos + 24),
+      localHeaderOffset: cd.readUInt32LE(pos + 42),
+      entryName: cd.toString("utf8", pos + CENTRAL_DIRECTORY_HEADER_SIZE, pos + CENTRAL_DIRECTORY_HEADER_SIZE + nameLength)
+    };
+    readZip64ExtraField(entry, cd.slice(
+      pos + CENTRAL_DIRECTORY_HEADER_SIZE + nameLength, pos + CENTRAL_DIRECTORY_HEADER_SIZE + nameLength + extraLength));
+    entries.push(entry);
+    pos += CENTRAL_DIRECTORY_HEADER_SIZE + nameLength + extraLength + commentLength;
+  }
+
+  // an entry data (with its optional data descriptor) ends where the next entry starts
+  entries.sort((a, b) => a.localHeaderOffset - b.localHeaderOffset);
+  for (let i = 0; i < entries.length; i++) {
+    entries[i].dataEnd = i + 1 < entries.length ? entries[i + 1].localHeaderOffset : cdOffset;
+  }
+  return entries;
+}
+
+
+/**
+ * Replace the sizes and offset saturated to 0xFFFFFFFF with the values of the zip64 extra field
+ **/
+function readZip64ExtraField (entry, extra) {
+  let pos = 0;
+  while (pos + 4 <= extra.length) {
+    let id = extra.readUInt16LE(pos);
+    let size = extra.readUInt16LE(pos + 2);
+    if (id === ZIP64_EXTRA_FIELD_ID) {
+      let fieldPos = pos + 4;
+      for (let field of ["uncompressedSize", "compressedSize", "localHeaderOffset"]) {
+        if (entry[field] === 0xFFFFFFFF && fieldPos + 8 <= pos + 4 + size) {
+          entry[field] = Number(extra.readBigUInt64LE(fieldPos));
+          fieldPos += 8;
+        }
+      }
+      return;
+    }
+    pos += 4 + size;
+  }
+}
+
 
 /**
- * Transform a buffer to a string, replace the .html with noting, then recreates the buffer
+ * Return a stream with the uncompressed content of a zip entry, read from S3 with a single ranged GET
  **/
-async function replaceHtmlLink (buffData) {
-  let utf8String = buffData.toString('utf8');
-  utf8String = utf8String.replace(/\.html(?!\?)/g, '');
-  return Buffer.from(utf8String, 'utf8');
+function openZipEntryStream (bucket, key, entry) {
+  let rawStream = s3.getObject({
+    Bucket: bucket,
+    Key: key,
+    Range: "bytes="+entry.localHeaderOffset+"-"+(entry.dataEnd - 1)
+  }).createReadStream();
+  let decoder;
+  if (entry.method === METHOD_DEFLATED) decoder = zlib.createInflateRaw();
+  else if (entry.method === METHOD_STORED) decoder = new stream.PassThrough();
+  else throw new Error("Unsupported compression method "+entry.method+" for "+entry.entryName);
+
+  let output = new stream.PassThrough();
+  pipeline(rawStream, new ZipEntryDataExtractor(entry.compressedSize), decoder, output)
+    .catch((err) => output.destroy(err));
+  return output;
+}
+
+
+/**
+ * Skip the local file header of a zip entry and pass through only its compressed data
+ **/
+class ZipEntryDataExtractor extends stream.Transform {
+
+  constructor (compressedSize) {
+    super();
+    this.header = Buffer.alloc(0);
+    this.toSkip = -1;
+    this.remaining = compressedSize;
+  }
+
+  _transform (chunk, encoding, callback) {
+    if (this.toSkip < 0) {
+      // the local header length is known once its fixed part has been read
+      this.header = Buffer.concat([this.header, chunk]);
+      if (this.header.length < LOCAL_FILE_HEADER_SIZE) return callback();
+      this.toSkip = LOCAL_FILE_HEADER_SIZE + this.header.readUInt16LE(26) + this.header.readUInt16LE(28);
+      chunk = this.header;
+      this.header = null;
+    }
+    if (this.toSkip > 0) {
+      let skipped = Math.min(this.toSkip, chunk.length);
+      this.toSkip -= skipped;
+      chunk = chunk.slice(skipped);
+    }
+    if (this.remaining > 0 && chunk.length > 0) {
+      let data = chunk.slice(0, this.remaining);
+      this.remaining -= data.length;
+      this.push(data);
+    }
+    callback();
+  }
+}
+
+
+/**
+ * Read a whole stream in a buffer
+ **/
+async function streamToBuffer (readable) {
+  let chunks = [];
+  for await (let chunk of readable) chunks.push(chunk);
+  return Buffer.concat(chunks);
 }
 
 
@@ -117,6 +609,9 @@ function getContentType (fileName) {
     case "ico":
       contentType = "image/x-icon";
       break;
+    case "webp":
+      contentType = "image/webp";
+      break;
     default:
       contentType = "application/octet-stream";
   }
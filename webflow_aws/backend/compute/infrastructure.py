@@ -1,6 +1,7 @@
 import builtins
 import os
 from pathlib import Path
+from typing import List, Optional
 
 from aws_cdk import (
     aws_cloudfront,
@@ -13,6 +14,12 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from webflow_aws.utils.invalidation import DEFAULT_MAX_INVALIDATION_PATHS
+
+DEFAULT_ARTIFACTS_LAMBDA_MEMORY_SIZE = 512
+DEFAULT_ARTIFACTS_LAMBDA_TIMEOUT = 300
+DEFAULT_ARTIFACTS_LAMBDA_UPLOAD_CONCURRENCY = 16
+
 
 class Compute(Construct):
     """
@@ -21,45 +28,74 @@ class Compute(Construct):
 
     def __init__(
             self, scope: Construct, id_: builtins.str, cloud_front_distribution: aws_cloudfront.Distribution,
-            configuration: dict):
+            configuration: dict, staging_cloud_front_distribution: Optional[aws_cloudfront.Distribution] = None,
+            cloud_front_function: Optional[aws_cloudfront.Function] = None,
+            staging_cloud_front_function: Optional[aws_cloudfront.Function] = None):
         super().__init__(scope, id_)
+        cloud_front_distributions = [cloud_front_distribution]
+        if staging_cloud_front_distribution:
+            cloud_front_distributions.append(staging_cloud_front_distribution)
         self.__create_s3_trigger_lambda_execution_role(
-            bucket_name=configuration['bucket_name'], cloudfront_distribution=cloud_front_distribution)
-        self.__create_s3_trigger_lambda_function(cloud_front_distribution=cloud_front_distribution)
+            bucket_name=configuration['bucket_name'], cloudfront_distributions=cloud_front_distributions,
+            cloudfront_functions=[function for function in (cloud_front_function, staging_cloud_front_function)
+                                  if function])
+        self.__create_s3_trigger_lambda_function(
+            cloud_front_distribution=cloud_front_distribution,
+            staging_cloud_front_distribution=staging_cloud_front_distribution,
+            cloud_front_function=cloud_front_function, staging_cloud_front_function=staging_cloud_front_function,
+            lambda_configuration=configuration.get('artifacts_lambda') or {},
+            invalidation_max_paths=configuration.get('invalidation_max_paths', DEFAULT_MAX_INVALIDATION_PATHS))
 
     def __create_s3_trigger_lambda_execution_role(
-            self, bucket_name: str, cloudfront_distribution: aws_cloudfront.Distribution):
+            self, bucket_name: str, cloudfront_distributions: List[aws_cloudfront.Distribution],
+            cloudfront_functions: List[aws_cloudfront.Function]):
         """
         Create the IAM role to be used by the AWS lambda function that manages the publication of the updates
         in the correct S3 bucket folder and invalidates the CDN.
 
         :param bucket_name: the bucket name the AWS lambda function will be allowed to access
-        :param cloudfront_distribution: the CDN distribution the AWS lambda function will be allowed to invalidate
+        :param cloudfront_distributions: the CDN distributions the AWS lambda function will be allowed to switch and
+        invalidate, one for every stage
+        :param cloudfront_functions: the CloudFront Functions the AWS lambda function will be allowed to publish,
+        one for every stage, if the website uses them
         """
+        statements = [aws_iam.PolicyStatement(
+            effect=aws_iam.Effect.ALLOW,
+            actions=[
+                's3:PutObject', 's3:GetObject', 's3:AbortMultipartUpload', 's3:ListObject', 's3:DeleteObject',
+                's3:HeadBucket', 's3:ListBucket', 'cloudfront:CreateInvalidation', 'cloudfront:GetDistributionConfig',
+                'cloudfront:UpdateDistribution'],
+            resources=[
+                f'arn:aws:cloudfront::{Fn.ref("AWS::AccountId")}:distribution/'
+                f'{cloudfront_distribution.distribution_id}'
+                for cloudfront_distribution in cloudfront_distributions] + [
+                f'arn:aws:s3:::{bucket_name}',
+                f'arn:aws:s3:::{bucket_name}/*'])]
+        if cloudfront_functions:
+            statements.append(aws_iam.PolicyStatement(
+                effect=aws_iam.Effect.ALLOW,
+                actions=[
+                    'cloudfront:GetFunction', 'cloudfront:DescribeFunction', 'cloudfront:UpdateFunction',
+                    'cloudfront:PublishFunction'],
+                resources=[cloudfront_function.function_arn for cloudfront_function in cloudfront_functions]))
         self.s3_trigger_lambda_execution_role = aws_iam.Role(
             self,
             "S3TriggerLambdaExecutionRole",
             assumed_by=aws_iam.ServicePrincipal('lambda.amazonaws.com'),
             description='Execution role that allows the lambda function to get the uploaded zip from S3, upload the '
-                        'unpacked one and invalidate the CDN',
+                        'unpacked one, switch the CDN to it and invalidate the CDN',
             path='/',
             managed_policies=[
                 aws_iam.ManagedPolicy.from_aws_managed_policy_name('service-role/AWSLambdaBasicExecutionRole')],
             inline_policies={
-                's3_trigger_artifacts-upload-role': aws_iam.PolicyDocument(
-                    statements=[aws_iam.PolicyStatement(
-                        effect=aws_iam.Effect.ALLOW,
-                        actions=[
-                            's3:PutObject', 's3:GetObject', 's3:ListObject', 's3:DeleteObject', 's3:HeadBucket',
-                            'cloudfront:CreateInvalidation'],
-                        resources=[
-                            f'arn:aws:cloudfront::{Fn.ref("AWS::AccountId")}:distribution/'
-                            f'{cloudfront_distribution.distribution_id}',
-                            f'arn:aws:s3:::{bucket_name}',
-                            f'arn:aws:s3:::{bucket_name}/*'])])})
+                's3_trigger_artifacts-upload-role': aws_iam.PolicyDocument(statements=statements)})
 
     def __create_s3_trigger_lambda_function(
-            self, cloud_front_distribution: aws_cloudfront.Distribution
+            self, cloud_front_distribution: aws_cloudfront.Distribution,
+            staging_cloud_front_distribution: Optional[aws_cloudfront.Distribution],
+            cloud_front_function: Optional[aws_cloudfront.Function],
+            staging_cloud_front_function: Optional[aws_cloudfront.Function], lambda_configuration: dict,
+            invalidation_max_paths: int
     ):
         """
         Create an AWS Lambda function that is responsible for unzipping the uploaded files, move the files to
@@ -67,8 +103,30 @@ class Compute(Construct):
 
         :param cloud_front_distribution: the cloudfront distribution the AWS lambda function will be allowed
         to invalidate. It will be set as environment variables named CDN_DISTRIBUTION_ID
+        :param staging_cloud_front_distribution: the cloudfront distribution serving the alpha stage, if enabled. It
+        will be set as environment variables named STAGING_CDN_DISTRIBUTION_ID
+        :param cloud_front_function: the CloudFront Function of the main distribution, if used. Its name will be set as
+        environment variable named EDGE_FUNCTION_NAME, to publish it with the pages of every new release
+        :param staging_cloud_front_function: the CloudFront Function of the staging distribution, if used. Its name
+        will be set as environment variable named STAGING_EDGE_FUNCTION_NAME
+        :param lambda_configuration: the artifacts_lambda section of the configuration, with the optional
+        memory_size (MB), timeout (seconds) and upload_concurrency values
+        :param invalidation_max_paths: the maximum number of changed paths invalidated, above it the whole
+        distribution is invalidated. It will be set as environment variable named INVALIDATION_MAX_PATHS
         """
         print(Path(__file__).absolute().parent.parent.parent.__str__())
+        environment = {
+            'CDN_DISTRIBUTION_ID': cloud_front_distribution.distribution_id,
+            'UPLOAD_CONCURRENCY': str(lambda_configuration.get(
+                'upload_concurrency', DEFAULT_ARTIFACTS_LAMBDA_UPLOAD_CONCURRENCY)),
+            'INVALIDATION_MAX_PATHS': str(invalidation_max_paths)
+        }
+        if staging_cloud_front_distribution:
+            environment['STAGING_CDN_DISTRIBUTION_ID'] = staging_cloud_front_distribution.distribution_id
+        if cloud_front_function:
+            environment['EDGE_FUNCTION_NAME'] = cloud_front_function.function_name
+        if staging_cloud_front_function:
+            environment['STAGING_EDGE_FUNCTION_NAME'] = staging_cloud_front_function.function_name
         self.s3_trigger_lambda = lambda_nodejs.NodejsFunction(
             self,
             'S3TriggerLambdaFunction',
@@ -82,12 +140,12 @@ class Compute(Construct):
             role=self.s3_trigger_lambda_execution_role,
             runtime=aws_lambda.Runtime.NODEJS_16_X,
             architecture=aws_lambda.Architecture.ARM_64,
-            timeout=Duration.seconds(300),
-            memory_size=1024,
+            # the zip file is streamed, so the memory doesn't depend on the size of the website
+            timeout=Duration.seconds(lambda_configuration.get('timeout', DEFAULT_ARTIFACTS_LAMBDA_TIMEOUT)),
+            memory_size=lambda_configuration.get('memory_size', DEFAULT_ARTIFACTS_LAMBDA_MEMORY_SIZE),
             bundling={
-                "node_modules": ["adm-zip"],
                 "minify": True
             },
-            environment={'CDN_DISTRIBUTION_ID': cloud_front_distribution.distribution_id},
+            environment=environment,
             log_retention=logs.RetentionDays.TWO_WEEKS
         )
@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+EDGE_RUNTIME_LAMBDA_EDGE = 'lambda_edge'
+EDGE_RUNTIME_CLOUDFRONT_FUNCTION = 'cloudfront_function'
+# maximum size of the code of a CloudFront Function
+MAX_FUNCTION_CODE_SIZE = 10 * 1024
+TEMPLATE_PATH = Path(__file__).absolute().parent / 'functions' / 'editPathForOrigin.cloudfront.js'
+# the language routing, shared with the AWS Lambda @edge
+LANGUAGE_ROUTING_PATH = Path(__file__).absolute().parent / 'functions' / 'checkLanguage.js'
+NOT_FOUND_PAGE_KEY = '404.html'
+
+
+class FunctionCodeTooLarge(Exception):
+    """
+    Raised when the generated CloudFront Function code exceeds the maximum size allowed by CloudFront
+    """
+    pass
+
+
+def get_edge_runtime(configuration: Dict) -> str:
+    """
+    :param configuration: the configuration of the website
+    :return: the runtime of the function rewriting the viewer requests, lambda_edge (default) or cloudfront_function
+    """
+    return configuration.get('edge_runtime', EDGE_RUNTIME_LAMBDA_EDGE)
+
+
+def get_pages(keys: List[str]) -> List[str]:
+    """
+    Get the pages of the website, in the format used by the CloudFront Function lookup table
+
+    :param keys: the keys of the published objects
+    :return: the paths of the html pages without extension (ex. /about, /blog/index)
+    """
+    return sorted('/' + key[:-len('.html')] for key in keys if key.endswith('.html'))
+
+
+def build_cloud_front_function_code(compression: Dict, keys: Optional[List[str]] = None,
+                                    localization: Optional[Dict] = None,
+                                    redirects: Optional[Dict[str, str]] = None) -> str:
+    """
+    Generate the code of the edit path for origin CloudFront Function
+
+    :param compression: the compression configuration, with the enabled flag, the encodings and the extensions
+    :param keys: the keys of the published objects, used to build the lookup table of the pages. If None, the
+    function sends every request to the origin
+    :param localization: the settings of the language routing, see get_edge_localization. None if the website is
+    not localized
+    :param redirects: the lookup table of the redirects, see load_website_redirects
+    :return: the code of the function
+    :raise FunctionCodeTooLarge: if the code exceeds the CloudFront Function size limit
+    """
+    pages = get_pages(keys) if keys is not None else []
+    code = TEMPLATE_PATH.read_text()
+    if localization:
+        code += '\n' + LANGUAGE_ROUTING_PATH.read_text()
+    replacements = {
+        "'__PAGES__'": json.dumps(f'|{"|".join(pages)}|' if pages else ''),
+        '__HAS_NOT_FOUND_PAGE__': json.dumps(keys is None or NOT_FOUND_PAGE_KEY in keys),
+        '__COMPRESSION_ENCODINGS__': json.dumps(compression['encodings'] if compression['enabled'] else []),
+        '__COMPRESSION_EXTENSIONS__': json.dumps(compression['extensions']),
+        '__LOCALIZATION__': json.dumps(localization),
+        '__REDIRECTS__': json.dumps(redirects or {}, separators=(',', ':'))
+    }
+    for placeholder, value in replacements.items():
+        code = code.replace(placeholder, value)
+    # comments and indentation count in the size limit
+    lines = (line.strip() for line in code.splitlines())
+    code = '\n'.join(line for line in lines if line and not line.startswith('//'))
+    code_size = len(code.encode('utf-8'))
+    if code_size > MAX_FUNCTION_CODE_SIZE:
+        raise FunctionCodeTooLarge(
+            f'The CloudFront Function code is {code_size} bytes, the maximum is {MAX_FUNCTION_CODE_SIZE} bytes')
+    return code
@@ -0,0 +1,90 @@
+// Language routing of the localized websites. It's shared by the AWS Lambda @edge, that requires it as a module,
+// and by the CloudFront Function, whose code is appended by webflow-aws, so it's written in ES 5.1.
+//
+// The default locale is served from the root of the website and every other locale from its folder
+// (ex. /it/about). The language of a page is given by its path only: the language cookie and the Accept-Language
+// header are read to redirect the visitors landing on a page of the default locale, but they are never part of
+// the CDN cache key, so every cached page is shared by all the visitors.
+//
+// config: {"default": "en", "locales": ["it", "fr"], "cookie": "language", "pages": "|/it/about|/it/index|"}
+// pages is the '|'-separated list of the translated pages, without the .html extension. Without it, every page is
+// considered translated
+
+
+// returns the locale of the folder of the path (ex. it for /it/about), or null for the default locale
+function getLocalePrefix(config, uri) {
+    var folder = uri.split('/')[1];
+    return config.locales.indexOf(folder) !== -1 ? folder : null;
+}
+
+// true if the path is a page (ex. /about, /about.html, /blog/), false if it's an asset (ex. /css/site.css)
+function isPagePath(uri) {
+    var fileName = uri.substring(uri.lastIndexOf('/') + 1);
+    return fileName.indexOf('.') === -1 || fileName.slice(-5) === '.html';
+}
+
+// returns the locale of the website matching a language tag (ex. it-IT matches it), or null
+function matchLocale(config, tag) {
+    if (!tag) return null;
+    tag = tag.trim().toLowerCase();
+    var locales = [config.default].concat(config.locales);
+    if (locales.indexOf(tag) !== -1) return tag;
+    var language = tag.split('-')[0];
+    for (var i = 0; i < locales.length; i++) {
+        if (locales[i].split('-')[0] === language) return locales[i];
+    }
+    return null;
+}
+
+// returns the language tags of the Accept-Language header, sorted by preference
+function getAcceptedLanguages(header) {
+    var languages = [];
+    var items = header.split(',');
+    for (var i = 0; i < items.length; i++) {
+        var params = items[i].trim().split(';');
+        var q = 1;
+        for (var j = 1; j < params.length; j++) {
+            var param = params[j].trim();
+            if (param.indexOf('q=') === 0) q = parseFloat(param.substring(2));
+        }
+        if (params[0].trim() && q > 0) languages.push({tag: params[0].trim(), q: q, position: i});
+    }
+    languages.sort(function (a, b) { return b.q - a.q || a.position - b.position; });
+    return languages.map(function (language) { return language.tag; });
+}
+
+// true if the page of the path (ex. /it/about, /it/blog/) has been translated
+function isTranslated(config, uri) {
+    if (typeof config.pages !== 'string') return true;
+    var fileName = uri.substring(uri.lastIndexOf('/') + 1);
+    var page = fileName === '' ? uri + 'index' : fileName.slice(-5) === '.html' ? uri.slice(0, -5) : uri;
+    // a folder path without trailing slash is served by its index page
+    return config.pages.indexOf('|' + page + '|') !== -1 ||
+        (page === uri && config.pages.indexOf('|' + uri + '/index|') !== -1);
+}
+
+// true if the referer (ex. https://www.example.com/about) is a page of the website
+function isInternalReferer(referer, host) {
+    return !!referer && !!host && referer.split('/')[2] === host;
+}
+
+// returns the path the visitor has to be redirected to, or null if the request has to be served as it is.
+// Only the visitors landing on the website are redirected to their language: the ones following a link of the
+// website (ex. the language switcher) get the page they asked for, and so do the visitors asking for a page not
+// translated in their language
+function getLanguageRedirect(config, uri, host, referer, cookie, acceptLanguage) {
+    var prefix = getLocalePrefix(config, uri);
+    // the home page of a locale is served on its folder, so that the relative links of the page work
+    if (prefix !== null) return uri === '/' + prefix ? uri + '/' : null;
+    // the assets are shared by all the locales
+    if (!isPagePath(uri) || isInternalReferer(referer, host)) return null;
+    var locale = matchLocale(config, cookie);
+    if (locale === null && acceptLanguage) {
+        var accepted = getAcceptedLanguages(acceptLanguage);
+        for (var i = 0; i < accepted.length && locale === null; i++) locale = matchLocale(config, accepted[i]);
+    }
+    if (locale === null || locale === config.default) return null;
+    return isTranslated(config, '/' + locale + uri) ? '/' + locale + uri : null;
+}
+
+if (typeof module !== 'undefined') module.exports = {getLanguageRedirect: getLanguageRedirect};
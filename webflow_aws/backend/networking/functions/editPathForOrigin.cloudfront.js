@@ -0,0 +1,133 @@
+// CloudFront Function (cloudfront-js-1.0 runtime, ES 5.1) equivalent of editPathForOrigin.js.
+// The settings between double underscores are replaced by webflow-aws, see cloudfront_function.py. With the
+// localization, the code of checkLanguage.js is appended
+
+// '|'-separated list of the published pages, without the .html extension (ex. |/about|/blog/index|).
+// Empty when the list is not known yet: every request is sent to the origin
+var PAGES = '__PAGES__';
+// true if the website has a 404.html page, served by the CloudFront error response
+var HAS_NOT_FOUND_PAGE = __HAS_NOT_FOUND_PAGE__;
+// the key, never published, requested for all the missing pages: they share the same cache key, so that the error
+// response with the 404 page is cached once per edge location instead of once per missing path
+var NOT_FOUND_URI = '/.webflow-aws-not-found';
+var COMPRESSION_ENCODINGS = __COMPRESSION_ENCODINGS__;
+var COMPRESSION_EXTENSIONS = __COMPRESSION_EXTENSIONS__;
+var ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'};
+// the locales of the website (see checkLanguage.js), null if the website is not localized
+var LOCALIZATION = __LOCALIZATION__;
+// the redirects of the website: source path without trailing slash -> target path or URL
+var REDIRECTS = __REDIRECTS__;
+
+function handler(event) {
+    var request = event.request;
+    var target = getRedirect(request.uri);
+    if (target !== null) return {
+        statusCode: 301,
+        statusDescription: 'Moved Permanently',
+        headers: {
+            'location': {value: target.indexOf('?') === -1 ? target + getQueryString(request.querystring) : target}
+        }
+    };
+    if (LOCALIZATION) {
+        var cookie = request.cookies[LOCALIZATION.cookie];
+        var location = getLanguageRedirect(
+            LOCALIZATION, request.uri, getHeader(request.headers, 'host'), getHeader(request.headers, 'referer'),
+            cookie ? cookie.value : null, getHeader(request.headers, 'accept-language'));
+        // the redirect is never cached: the same path is redirected to different languages
+        if (location && isPublished(location)) return {
+            statusCode: 302,
+            statusDescription: 'Found',
+            headers: {
+                'location': {value: location + getQueryString(request.querystring)},
+                'cache-control': {value: 'private, no-store'}
+            }
+        };
+    }
+    var uri = resolveUri(request.uri);
+    if (uri === null) {
+        return {statusCode: 404, statusDescription: 'Not Found'};
+    }
+    if (uri === NOT_FOUND_URI) {
+        request.uri = uri;
+        request.querystring = {};
+        return request;
+    }
+    var encoding = getAcceptedEncoding(request.headers, uri);
+    if (encoding) uri = uri + ENCODING_SUFFIXES[encoding];
+    request.uri = uri;
+    return request;
+}
+
+function isPage(page) {
+    return PAGES.indexOf('|' + page + '|') !== -1;
+}
+
+// returns the page of a path without the .html extension (index for folders), or null if the path is a file with
+// another extension (ex .css)
+function getPage(uri) {
+    var fileName = uri.substring(uri.lastIndexOf('/') + 1);
+    if (fileName === '') return uri + 'index';
+    if (fileName.indexOf('.') === -1) return uri;
+    if (fileName.slice(-5) === '.html') return uri.slice(0, -5);
+    return null;
+}
+
+// appends .html to universal paths and index.html to folders, preserving files with other extensions (ex .css).
+// With the list of pages, a folder path without trailing slash is served by its index page and a missing page
+// returns NOT_FOUND_URI, or null when there is no 404 page
+function resolveUri(uri) {
+    var page = getPage(uri);
+    if (page === null) return uri;
+    if (PAGES === '' || isPage(page)) return page + '.html';
+    if (page === uri && isPage(uri + '/index')) return uri + '/index.html';
+    return HAS_NOT_FOUND_PAGE ? NOT_FOUND_URI : null;
+}
+
+// false if the path is a page missing from the list of pages
+function isPublished(uri) {
+    var page = getPage(uri);
+    return PAGES === '' || page === null || isPage(page) || (page === uri && isPage(uri + '/index'));
+}
+
+// returns the target of the redirect of a path, or null. The lookup in the table takes the same time for any
+// number of redirects
+function getRedirect(uri) {
+    var path = uri.length > 1 && uri.slice(-1) === '/' ? uri.slice(0, -1) : uri;
+    return Object.prototype.hasOwnProperty.call(REDIRECTS, path) ? REDIRECTS[path] : null;
+}
+
+function getHeader(headers, name) {
+    return headers[name] ? headers[name].value : null;
+}
+
+function getQueryString(querystring) {
+    var parts = [];
+    for (var name in querystring) {
+        var values = querystring[name].multiValue || [querystring[name]];
+        for (var i = 0; i < values.length; i++) {
+            parts.push(values[i].value === '' ? name : name + '=' + values[i].value);
+        }
+    }
+    return parts.length ? '?' + parts.join('&') : '';
+}
+
+// returns the preferred encoding, among the ones published, accepted by the browser for the requested file
+function getAcceptedEncoding(headers, uri) {
+    var ext = uri.substring(uri.lastIndexOf('.') + 1).toLowerCase();
+    if (COMPRESSION_EXTENSIONS.indexOf(ext) === -1 || !headers['accept-encoding']) return undefined;
+    var accepted = [];
+    var items = headers['accept-encoding'].value.split(',');
+    for (var i = 0; i < items.length; i++) {
+        var params = items[i].trim().split(';');
+        var q = 1;
+        for (var j = 1; j < params.length; j++) {
+            var param = params[j].trim();
+            if (param.indexOf('q=') === 0) q = parseFloat(param.substring(2));
+        }
+        if (q > 0) accepted.push(params[0].trim().toLowerCase());
+    }
+    for (var k = 0; k < COMPRESSION_ENCODINGS.length; k++) {
+        if (accepted.indexOf(COMPRESSION_ENCODINGS[k]) !== -1) return COMPRESSION_ENCODINGS[k];
+    }
+    return undefined;
+}
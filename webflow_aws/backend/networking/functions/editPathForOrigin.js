@@ -1,8 +1,28 @@
 var path = require('path');
+var languages = require('./checkLanguage.js');
+
+// generated by webflow-aws at deploy time, see Networking.__build_edit_path_for_origin_code
+const CONFIG = loadConfig();
+const ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"};
 
 exports.lambdaHandler = async (event) => {
 
-  let uri = event.Records[0].cf.request.uri;
+  let request = event.Records[0].cf.request;
+  let target = getRedirect(request.uri);
+  if (target !== undefined) {
+    let location = target.includes("?") || !request.querystring ? target : target + "?" + request.querystring;
+    return generateRedirectResponse(location, '301', 'Moved Permanently');
+  }
+  if (CONFIG.localization) {
+    let location = languages.getLanguageRedirect(
+      CONFIG.localization, request.uri, getHeaderValue(request.headers, 'host'),
+      getHeaderValue(request.headers, 'referer'), getCookie(request.headers, CONFIG.localization.cookie),
+      getHeaderValue(request.headers, 'accept-language'));
+    if (location) return generateRedirectResponse(
+      location + (request.querystring ? "?" + request.querystring : ""), '302', 'Found', 'private, no-store');
+  }
+
+  let uri = request.uri;
   let uriParts = uri.split("/");
 
   let index_uriPartsLastItem = uriParts.length - 1;
@@ -15,7 +35,116 @@ exports.lambdaHandler = async (event) => {
   }
 
   uri = uriParts.join("/");
+
+  // serve the pre-compressed variant of text files, if the browser accepts it
+  let encoding = getAcceptedEncoding(event.Records[0].cf.request.headers, uri);
+  if (encoding) uri = uri + ENCODING_SUFFIXES[encoding];
+
   event.Records[0].cf.request.uri = uri;
 
   return event.Records[0].cf.request;
-};
\ No newline at end of file
+};
+
+
+/**
+ * Load the configuration generated at deploy time. Without it, the function only rewrites the paths
+ **/
+function loadConfig () {
+  try {
+    return require('./editPathForOrigin.config.json');
+  } catch (e) {
+    return {compression: {encodings: [], extensions: []}, localization: null, redirects: {}};
+  }
+}
+
+
+/**
+ * Return the preferred encoding, among the ones published, accepted by the browser for the requested file
+ *
+ * @param {Object} headers - the request headers
+ * @param {string} uri - the rewritten uri of the request
+ *
+ * @return {string | undefined} the encoding (br or gzip), or undefined if the file has to be served uncompressed
+ **/
+function getAcceptedEncoding (headers, uri) {
+  let ext = path.extname(uri).substring(1).toLowerCase();
+  if (!CONFIG.compression.extensions.includes(ext) || !headers['accept-encoding']) return undefined;
+  let accepted = [];
+  for (let header of headers['accept-encoding']) {
+    for (let item of header.value.split(",")) {
+      let [name, ...params] = item.trim().split(";");
+      let q = params.map((p) => p.trim()).find((p) => p.startsWith("q="));
+      if (!q || parseFloat(q.substring(2)) > 0) accepted.push(name.trim().toLowerCase());
+    }
+  }
+  // the configured encodings are sorted by preference
+  return CONFIG.compression.encodings.find((e) => accepted.includes(e));
+}
+
+
+/**
+ * Return the value of a request header, or undefined
+ *
+ * @param {Object} headers - the request headers
+ * @param {string} name - the lower case name of the header
+ *
+ * @return {string | undefined} the value of the first header with the name
+ **/
+function getHeaderValue (headers, name) {
+  return headers[name] && headers[name].length ? headers[name][0].value : undefined;
+}
+
+
+/**
+ * Return the value of a cookie, or undefined. A request can have many Cookie headers
+ *
+ * @param {Object} headers - the request headers
+ * @param {string} name - the name of the cookie
+ *
+ * @return {string | undefined} the value of the cookie
+ **/
+function getCookie (headers, name) {
+  for (let header of headers['cookie'] || []) {
+    for (let cookie of header.value.split(";")) {
+      let [key, ...value] = cookie.trim().split("=");
+      if (key === name) return value.join("=");
+    }
+  }
+  return undefined;
+}
+
+
+/**
+ * Return the target of the redirect of a path, or undefined. The lookup in the table takes the same time for any
+ * number of redirects
+ *
+ * @param {string} uri - the requested path
+ *
+ * @return {string | undefined} the target path or URL
+ **/
+function getRedirect (uri) {
+  let source = uri.length > 1 && uri.endsWith("/") ? uri.slice(0, -1) : uri;
+  return Object.prototype.hasOwnProperty.call(CONFIG.redirects, source) ? CONFIG.redirects[source] : undefined;
+}
+
+
+/**
+ * Generate a redirect response. The redirects to the language of the visitor are never cached, since the same
+ * path is redirected to different languages
+ *
+ * @param {string} location - the target of the redirect, with the query string
+ * @param {string} status - the status code, 301 or 302
+ * @param {string} statusDescription - the description of the status
+ * @param {string} cacheControl - the Cache-Control header of the response, if any
+ *
+ * @return {Object} the response returned by the function
+ **/
+function generateRedirectResponse (location, status, statusDescription, cacheControl) {
+  let response = {
+    status: status,
+    statusDescription: statusDescription,
+    headers: {'location': [{key: 'Location', value: location}]}
+  };
+  if (cacheControl) response.headers['cache-control'] = [{key: 'Cache-Control', value: cacheControl}];
+  return response;
+}
@@ -1,7 +1,10 @@
 import builtins
+import json
 import os
+import shutil
+import tempfile
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 
 from aws_cdk import (
     aws_certificatemanager,
@@ -15,44 +18,165 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from webflow_aws.backend.networking.cloudfront_function import (
+    EDGE_RUNTIME_CLOUDFRONT_FUNCTION, build_cloud_front_function_code, get_edge_runtime)
+from webflow_aws.utils.cache_tiers import ONE_YEAR, get_cache_tiers, get_cdn_ttl, get_default_behavior_tier
+from webflow_aws.utils.compression import get_compression_configuration
+from webflow_aws.utils.localization import LOCALIZED_PAGES_CONFIGURATION_KEY, get_edge_localization
+from webflow_aws.utils.redirects import REDIRECTS_CONFIGURATION_KEY
+from webflow_aws.utils.performance import get_performance_configuration, get_response_headers
+from webflow_aws.utils.releases import get_release_origin_path
+from webflow_aws.utils.stages import PROD_STAGE, STAGING_STAGE, get_staging_configuration
+from webflow_aws.utils.storage import get_edge_stack_name
+
+HTTP_VERSIONS = {
+    'http1.1': aws_cloudfront.HttpVersion.HTTP1_1,
+    'http2': aws_cloudfront.HttpVersion.HTTP2,
+    'http2and3': aws_cloudfront.HttpVersion.HTTP2_AND_3,
+    'http3': aws_cloudfront.HttpVersion.HTTP3
+}
+PRICE_CLASSES = {
+    'PriceClass_100': aws_cloudfront.PriceClass.PRICE_CLASS_100,
+    'PriceClass_200': aws_cloudfront.PriceClass.PRICE_CLASS_200,
+    'PriceClass_All': aws_cloudfront.PriceClass.PRICE_CLASS_ALL
+}
+
+
+def get_alternative_domain_names(configuration: dict) -> Optional[List[str]]:
+    """
+    :param configuration: the configuration of the website
+    :return: the alternative domain names of the SSL certificate. It covers the staging domain too, so that both
+    distributions share it
+    """
+    staging = get_staging_configuration(configuration)
+    alternative_domain_names = configuration['CNAMEs']
+    if staging['enabled'] and staging['domain_name']:
+        alternative_domain_names = list(alternative_domain_names or []) + [staging['domain_name']]
+    return alternative_domain_names
+
 
 class Networking(Construct):
     """
     The networking construct that contains all the AWS networking services and IAM roles used by them.
     """
 
-    def __init__(self, scope: Construct, id_: builtins.str, configuration: dict):
+    def __init__(self, scope: Construct, id_: builtins.str, configuration: dict,
+                 ssl_certificate: Optional[aws_certificatemanager.ICertificate] = None):
         super().__init__(scope, id_)
+        staging = get_staging_configuration(configuration)
+        performance = get_performance_configuration(configuration)
+        response_headers = get_response_headers(configuration)
         # load the existing route 53 hosted zone
         self.__load_route_53_hosted_zone(
             hosted_zone_id=configuration['route_53_hosted_zone_id'],
             hosted_zone_name=configuration['route_53_hosted_zone_name'])
         self.__create_cloud_front_origin_access_identity()
-        self.__create_cloud_front_cache_policy()
-        self.__create_ssl_certificate(
-            route_53_hosted_zone=self.route_53_hosted_zone,
-            domain_name=configuration['domain_name'], alternative_domain_names=configuration['CNAMEs'])
-        self.__create_cloud_front_edit_path_for_origin_lambda_edge()
-        self.__create_main_cloud_front_distribution(
+        self.__create_cloud_front_cache_policies(cache_tiers=get_cache_tiers(configuration))
+        # outside us-east-1, the certificate is created by the Edge stack: CloudFront reads it from us-east-1 only
+        self.ssl_certificate = ssl_certificate
+        if not ssl_certificate:
+            self.__create_ssl_certificate(
+                route_53_hosted_zone=self.route_53_hosted_zone, domain_name=configuration['domain_name'],
+                alternative_domain_names=get_alternative_domain_names(configuration))
+        self.cloud_front_edit_path_for_origin_lambda_edge = None
+        self.cloud_front_edit_path_for_origin_function = None
+        self.staging_cloud_front_edit_path_for_origin_function = None
+        if get_edge_runtime(configuration) == EDGE_RUNTIME_CLOUDFRONT_FUNCTION:
+            self.cloud_front_edit_path_for_origin_function = self.__create_cloud_front_edit_path_for_origin_function(
+                'CloudFrontEditPathForOriginFunction', configuration=configuration)
+            if staging['enabled']:
+                # the lookup table of the pages depends on the release served, so every stage has its own function
+                self.staging_cloud_front_edit_path_for_origin_function = \
+                    self.__create_cloud_front_edit_path_for_origin_function(
+                        'CloudFrontEditPathForOriginFunctionStaging', configuration=configuration)
+        else:
+            self.__create_cloud_front_edit_path_for_origin_lambda_edge(configuration=configuration)
+        self.response_headers_policy = None
+        if response_headers:
+            self.response_headers_policy = self.__create_response_headers_policy(
+                'CloudFrontResponseHeadersPolicy', comment='Response headers of the website',
+                headers=response_headers)
+        domain_names = list(configuration['CNAMEs'] or []) + [configuration['domain_name']]
+        self.main_cloud_front_distribution = self.__create_cloud_front_distribution(
+            'CloudFrontMain', stage=PROD_STAGE, comment='CloudFront Distribution for your main static website',
             ssl_certificate=self.ssl_certificate, cache_policy=self.cloud_front_cache_policy,
-            domain_name=configuration['domain_name'], alternative_domain_names=configuration['CNAMEs'],
+            cache_tier_policies=self.cloud_front_cache_tier_policies, domain_names=list(set(domain_names)),
             origin_access_identity=self.cloud_front_origin_access_identity,
             cloud_front_edit_path_for_origin_lambda_edge=self.cloud_front_edit_path_for_origin_lambda_edge,
-            origin_bucket_name=configuration['bucket_name'])
+            cloud_front_edit_path_for_origin_function=self.cloud_front_edit_path_for_origin_function,
+            origin_bucket_name=configuration['bucket_name'], current_release=configuration.get('current_release'),
+            performance=performance, response_headers_policy=self.response_headers_policy)
+        self.staging_cloud_front_distribution = None
+        if staging['enabled']:
+            # the staging responses carry the headers of the website too, so that they can be verified before
+            # promoting a release
+            self.staging_response_headers_policy = self.__create_response_headers_policy(
+                'CloudFrontStagingResponseHeadersPolicy',
+                comment='Response headers of the staging version of the website',
+                headers=response_headers + [('X-Robots-Tag', 'noindex')])
+            self.staging_cloud_front_distribution = self.__create_cloud_front_distribution(
+                'CloudFrontStaging', stage=STAGING_STAGE,
+                comment='CloudFront Distribution for the staging version of your static website',
+                ssl_certificate=self.ssl_certificate, cache_policy=self.cloud_front_cache_policy,
+                cache_tier_policies=self.cloud_front_cache_tier_policies,
+                domain_names=[staging['domain_name']] if staging['domain_name'] else [],
+                origin_access_identity=self.cloud_front_origin_access_identity,
+                cloud_front_edit_path_for_origin_lambda_edge=self.cloud_front_edit_path_for_origin_lambda_edge,
+                cloud_front_edit_path_for_origin_function=self.staging_cloud_front_edit_path_for_origin_function,
+                origin_bucket_name=configuration['bucket_name'],
+                current_release=configuration.get('current_staging_release'), performance=performance,
+                response_headers_policy=self.staging_response_headers_policy)
+
+    @staticmethod
+    def __build_edit_path_for_origin_code(configuration: dict) -> str:
+        """
+        Build the code folder of the edit path for origin AWS Lambda @edge, with the language routing it requires.
+        Lambda @edge functions don't support environment variables, so the settings are stored in a json file next
+        to the handler.
+
+        :param configuration: the configuration of the website
+        :return: the path of the folder with the code of the function
+        """
+        code_folder = tempfile.mkdtemp(prefix='webflow-aws-edge-')
+        shutil.copyfile(
+            Path(__file__).absolute().parent.parent.parent.__str__() +
+            "/backend/networking/functions/editPathForOrigin.js",
+            os.path.join(code_folder, 'editPathForOrigin.js'))
+        shutil.copyfile(
+            Path(__file__).absolute().parent.parent.parent.__str__() + "/backend/networking/functions/checkLanguage.js",
+            os.path.join(code_folder, 'checkLanguage.js'))
+        compression = get_compression_configuration(configuration)
+        localization = get_edge_localization(configuration)
+        localized_pages = configuration.get(LOCALIZED_PAGES_CONFIGURATION_KEY)
+        if localization and localized_pages is not None:
+            # same '|'-separated format as the lookup table of the CloudFront Function
+            localization['pages'] = f'|{"|".join(localized_pages)}|'
+        edge_config = {
+            'compression': {
+                'encodings': compression['encodings'] if compression['enabled'] else [],
+                'extensions': compression['extensions']
+            },
+            'localization': localization,
+            'redirects': configuration.get(REDIRECTS_CONFIGURATION_KEY) or {}
+        }
+        with open(os.path.join(code_folder, 'editPathForOrigin.config.json'), 'w') as f:
+            json.dump(edge_config, f, sort_keys=True)
+        return code_folder
 
-    def __create_cloud_front_edit_path_for_origin_lambda_edge(self):
+    def __create_cloud_front_edit_path_for_origin_lambda_edge(self, configuration: dict):
         """
         Create a new AWS Lambda @edge with all the correct permissions.
+
+        :param configuration: the configuration of the website
         """
         self.cloud_front_edit_path_for_origin_lambda_edge = aws_cloudfront.experimental.EdgeFunction(
             self,
             'CloudFrontEditPathForOriginLambdaEdge',
+            # outside us-east-1, the function is deployed in the Edge stack, next to the SSL certificate
+            stack_id=get_edge_stack_name(configuration),
             description='Appends .html extension to universal paths, preserving files with other extensions (ex .css)',
             handler='editPathForOrigin.lambdaHandler',
-            code=aws_lambda.Code.from_asset(
-                Path(__file__).absolute().parent.parent.parent.__str__() +
-                "/backend/networking/functions"
-            ),
+            code=aws_lambda.Code.from_asset(self.__build_edit_path_for_origin_code(configuration)),
             log_retention=logs.RetentionDays.TWO_WEEKS,
             runtime=aws_lambda.Runtime.NODEJS_16_X,
             architecture=aws_lambda.Architecture.X86_64,
@@ -60,6 +184,26 @@ class Networking(Construct):
             memory_size=128
         )
 
+    def __create_cloud_front_edit_path_for_origin_function(
+            self, id_: str, configuration: dict) -> aws_cloudfront.Function:
+        """
+        Create a new CloudFront Function with the same logic of the edit path for origin AWS Lambda @edge.
+        The function is created without the lookup tables of the pages and of the redirects, added at publish time
+        by webflow-aws.
+
+        :param id_: the id of the function construct
+        :param configuration: the configuration of the website
+        :return: the CloudFront Function
+        """
+        return aws_cloudfront.Function(
+            self,
+            id_,
+            comment='Appends .html extension to universal paths, preserving files with other extensions (ex .css)',
+            code=aws_cloudfront.FunctionCode.from_inline(build_cloud_front_function_code(
+                compression=get_compression_configuration(configuration),
+                localization=get_edge_localization(configuration)))
+        )
+
     def __create_cloud_front_origin_access_identity(self):
         """
         Create a new CloudFront origin access identity
@@ -70,70 +214,175 @@ class Networking(Construct):
             comment='cloudfront-only-acc-identity'
         )
 
-    def __create_cloud_front_cache_policy(self):
+    def __create_response_headers_policy(
+            self, id_: str, comment: str, headers: List[Tuple[str, str]]) -> aws_cloudfront.ResponseHeadersPolicy:
         """
-        Create a new CloudFront cache policy
+        Create a CloudFront response headers policy, adding headers to every response of a distribution. The
+        staging policy adds X-Robots-Tag, that keeps the search engines from indexing the staging version of the
+        website
+
+        :param id_: the id of the policy construct
+        :param comment: the comment of the policy
+        :param headers: the (name, value) of the headers, they override the ones of the origin
+        :return: the response headers policy
         """
-        self.cloud_front_cache_policy = aws_cloudfront.CachePolicy(
+        return aws_cloudfront.ResponseHeadersPolicy(
             self,
-            'CloudFrontCachePolicy',
-            comment='The CloudFront cache policy used by the DefaultCacheBehavior',
-            default_ttl=Duration.seconds(1),
-            max_ttl=Duration.seconds(1),
-            min_ttl=Duration.seconds(1)
+            id_,
+            comment=comment,
+            custom_headers_behavior=aws_cloudfront.ResponseCustomHeadersBehavior(custom_headers=[
+                aws_cloudfront.ResponseCustomHeader(header=name, value=value, override=True)
+                for name, value in headers])
         )
 
-    def __create_main_cloud_front_distribution(
-            self, domain_name: str, alternative_domain_names: Optional[List[str]],
-            origin_bucket_name: str, ssl_certificate: aws_certificatemanager.Certificate,
+    def __create_cloud_front_cache_policies(self, cache_tiers: Dict[str, Dict]):
+        """
+        Create a CloudFront cache policy for every cache tier matched by extension. The policy of the html tier is
+        used by the DefaultCacheBehavior, since pages are requested without extension.
+        The policies honor the Cache-Control set on the objects at upload time, within [0, 1 year]: the CDN
+        cache is invalidated at every publish.
+
+        :param cache_tiers: the cache tiers of the website
+        """
+        default_tier_name = get_default_behavior_tier(cache_tiers)
+        self.cloud_front_cache_tier_policies = {}
+        for tier_name, tier in cache_tiers.items():
+            if tier_name != default_tier_name and (tier.get('pattern') or not tier.get('extensions')):
+                continue
+            is_default = tier_name == default_tier_name
+            cdn_ttl = get_cdn_ttl(tier)
+            cache_policy = aws_cloudfront.CachePolicy(
+                self,
+                'CloudFrontCachePolicy' if is_default else f'CloudFrontCachePolicy{tier_name.title()}',
+                comment='The CloudFront cache policy used by the DefaultCacheBehavior' if is_default else
+                f'The CloudFront cache policy used by the {tier_name} files',
+                default_ttl=Duration.seconds(cdn_ttl),
+                max_ttl=Duration.seconds(max(cdn_ttl, ONE_YEAR)),
+                min_ttl=Duration.seconds(0),
+                # pre-compressed variants are selected by the edge function, files without a variant are compressed
+                # by CloudFront
+                enable_accept_encoding_brotli=True,
+                enable_accept_encoding_gzip=True
+            )
+            if is_default:
+                self.cloud_front_cache_policy = cache_policy
+            else:
+                self.cloud_front_cache_tier_policies[tuple(tier['extensions'])] = cache_policy
+
+    @staticmethod
+    def __build_behavior_options(
+            cache_policy: aws_cloudfront.CachePolicy, origin: aws_cloudfront.IOrigin,
+            edge_function: Optional[aws_cloudfront.experimental.EdgeFunction],
+            cloud_front_function: Optional[aws_cloudfront.Function],
+            response_headers_policy: Optional[aws_cloudfront.ResponseHeadersPolicy] = None
+    ) -> aws_cloudfront.BehaviorOptions:
+        """
+        Build the options of a CloudFront cache behavior serving the website
+
+        :param cache_policy: the CDN cache policy of the behavior
+        :param origin: the S3 origin of the website
+        :param edge_function: the AWS lambda @edge rewriting the viewer requests, if used
+        :param cloud_front_function: the CloudFront Function rewriting the viewer requests, if used
+        :param response_headers_policy: the headers added to the responses, if any
+        :return: the behavior options
+        """
+        if cloud_front_function:
+            return aws_cloudfront.BehaviorOptions(
+                allowed_methods=aws_cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+                cached_methods=aws_cloudfront.CachedMethods.CACHE_GET_HEAD,
+                cache_policy=cache_policy,
+                viewer_protocol_policy=aws_cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                origin=origin,
+                response_headers_policy=response_headers_policy,
+                function_associations=[
+                    aws_cloudfront.FunctionAssociation(
+                        event_type=aws_cloudfront.FunctionEventType.VIEWER_REQUEST,
+                        function=cloud_front_function)
+                ]
+            )
+        return aws_cloudfront.BehaviorOptions(
+            allowed_methods=aws_cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+            cached_methods=aws_cloudfront.CachedMethods.CACHE_GET_HEAD,
+            cache_policy=cache_policy,
+            viewer_protocol_policy=aws_cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+            origin=origin,
+            response_headers_policy=response_headers_policy,
+            edge_lambdas=[
+                aws_cloudfront.EdgeLambda(
+                    event_type=aws_cloudfront.LambdaEdgeEventType.VIEWER_REQUEST,
+                    include_body=False,
+                    function_version=edge_function)
+            ]
+        )
+
+    def __create_cloud_front_distribution(
+            self, id_: str, stage: str, comment: str, domain_names: List[str],
+            origin_bucket_name: str, ssl_certificate: aws_certificatemanager.ICertificate,
             cache_policy: aws_cloudfront.CachePolicy,
+            cache_tier_policies: Dict[tuple, aws_cloudfront.CachePolicy],
             origin_access_identity: aws_cloudfront.OriginAccessIdentity,
-            cloud_front_edit_path_for_origin_lambda_edge: aws_cloudfront.experimental.EdgeFunction
-    ):
+            cloud_front_edit_path_for_origin_lambda_edge: Optional[aws_cloudfront.experimental.EdgeFunction],
+            cloud_front_edit_path_for_origin_function: Optional[aws_cloudfront.Function],
+            performance: Dict,
+            current_release: Optional[str] = None,
+            response_headers_policy: Optional[aws_cloudfront.ResponseHeadersPolicy] = None
+    ) -> aws_cloudfront.Distribution:
         """
-        Create the AWS CloudFront distribution for the domain name you want to configure
+        Create the AWS CloudFront distribution serving a stage of the website
 
-        :param domain_name: the main domain name you want to create a distribution for
-        :param alternative_domain_names: the alternative domain names you want to include in your
-        cloudfront distribution
+        :param id_: the id of the distribution construct
+        :param stage: the stage of the website served by the distribution (prod or alpha)
+        :param comment: the comment of the distribution
+        :param domain_names: the domain names of the distribution. Without domain names, the distribution is served
+        on its CloudFront domain only
         :param origin_bucket_name: the S3 bucket origin from which the content will be got from
         :param ssl_certificate: the SSL certificate previously configured
         :param cache_policy: the CDN cache policy previously configured
+        :param cache_tier_policies: the CDN cache policies of the other cache tiers, by extensions
         :param origin_access_identity: the CDN origin access identity previously configured
-        :param cloud_front_edit_path_for_origin_lambda_edge: the AWS lambda @edge previously configured
+        :param cloud_front_edit_path_for_origin_lambda_edge: the AWS lambda @edge previously configured, if used
+        :param cloud_front_edit_path_for_origin_function: the CloudFront Function previously configured, if used
+        :param performance: the performance settings of the website: HTTP version, price class, Origin Shield
+        region and TTL of the error responses
+        :param current_release: the release served by the distribution, None if the stage has never been released.
+        The publish, rollback and promote commands switch the release by updating the origin path outside of
+        CloudFormation
+        :param response_headers_policy: the headers added to the responses, if any
+        :return: the CloudFront distribution
         """
-        domain_names = alternative_domain_names if alternative_domain_names else []
-        domain_names.append(domain_name)
-        domain_names = set(domain_names)
-        self.main_cloud_front_distribution = aws_cloudfront.Distribution(
+        origin = aws_cloudfront_origins.S3Origin(
+            bucket=aws_s3.Bucket.from_bucket_name(self, f'Origin{stage.title()}', bucket_name=origin_bucket_name),
+            origin_access_identity=origin_access_identity,
+            origin_path=get_release_origin_path(current_release, stage),
+            # a regional cache in front of S3: the edge locations missing an object ask it instead of the bucket
+            origin_shield_region=performance['origin_shield_region']
+        )
+
+        return aws_cloudfront.Distribution(
             self,
-            'CloudFrontMain',
+            id_,
             enabled=True,
-            certificate=ssl_certificate,
-            comment='CloudFront Distribution for your main static website',
-            domain_names=list(domain_names),
-            http_version=aws_cloudfront.HttpVersion.HTTP2,
-            price_class=aws_cloudfront.PriceClass.PRICE_CLASS_100,
-            default_behavior=aws_cloudfront.BehaviorOptions(
-                allowed_methods=aws_cloudfront.AllowedMethods.ALLOW_GET_HEAD,
-                cached_methods=aws_cloudfront.CachedMethods.CACHE_GET_HEAD,
-                cache_policy=cache_policy,
-                viewer_protocol_policy=aws_cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
-                origin=aws_cloudfront_origins.S3Origin(
-                    bucket=aws_s3.Bucket.from_bucket_name(self, "OriginProd", bucket_name=origin_bucket_name),
-                    origin_access_identity=origin_access_identity,
-                    origin_path='/src/prod'
-                ),
-                edge_lambdas=[
-                    aws_cloudfront.EdgeLambda(
-                        event_type=aws_cloudfront.LambdaEdgeEventType.VIEWER_REQUEST,
-                        include_body=False,
-                        function_version=cloud_front_edit_path_for_origin_lambda_edge)
-                ]
-            ),
+            certificate=ssl_certificate if domain_names else None,
+            comment=comment,
+            domain_names=domain_names if domain_names else None,
+            http_version=HTTP_VERSIONS[performance['http_version']],
+            price_class=PRICE_CLASSES[performance['price_class']],
+            default_behavior=self.__build_behavior_options(
+                cache_policy=cache_policy, origin=origin,
+                edge_function=cloud_front_edit_path_for_origin_lambda_edge,
+                cloud_front_function=cloud_front_edit_path_for_origin_function,
+                response_headers_policy=response_headers_policy),
+            additional_behaviors={
+                f'*.{extension}': self.__build_behavior_options(
+                    cache_policy=tier_cache_policy, origin=origin,
+                    edge_function=cloud_front_edit_path_for_origin_lambda_edge,
+                    cloud_front_function=cloud_front_edit_path_for_origin_function,
+                    response_headers_policy=response_headers_policy)
+                for extensions, tier_cache_policy in cache_tier_policies.items() for extension in extensions
+            },
             error_responses=[
                aws_cloudfront.ErrorResponse(
-                    ttl=Duration.seconds(300),
+                    ttl=Duration.seconds(performance['error_ttl']),
                     response_page_path='/404.html',
                     http_status=403,
                     response_http_status=404)]
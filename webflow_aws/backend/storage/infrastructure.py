@@ -6,6 +6,8 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from webflow_aws.utils.storage import get_storage_configuration
+
 
 class Storage(Construct):
     """
@@ -24,5 +26,7 @@ class Storage(Construct):
                 ignore_public_acls=True,
                 restrict_public_buckets=True),
             removal_policy=RemovalPolicy.DESTROY,
-            auto_delete_objects=True
+            auto_delete_objects=True,
+            # the publish uploads through the closest edge location, see get_upload_client
+            transfer_acceleration=get_storage_configuration(configuration)['transfer_acceleration'] or None
         )
@@ -1,2 +1,11 @@
+# the region of the SSL certificate and of the AWS Lambda @edge, and the default region of the websites
 AWS_REGION_NAME = 'us-east-1'
 GITHUB_REPOSITORY_URL = 'https://github.com/odfdata/webflow-aws'
+# updated by bump2version with setup.py, read by --version without scanning the installed packages metadata
+VERSION = '2.0.1'
+LOCAL_STATE_FOLDER = '.webflow-aws'
+MB = 1024 * 1024
+DEFAULT_TRANSFER_CONCURRENCY = 10
+DEFAULT_PART_SIZE_MB = 16
+DEFAULT_WAIT_TIMEOUT = 900
+DEFAULT_KEEP_RELEASES = 10
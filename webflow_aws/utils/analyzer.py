@@ -0,0 +1,301 @@
+import hashlib
+import json
+import posixpath
+import re
+import zipfile
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+from webflow_aws.utils.artifact import HASH_CHUNK_SIZE, get_content_type
+from webflow_aws.utils.html_links import StartTagFinder
+from webflow_aws.utils.redirects import normalize_path
+
+KB = 1024
+DEFAULT_BUDGETS = {
+    # html of the page plus the local stylesheets, scripts and images it loads, uncompressed
+    'page_weight_kb': 2048,
+    'image_size_kb': 500,
+    # any other file: stylesheets, scripts, fonts, videos
+    'asset_size_kb': 500,
+    'broken_links': 0,
+    # the files contained more than once in the export, under different names
+    'duplicate_assets': None
+}
+CSS_URL_REGEX = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''', re.I)
+CSS_IMPORT_REGEX = re.compile(r'''@import\s+(["'])([^"']+)\1''', re.I)
+# links pointing outside of the website, or to the page itself
+SKIPPED_LINK_PREFIXES = ('#', 'mailto:', 'tel:', 'javascript:', 'data:', 'sms:')
+
+
+def get_budgets_configuration(configuration: Dict) -> Dict:
+    """
+    Get the budgets section of the configuration, with the default values. A budget set to null is not checked
+
+    :param configuration: the configuration of the website
+    :return: a dict with the page_weight_kb, image_size_kb, asset_size_kb, broken_links and duplicate_assets budgets
+    """
+    budgets = configuration.get('budgets') or {}
+    return {name: budgets.get(name, default) for name, default in DEFAULT_BUDGETS.items()}
+
+
+def _format_size(size: int) -> str:
+    return f'{size / KB:.1f} KB'
+
+
+def resolve_link(page_key: str, link: str) -> Optional[str]:
+    """
+    :param page_key: the key of the file containing the link
+    :param link: the value of an href, src or url(), relative to the file or to the website
+    :return: the key of the linked file (without the query and the fragment), None if the link is external
+    """
+    link = link.strip()
+    parts = urlsplit(link)
+    if not link or link.startswith(SKIPPED_LINK_PREFIXES) or parts.scheme or parts.netloc:
+        return None
+    path = unquote(parts.path)
+    if not path:
+        return None
+    key = path.lstrip('/') if path.startswith('/') else posixpath.join(posixpath.dirname(page_key), path)
+    key = posixpath.normpath(key)
+    if key == '.':
+        return ''
+    return f'{key}/' if path.endswith('/') else key
+
+
+def find_linked_key(key: str, keys: Set[str]) -> Optional[str]:
+    """
+    Find the file served for a link, as the editPathForOrigin edge function does: the pages are linked with or
+    without the .html extension, and the folders serve their index.html
+
+    :param key: the key of the link, see resolve_link
+    :param keys: the keys of the files of the website
+    :return: the key of the file, None if the link is broken
+    """
+    folder_key = key.rstrip('/')
+    candidates = [key, f'{folder_key}.html', posixpath.join(folder_key, 'index.html')] if folder_key else [
+        'index.html']
+    return next((candidate for candidate in candidates if candidate in keys), None)
+
+
+class _PageLinkFinder(StartTagFinder):
+    """
+    Collect the links of an html page
+
+    Attributes:
+        resources: list     the links to the files loaded with the page: stylesheets, icons, scripts, images
+        links: list         all the links of the page, to pages and to files, including the image candidates
+    """
+
+    def __init__(self, content: str):
+        super().__init__(content, attributes=('href', 'src', 'srcset'))
+        self.resources: List[str] = []
+        self.links: List[str] = []
+
+    def handle_tag(self, tag, attrs):
+        attributes = dict(attrs)
+        for name in ('href', 'src', 'poster'):
+            if attributes.get(name):
+                self.links.append(attributes[name])
+        for candidate in (attributes.get('srcset') or '').split(','):
+            if candidate.strip():
+                self.links.append(candidate.strip().split(' ')[0])
+        if tag == 'link' and attributes.get('href') and (
+                {'stylesheet', 'icon', 'preload'} & set((attributes.get('rel') or '').lower().split())):
+            self.resources.append(attributes['href'])
+        elif tag in ('script', 'img') and attributes.get('src'):
+            self.resources.append(attributes['src'])
+
+
+class AnalysisReport(object):
+    """
+    The analysis of a Webflow export, checked against the budgets of the website.
+
+    Attributes:
+        zip_path: str               the zip file exported from Webflow
+        files: int                  the number of files of the export
+        size: int                   the uncompressed size of all the files
+        pages: list                 key, weight, requests and external_requests of every html page, heaviest first
+        oversized: list             key, size and budget_kb of the files larger than their budget
+        duplicates: list            the keys of every group of identical files, with their size
+        broken_links: list          key and link of every link to a file missing from the export
+        violations: list            the budgets exceeded, as messages
+    """
+
+    def __init__(self, zip_path: str):
+        self.zip_path: str = zip_path
+        self.files: int = 0
+        self.size: int = 0
+        self.pages: List[Dict] = []
+        self.oversized: List[Dict] = []
+        self.duplicates: List[Dict] = []
+        self.broken_links: List[Dict] = []
+        self.violations: List[str] = []
+
+    def to_dict(self) -> Dict:
+        return {
+            'zip_path': self.zip_path, 'files': self.files, 'size': self.size, 'pages': self.pages,
+            'oversized': self.oversized, 'duplicates': self.duplicates, 'broken_links': self.broken_links,
+            'violations': self.violations
+        }
+
+    def format_summary(self, top: int = 10) -> str:
+        """
+        :param top: the number of heaviest pages listed
+        :return: the report, as printed by the analyze command
+        """
+        lines = [f'{self.files} files, {_format_size(self.size)}, {len(self.pages)} pages']
+        if self.pages:
+            lines.append('Heaviest pages (html with its local stylesheets, scripts and images):')
+            lines += [f'  {page["key"]}: {_format_size(page["weight"])}, {page["requests"]} local requests, '
+                      f'{page["external_requests"]} external' for page in self.pages[:top]]
+        if self.oversized:
+            lines.append('Oversized files:')
+            lines += [f'  {item["key"]}: {_format_size(item["size"])}, budget {item["budget_kb"]} KB'
+                      for item in self.oversized]
+        if self.duplicates:
+            lines.append('Duplicate files:')
+            lines += [f'  {", ".join(item["keys"])}: {_format_size(item["size"])} each' for item in self.duplicates]
+        if self.broken_links:
+            lines.append('Broken links:')
+            lines += [f'  {item["key"]}: {item["link"]}' for item in self.broken_links]
+        if self.violations:
+            lines.append('Budgets exceeded:')
+            lines += [f'  - {violation}' for violation in self.violations]
+        else:
+            lines.append('All the budgets are respected')
+        return '\n'.join(lines)
+
+
+def _hash_entry(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    digest = hashlib.sha256()
+    with zip_file.open(info) as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _find_duplicates(zip_file: zipfile.ZipFile, entries: Dict[str, zipfile.ZipInfo]) -> List[Dict]:
+    """
+    :return: the groups of identical files. Only the files with the same size as another one are read
+    """
+    by_size: Dict[int, List[str]] = {}
+    for key, info in entries.items():
+        if info.file_size:
+            by_size.setdefault(info.file_size, []).append(key)
+    duplicates = []
+    for size, keys in sorted(by_size.items(), reverse=True):
+        if len(keys) < 2:
+            continue
+        by_hash: Dict[str, List[str]] = {}
+        for key in keys:
+            by_hash.setdefault(_hash_entry(zip_file, entries[key]), []).append(key)
+        duplicates += [{'keys': sorted(group), 'size': size} for group in by_hash.values() if len(group) > 1]
+    return duplicates
+
+
+def _read_text(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    return zip_file.read(info).decode('utf-8', errors='replace')
+
+
+def _get_css_links(content: str) -> List[str]:
+    return [match.group(2) for match in CSS_URL_REGEX.finditer(content)] + [
+        match.group(2) for match in CSS_IMPORT_REGEX.finditer(content)]
+
+
+def analyze_artifact(zip_path: str, budgets: Dict, redirects: Optional[Dict[str, str]] = None) -> AnalysisReport:
+    """
+    Analyze a Webflow export without extracting it: only the html and css files are read in memory, one at a time,
+    and the other files only when a file with the same size has to be compared with them
+
+    :param zip_path: the zip file exported from Webflow
+    :param budgets: the budgets of the website, see get_budgets_configuration
+    :param redirects: the redirects of the website, the links to their sources are not broken
+    :return: the report, with the budgets exceeded
+    """
+    report = AnalysisReport(zip_path)
+    redirects = redirects if redirects else {}
+    with zipfile.ZipFile(zip_path) as zip_file:
+        entries = {}
+        for info in zip_file.infolist():
+            key = info.filename.lstrip('/')
+            if not info.is_dir() and key and '..' not in key.split('/'):
+                entries[key] = info
+        keys = set(entries)
+        report.files = len(entries)
+        report.size = sum(info.file_size for info in entries.values())
+        # the files loaded by every stylesheet, also loaded by the pages using it
+        css_links: Dict[str, List[str]] = {}
+        for key, info in entries.items():
+            if get_content_type(key) == 'text/css':
+                css_links[key] = _get_css_links(_read_text(zip_file, info))
+
+        def check_link(source_key: str, link: str) -> Tuple[Optional[str], bool]:
+            """
+            :return: the key of the linked file and False if the link is broken
+            """
+            key = resolve_link(source_key, link)
+            if key is None:
+                return None, True
+            linked_key = find_linked_key(key, keys)
+            if linked_key is None and normalize_path('/' + key) not in redirects:
+                report.broken_links.append({'key': source_key, 'link': link})
+                return None, False
+            return linked_key, True
+
+        for key, links in css_links.items():
+            for link in links:
+                check_link(key, link)
+        for key, info in entries.items():
+            if get_content_type(key) != 'text/html':
+                continue
+            content = _read_text(zip_file, info)
+            finder = _PageLinkFinder(content)
+            finder.feed(content)
+            finder.close()
+            for link in dict.fromkeys(finder.links):
+                check_link(key, link)
+            resources: Set[str] = set()
+            external_requests = 0
+            for link in finder.resources:
+                resource_key = resolve_link(key, link)
+                if resource_key is None:
+                    external_requests += not link.startswith(SKIPPED_LINK_PREFIXES)
+                elif resource_key in keys:
+                    resources.add(resource_key)
+                    for css_link in css_links.get(resource_key, []):
+                        css_resource_key = resolve_link(resource_key, css_link)
+                        if css_resource_key in keys:
+                            resources.add(css_resource_key)
+            report.pages.append({
+                'key': key, 'weight': info.file_size + sum(entries[resource].file_size for resource in resources),
+                'requests': len(resources), 'external_requests': external_requests})
+        report.pages.sort(key=lambda page: (-page['weight'], page['key']))
+        for key, info in sorted(entries.items()):
+            content_type = get_content_type(key)
+            if content_type == 'text/html':
+                continue
+            budget = 'image_size_kb' if content_type.startswith('image/') else 'asset_size_kb'
+            if budgets[budget] is not None and info.file_size > budgets[budget] * KB:
+                report.oversized.append({'key': key, 'size': info.file_size, 'budget_kb': budgets[budget]})
+        report.duplicates = _find_duplicates(
+            zip_file, {key: info for key, info in entries.items() if get_content_type(key) != 'text/html'})
+    if budgets['page_weight_kb'] is not None:
+        report.violations += [
+            f'page {page["key"]} weighs {_format_size(page["weight"])}, budget {budgets["page_weight_kb"]} KB'
+            for page in report.pages if page['weight'] > budgets['page_weight_kb'] * KB]
+    report.violations += [
+        f'{item["key"]} is {_format_size(item["size"])}, budget {item["budget_kb"]} KB' for item in report.oversized]
+    if budgets['broken_links'] is not None and len(report.broken_links) > budgets['broken_links']:
+        report.violations.append(f'{len(report.broken_links)} broken links, budget {budgets["broken_links"]}')
+    if budgets['duplicate_assets'] is not None and len(report.duplicates) > budgets['duplicate_assets']:
+        report.violations.append(f'{len(report.duplicates)} duplicate files, budget {budgets["duplicate_assets"]}')
+    return report
+
+
+def write_report(path: str, report: AnalysisReport):
+    """
+    :param path: the path of the JSON file
+    :param report: the report to write
+    """
+    with open(path, 'w') as f:
+        json.dump(report.to_dict(), f, indent=2)
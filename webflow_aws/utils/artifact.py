@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import zipfile
+from typing import Dict, List, Optional
+
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+# same mapping used by the s3TriggerArtifactsUpload lambda function, so that objects uploaded directly from the cli
+# are served exactly as the ones extracted by the lambda
+CONTENT_TYPES = {
+    'html': 'text/html',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'js': 'application/javascript',
+    'css': 'text/css',
+    'svg': 'image/svg+xml',
+    'ico': 'image/x-icon',
+    'webp': 'image/webp'
+}
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+# zip entry with the metadata of every object of a processed package, read by the s3TriggerArtifactsUpload lambda
+OBJECTS_METADATA_FILE_NAME = '.webflow-aws-objects.json'
+# zip entry with the code of the CloudFront Function of the release, published by the s3TriggerArtifactsUpload lambda
+# once the CDN serves the release
+EDGE_FUNCTION_CODE_FILE_NAME = '.webflow-aws-edge-function.js'
+# fixed timestamp of the packed entries, so that the same objects always produce the same package
+PACKAGE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def get_content_type(key: str) -> str:
+    """
+    Given an object key, returns a valid content type for its extension
+
+    :param key: the object key (or file name)
+    :return: the content type of the object
+    """
+    return CONTENT_TYPES.get(key.split('.')[-1].lower(), DEFAULT_CONTENT_TYPE)
+
+
+def file_sha256(path: str) -> str:
+    """
+    Compute the sha256 of a file, reading it in chunks to keep the memory usage constant
+
+    :param path: the path of the file
+    :return: the hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactObject(object):
+    """
+    A single file of the website, ready to be uploaded in the S3 bucket.
+
+    Attributes:
+        key: str                    the key of the object, relative to the stage folder (ex. css/main.css)
+        path: str                   the local path of the file content
+        content_type: str           the Content-Type the object is served with
+        cache_control: str          the Cache-Control the object is served with
+        content_encoding: str       the Content-Encoding the object is served with, if any
+    """
+
+    def __init__(self, key: str, path: str, content_type: Optional[str] = None,
+                 cache_control: str = DEFAULT_CACHE_CONTROL, content_encoding: Optional[str] = None):
+        self.key: str = key
+        self.path: str = path
+        self.content_type: str = content_type if content_type else get_content_type(key)
+        self.cache_control: str = cache_control
+        self.content_encoding: Optional[str] = content_encoding
+        self._sha256: Optional[str] = None
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = file_sha256(self.path)
+        return self._sha256
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def invalidate_hash(self):
+        """
+        Forget the cached hash. To be called every time the file content is changed
+        """
+        self._sha256 = None
+
+    @property
+    def extra_args(self) -> Dict:
+        """
+        The ExtraArgs to be used with the boto3 upload methods
+        """
+        extra_args = {'ContentType': self.content_type, 'CacheControl': self.cache_control}
+        if self.content_encoding:
+            extra_args['ContentEncoding'] = self.content_encoding
+        return extra_args
+
+
+def unpack_artifact(zip_path: str, destination: str) -> List[ArtifactObject]:
+    """
+    Unpack the Webflow export inside the destination folder and return the list of objects to be uploaded
+
+    :param zip_path: the path of the zip file exported from Webflow
+    :param destination: the folder where the zip is unpacked
+    :return: the list of objects contained in the zip file
+    """
+    objects = []
+    with zipfile.ZipFile(zip_path) as zip_file:
+        for info in zip_file.infolist():
+            key = info.filename.lstrip('/')
+            if info.is_dir() or not key or '..' in key.split('/'):
+                continue
+            objects.append(ArtifactObject(key=key, path=zip_file.extract(info, destination)))
+    return objects
+
+
+def pack_artifact(objects: List[ArtifactObject], zip_path: str, edge_function_code: Optional[str] = None):
+    """
+    Pack the processed objects in a zip file to be extracted by the s3TriggerArtifactsUpload lambda. The package
+    contains the metadata of every object, so the lambda uploads the files as they are. The package is
+    deterministic: the same objects always produce the same bytes.
+
+    :param objects: the processed objects of the website
+    :param zip_path: the path of the package to create
+    :param edge_function_code: the code of the CloudFront Function serving the release, if the website uses it
+    """
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+        metadata = {obj.key: obj.extra_args for obj in objects}
+        info = zipfile.ZipInfo(OBJECTS_METADATA_FILE_NAME, date_time=PACKAGE_DATE_TIME)
+        zip_file.writestr(
+            info, json.dumps(metadata, sort_keys=True).encode('utf-8'), compress_type=zipfile.ZIP_DEFLATED)
+        if edge_function_code is not None:
+            info = zipfile.ZipInfo(EDGE_FUNCTION_CODE_FILE_NAME, date_time=PACKAGE_DATE_TIME)
+            zip_file.writestr(info, edge_function_code.encode('utf-8'), compress_type=zipfile.ZIP_DEFLATED)
+        for obj in sorted(objects, key=lambda o: o.key):
+            info = zipfile.ZipInfo(obj.key, date_time=PACKAGE_DATE_TIME)
+            # already compressed content doesn't shrink, storing it saves the deflate time on both sides
+            already_compressed = obj.content_encoding or (
+                obj.content_type.startswith('image/') and obj.content_type != 'image/svg+xml')
+            info.compress_type = zipfile.ZIP_STORED if already_compressed else zipfile.ZIP_DEFLATED
+            # the size is needed in advance to know if the entry requires the zip64 format
+            info.file_size = obj.size
+            with open(obj.path, 'rb') as src, zip_file.open(info, 'w') as dst:
+                for chunk in iter(lambda: src.read(HASH_CHUNK_SIZE), b''):
+                    dst.write(chunk)
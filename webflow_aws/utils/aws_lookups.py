@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from webflow_aws.global_variables import LOCAL_STATE_FOLDER
+from webflow_aws.utils.aws_utils import get_session
+
+# shared by all the websites of the user, so that the lookups of a profile are made once
+DEFAULT_LOOKUPS_CACHE_FILE = os.path.join(os.path.expanduser('~'), LOCAL_STATE_FOLDER, 'aws-lookups.json')
+DEFAULT_LOOKUPS_TTL = 24 * 60 * 60
+
+
+class LookupCache(object):
+    """
+    A local JSON file with the results of the AWS lookups that rarely change (the account of a profile, the name of
+    a hosted zone), so that they don't need a network round trip every time. Every result expires after ttl seconds.
+
+    Attributes:
+        path: str       the path of the cache file
+        ttl: int        the number of seconds a result is valid, 0 to disable the cache
+    """
+
+    def __init__(self, path: str = DEFAULT_LOOKUPS_CACHE_FILE, ttl: int = DEFAULT_LOOKUPS_TTL):
+        self.path: str = path
+        self.ttl: int = ttl
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                # a missing or corrupted cache is rebuilt by the next lookups
+                self._entries = {}
+        return self._entries
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        :param key: the key of the lookup (ex. identity/default)
+        :return: the cached result, None if missing or expired
+        """
+        with self._lock:
+            entry = self._load().get(key)
+        if not entry or time.time() - entry['time'] > self.ttl:
+            return None
+        return entry['value']
+
+    def set(self, key: str, value: Dict):
+        """
+        :param key: the key of the lookup
+        :param value: the JSON-serializable result of the lookup
+        """
+        with self._lock:
+            entries = self._load()
+            entries[key] = {'time': time.time(), 'value': value}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'w') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(temporary_path, self.path)
+
+    def cached(self, key: str, lookup: Callable[[], Dict]) -> Dict:
+        """
+        :param key: the key of the lookup
+        :param lookup: the function calling AWS, called only if the result is not cached. Failed lookups are not
+        cached
+        :return: the result of the lookup
+        """
+        value = self.get(key)
+        if value is None:
+            value = lookup()
+            if self.ttl:
+                self.set(key, value)
+        return value
+
+
+def get_caller_identity(profile_name: str, cache: Optional[LookupCache] = None) -> Dict:
+    """
+    :param profile_name: the AWS profile
+    :param cache: the cache of the lookups, the default one if not set
+    :return: a dict with the Account id and the Arn of the user of the profile
+    """
+    cache = cache if cache else LookupCache()
+
+    def lookup() -> Dict:
+        identity = get_session({'aws_profile_name': profile_name}).client('sts').get_caller_identity()
+        return {'Account': identity['Account'], 'Arn': identity['Arn']}
+
+    return cache.cached(f'identity/{profile_name}', lookup)
+
+
+def get_hosted_zone_name(profile_name: str, hosted_zone_id: str, cache: Optional[LookupCache] = None) -> str:
+    """
+    :param profile_name: the AWS profile
+    :param hosted_zone_id: the id of the Route53 hosted zone
+    :param cache: the cache of the lookups, the default one if not set
+    :return: the domain name of the hosted zone. A botocore ClientError is raised if the zone doesn't exist
+    """
+    cache = cache if cache else LookupCache()
+
+    def lookup() -> Dict:
+        hosted_zone = get_session({'aws_profile_name': profile_name}).client('route53').get_hosted_zone(
+            Id=hosted_zone_id)['HostedZone']
+        return {'Name': hosted_zone['Name']}
+
+    return cache.cached(f'hosted_zone/{profile_name}/{hosted_zone_id}', lookup)['Name']
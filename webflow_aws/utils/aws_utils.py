@@ -0,0 +1,126 @@
+import threading
+from typing import Dict, Tuple
+
+import boto3
+import click
+from botocore.config import Config
+
+from webflow_aws.utils.stages import PROD_STAGE
+from webflow_aws.utils.storage import get_region_name, get_storage_configuration
+
+DISTRIBUTION_ID_OUTPUT_KEY = 'CloudFrontDistributionId'
+EDGE_FUNCTION_NAME_OUTPUT_KEY = 'CloudFrontFunctionName'
+STAGING_DISTRIBUTION_ID_OUTPUT_KEY = 'CloudFrontStagingDistributionId'
+STAGING_DOMAIN_NAME_OUTPUT_KEY = 'CloudFrontStagingDomainName'
+STAGING_EDGE_FUNCTION_NAME_OUTPUT_KEY = 'CloudFrontStagingFunctionName'
+# botocore default is 10, less than the parallel transfers of a publish
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+
+_sessions: Dict[Tuple[str, str], 'CachedSession'] = {}
+_sessions_lock = threading.Lock()
+
+
+class CachedSession(object):
+    """
+    A boto3 session whose clients are created once and then shared, so that their connection pools are reused by
+    all the operations. Unlike a boto3 session, it can be used by many threads at the same time.
+
+    Attributes:
+        session: boto3.Session          the wrapped boto3 session
+        max_pool_connections: int       maximum number of connections kept open by every client
+    """
+
+    def __init__(self, session, max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS):
+        self.session = session
+        self.max_pool_connections: int = max_pool_connections
+        self._clients: Dict[Tuple[str, bool], object] = {}
+        self._lock = threading.Lock()
+
+    def client(self, service_name: str, accelerate: bool = False):
+        """
+        :param service_name: the AWS service (ex. s3)
+        :param accelerate: use the S3 Transfer Acceleration endpoint, the bucket must have it enabled
+        :return: the shared client of the service
+        """
+        key = (service_name, accelerate)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self.session.client(service_name, config=Config(
+                    max_pool_connections=self.max_pool_connections,
+                    s3={'use_accelerate_endpoint': True} if accelerate else None))
+            return self._clients[key]
+
+
+def get_session(configuration: Dict) -> CachedSession:
+    """
+    Get the session of the AWS profile of a website. The sites using the same profile share the same session
+
+    :param configuration: the configuration of the website
+    :return: the session, with its clients
+    """
+    key = (configuration.get('aws_profile_name', 'default'), get_region_name(configuration))
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = CachedSession(boto3.session.Session(profile_name=key[0], region_name=key[1]))
+        return _sessions[key]
+
+
+def get_upload_client(session, configuration: Dict):
+    """
+    Get the S3 client uploading the files of a website: it goes through the closest edge location when the
+    transfer_acceleration of the storage section is enabled, the S3 endpoint of the bucket region otherwise
+
+    :param session: the session to use, boto3 or CachedSession
+    :param configuration: the configuration of the website
+    :return: the S3 client
+    """
+    if not get_storage_configuration(configuration)['transfer_acceleration']:
+        return session.client('s3')
+    if isinstance(session, CachedSession):
+        return session.client('s3', accelerate=True)
+    return session.client('s3', config=Config(s3={'use_accelerate_endpoint': True}))
+
+
+def get_stack_outputs(session, stack_name: str) -> Dict[str, str]:
+    """
+    Get the outputs of a deployed CloudFormation stack
+
+    :param session: the boto3 session to use
+    :param stack_name: the name of the CloudFormation stack
+    :return: a dict with the output keys and their values
+    """
+    stack = session.client('cloudformation').describe_stacks(StackName=stack_name)['Stacks'][0]
+    return {output['OutputKey']: output['OutputValue'] for output in stack.get('Outputs', [])}
+
+
+def get_stage_output(session, stack_name: str, stage: str, prod_key: str, staging_key: str) -> str:
+    """
+    Get an output of the stack that has a different value for the prod and the staging distributions
+
+    :param session: the boto3 session to use
+    :param stack_name: the name of the CloudFormation stack
+    :param stage: the stage of the website (prod or alpha)
+    :param prod_key: the output key of the prod stage
+    :param staging_key: the output key of the alpha stage
+    :return: the value of the output
+    """
+    outputs = get_stack_outputs(session, stack_name)
+    key = prod_key if stage == PROD_STAGE else staging_key
+    if key not in outputs:
+        raise click.ClickException(
+            f'The stack {stack_name} doesn\'t serve the {stage} stage, enable staging and publish again')
+    return outputs[key]
+
+
+def get_distribution_id(session, stack_name: str, stage: str = PROD_STAGE) -> str:
+    """
+    Get the id of the CloudFront distribution created by the stack for a stage: the main distribution for prod, the
+    staging one for alpha
+
+    :param session: the boto3 session to use
+    :param stack_name: the name of the CloudFormation stack
+    :param stage: the stage of the website (prod or alpha)
+    :return: the CloudFront distribution id
+    """
+    return get_stage_output(
+        session, stack_name, stage, DISTRIBUTION_ID_OUTPUT_KEY, STAGING_DISTRIBUTION_ID_OUTPUT_KEY)
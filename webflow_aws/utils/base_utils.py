@@ -1,18 +1,50 @@
+import copy
 import os
-from typing import Dict
+import threading
+from typing import Dict, Tuple
 
+import click
 import yaml
 
+from webflow_aws.utils.config_schema import validate_configuration
 
-def configuration_yaml_exists() -> bool:
+CONFIGURATION_FILE_NAME = 'webflow-aws-config.yaml'
+
+# path -> (modification time, size, configuration) of the configuration files already read
+_configurations: Dict[str, Tuple[int, int, Dict]] = {}
+_configurations_lock = threading.Lock()
+
+
+def configuration_yaml_exists(folder: str = '.') -> bool:
     """
     Check if the configuration.yaml file exists.
+    :param folder: the website folder
     :return: True if the file exists, False otherwise
     """
-    return os.path.exists('./webflow-aws-config.yaml')
+    return os.path.exists(os.path.join(folder, CONFIGURATION_FILE_NAME))
 
 
-def get_configuration() -> Dict:
-    with open('./webflow-aws-config.yaml') as f:
-        configuration = yaml.load(f, Loader=yaml.SafeLoader)
+def get_configuration(folder: str = '.', validate: bool = True) -> Dict:
+    """
+    Read the configuration of a website. The file is parsed once and read again only if it changes
+
+    :param folder: the website folder
+    :param validate: check the configuration, raising a ClickException with all the errors found
+    :return: a copy of the configuration, that can be changed by the caller
+    """
+    path = os.path.abspath(os.path.join(folder, CONFIGURATION_FILE_NAME))
+    stat = os.stat(path)
+    with _configurations_lock:
+        cached = _configurations.get(path)
+        if not cached or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            with open(path) as f:
+                cached = (stat.st_mtime_ns, stat.st_size, yaml.load(f, Loader=yaml.SafeLoader))
+            _configurations[path] = cached
+    configuration = copy.deepcopy(cached[2])
+    if validate:
+        errors = validate_configuration(configuration)
+        if errors:
+            raise click.ClickException(
+                f'Invalid {os.path.join(folder, CONFIGURATION_FILE_NAME)}:\n' + '\n'.join(
+                    f'  - {error}' for error in errors))
     return configuration
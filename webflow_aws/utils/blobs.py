@@ -0,0 +1,252 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+import click
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from tqdm import tqdm
+
+from webflow_aws.global_variables import DEFAULT_TRANSFER_CONCURRENCY
+from webflow_aws.utils.artifact import ArtifactObject
+
+BLOBS_PREFIX = 'blobs/'
+BLOB_CONTENT_TYPE = 'application/octet-stream'
+# the hashes of the stored blobs, next to the release indexes: a publish reads it instead of listing the blobs. It's
+# updated by the cli and the artifacts lambda when they store new blobs, and rewritten by the garbage collection
+BLOBS_CATALOG_KEY = 'releases/blobs.json'
+BLOBS_CATALOG_VERSION = 1
+# the maximum number of keys of a DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+
+
+def get_blob_key(sha256: str) -> str:
+    """
+    :param sha256: the hash of the content
+    :return: the key of the blob storing the content
+    """
+    return f'{BLOBS_PREFIX}{sha256}'
+
+
+def get_entry_extra_args(entry: Dict) -> Dict:
+    """
+    :param entry: the manifest entry of an object
+    :return: the ExtraArgs to be used with the boto3 copy method, as ArtifactObject.extra_args
+    """
+    extra_args = {'ContentType': entry['content_type'], 'CacheControl': entry['cache_control']}
+    if entry.get('content_encoding'):
+        extra_args['ContentEncoding'] = entry['content_encoding']
+    return extra_args
+
+
+def delete_keys(s3_client, bucket_name: str, keys: List[str]):
+    """
+    Delete objects from the bucket, a thousand at a time
+
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :param keys: the keys of the objects to delete
+    """
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        s3_client.delete_objects(Bucket=bucket_name, Delete={
+            'Objects': [{'Key': key} for key in keys[start:start + DELETE_BATCH_SIZE]], 'Quiet': True})
+
+
+class BlobStore(object):
+    """
+    The content-addressed store of the website files: every distinct content is stored once in blobs/<sha256>,
+    whatever the number of paths and releases using it, so that a publish uploads only the content never seen
+    before. The folder of a release is materialized by copying the blobs inside S3 with the metadata of every path:
+    nothing is downloaded or uploaded again.
+
+    Attributes:
+        bucket_name: str        the website bucket
+        concurrency: int        the number of parallel uploads and copies
+        show_progress: bool     show the progress bars of the transfers
+    """
+
+    def __init__(self, s3_client, bucket_name: str, concurrency: int = DEFAULT_TRANSFER_CONCURRENCY,
+                 show_progress: bool = False, transfer_config: Optional[TransferConfig] = None, upload_client=None):
+        self.bucket_name: str = bucket_name
+        self.concurrency: int = concurrency
+        self.show_progress: bool = show_progress
+        self._s3_client = s3_client
+        # the copies inside the bucket don't go through the S3 Transfer Acceleration endpoint, only the uploads
+        self._upload_client = upload_client if upload_client else s3_client
+        self._transfer_config = transfer_config if transfer_config else TransferConfig(use_threads=False)
+
+    def list_keys(self, prefix: str) -> Set[str]:
+        """
+        :param prefix: the folder to list
+        :return: the keys of the objects of the folder, relative to it
+        """
+        keys = set()
+        paginator = self._s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            keys.update(obj['Key'][len(prefix):] for obj in page.get('Contents', []))
+        return keys
+
+    def load_catalog(self) -> Optional[Set[str]]:
+        """
+        :return: the hashes of the stored blobs, None if the catalog doesn't exist yet
+        """
+        try:
+            body = self._s3_client.get_object(Bucket=self.bucket_name, Key=BLOBS_CATALOG_KEY)['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+        content = json.loads(body)
+        if content.get('version') != BLOBS_CATALOG_VERSION:
+            return None
+        return set(content.get('blobs', []))
+
+    def save_catalog(self, hashes: Iterable[str]):
+        """
+        :param hashes: the hashes of all the stored blobs
+        """
+        self._s3_client.put_object(
+            Bucket=self.bucket_name, Key=BLOBS_CATALOG_KEY, ContentType='application/json',
+            Body=json.dumps({'version': BLOBS_CATALOG_VERSION, 'blobs': sorted(hashes)}).encode('utf-8'))
+
+    def get_stored_hashes(self) -> Set[str]:
+        """
+        :return: the hashes of the stored blobs, read from the catalog. The blobs are listed only the first time,
+        to create it
+        """
+        hashes = self.load_catalog()
+        if hashes is None:
+            hashes = set(self.list_blobs())
+            self.save_catalog(hashes)
+        return hashes
+
+    def list_blobs(self) -> Dict[str, Dict]:
+        """
+        :return: sha256 -> {size, last_modified} of every blob stored
+        """
+        blobs = {}
+        paginator = self._s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=BLOBS_PREFIX):
+            for obj in page.get('Contents', []):
+                blobs[obj['Key'][len(BLOBS_PREFIX):]] = {'size': obj['Size'], 'last_modified': obj['LastModified']}
+        return blobs
+
+    def store(self, objects: List[ArtifactObject], published_entries: Optional[Dict[str, Dict]] = None,
+              published_prefix: Optional[str] = None) -> List[ArtifactObject]:
+        """
+        Store the content of the objects that is not in the blobs yet. A content already published in the folder of
+        the current release (before the blobs existed) is copied from there, the other content is uploaded
+
+        :param objects: the objects of the website
+        :param published_entries: the manifest entries of the release currently served, if any
+        :param published_prefix: the folder of the release currently served, if any
+        :return: the objects whose content has been uploaded, one per distinct content
+        """
+        existing = self.get_stored_hashes()
+        missing: Dict[str, ArtifactObject] = {}
+        for obj in objects:
+            if obj.sha256 not in existing:
+                missing.setdefault(obj.sha256, obj)
+        published_keys = {entry['sha256']: key for key, entry in (published_entries or {}).items()}
+        to_copy = [(sha256, published_keys[sha256]) for sha256 in missing if sha256 in published_keys]
+        to_upload = [obj for sha256, obj in missing.items() if sha256 not in published_keys]
+
+        def copy(item):
+            sha256, key = item
+            self._s3_client.copy(
+                CopySource={'Bucket': self.bucket_name, 'Key': published_prefix + key}, Bucket=self.bucket_name,
+                Key=get_blob_key(sha256), ExtraArgs={'ContentType': BLOB_CONTENT_TYPE, 'MetadataDirective': 'REPLACE'},
+                Config=self._transfer_config)
+
+        self._run(copy, to_copy, 'Storing published files')
+        with tqdm(total=sum(obj.size for obj in to_upload), unit='B', unit_scale=True, unit_divisor=1024,
+                  desc='Uploading', disable=not self.show_progress) as progress:
+            def upload(obj: ArtifactObject):
+                self._upload_client.upload_file(
+                    Filename=obj.path, Bucket=self.bucket_name, Key=get_blob_key(obj.sha256),
+                    ExtraArgs={'ContentType': BLOB_CONTENT_TYPE}, Config=self._transfer_config,
+                    Callback=progress.update)
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                # list() re-raises the first upload error, if any
+                list(executor.map(upload, to_upload))
+        if missing:
+            # read again, the artifacts lambda or another publish may have stored other blobs in the meantime
+            self.save_catalog((self.load_catalog() or existing) | set(missing))
+        return to_upload
+
+    def materialize(self, entries: Dict[str, Dict], prefix: str) -> int:
+        """
+        Create the objects of a release folder, copying the blobs inside S3. S3 has no bulk copy: every object costs a
+        CopyObject request, the unchanged ones too, since the CDN serves the whole folder of a release. The objects
+        already in the folder (left by an interrupted publish of the same release) are not copied again, the folder
+        of a release being immutable
+
+        :param entries: the manifest entries of the release
+        :param prefix: the folder of the release
+        :return: the number of objects copied
+        """
+        def copy(item):
+            key, entry = item
+            self._s3_client.copy(
+                CopySource={'Bucket': self.bucket_name, 'Key': get_blob_key(entry['sha256'])},
+                Bucket=self.bucket_name, Key=prefix + key,
+                ExtraArgs=dict(get_entry_extra_args(entry), MetadataDirective='REPLACE'), Config=self._transfer_config)
+
+        existing = self.list_keys(prefix)
+        to_copy = sorted((key, entry) for key, entry in entries.items() if key not in existing)
+        self._run(copy, to_copy, 'Copying files')
+        return len(to_copy)
+
+    def ensure_materialized(self, entries: Dict[str, Dict], prefix: str) -> bool:
+        """
+        Materialize the folder of a release again if its objects have been removed by the garbage collection. Only
+        the folders of the releases whose blobs are all stored are removed
+
+        :param entries: the manifest entries of the release
+        :param prefix: the folder of the release
+        :return: True if the folder has been materialized
+        """
+        if not entries:
+            return False
+        try:
+            self._s3_client.head_object(Bucket=self.bucket_name, Key=prefix + min(entries))
+            return False
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                raise
+        existing = self.get_stored_hashes()
+        if any(entry['sha256'] not in existing for entry in entries.values()):
+            raise click.ClickException(f'The files of {prefix} are missing and can\'t be restored from {BLOBS_PREFIX}')
+        self.materialize(entries, prefix)
+        return True
+
+    def _run(self, function, items: List, description: str):
+        """
+        Run a transfer function on every item, in parallel
+
+        :param function: the function transferring one item
+        :param items: the items to transfer
+        :param description: the description of the progress bar
+        """
+        with tqdm(total=len(items), unit='files', desc=description,
+                  disable=not self.show_progress or not items) as progress:
+            def run(item):
+                function(item)
+                progress.update(1)
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                # list() re-raises the first error, if any
+                list(executor.map(run, items))
+
+
+def is_collectable(last_modified: datetime, now: datetime, grace_period: int) -> bool:
+    """
+    :param last_modified: when the object has been written
+    :param now: the current time, timezone aware
+    :param grace_period: the number of seconds a new object is kept even if not used, since the publish that wrote
+    it may still be running
+    :return: True if the object is old enough to be collected
+    """
+    return (now - last_modified).total_seconds() > grace_period
@@ -0,0 +1,119 @@
+import posixpath
+import re
+from typing import Dict, List
+
+from webflow_aws.utils.artifact import ArtifactObject
+
+ONE_YEAR = 365 * 24 * 3600
+DEFAULT_TIER_NAME = 'default'
+ASSET_EXTENSIONS = [
+    'css', 'js', 'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'svg', 'ico', 'woff', 'woff2', 'ttf', 'otf', 'eot']
+# every tier is matched by the object file name (pattern, limited to the extensions if any) or by its extension.
+# The pattern tiers are checked first. The CDN keeps the objects for s_maxage seconds (until the next publish
+# invalidates them), the browsers for max_age
+DEFAULT_CACHE_TIERS = {
+    'html': {
+        'extensions': ['html'],
+        'max_age': 60,
+        's_maxage': 86400,
+        'stale_while_revalidate': 60
+    },
+    # files whose name contains a content hash (ex. main.3f2a9c1b.js) never change
+    'fingerprinted': {
+        'pattern': r'(^|[._-])[0-9a-f]{8,}([._-]|$)',
+        'extensions': ASSET_EXTENSIONS,
+        'max_age': ONE_YEAR,
+        'immutable': True
+    },
+    'assets': {
+        'extensions': ASSET_EXTENSIONS,
+        'max_age': 86400,
+        's_maxage': ONE_YEAR
+    },
+    DEFAULT_TIER_NAME: {
+        'max_age': 3600
+    }
+}
+
+
+def get_cache_tiers(configuration: Dict) -> Dict[str, Dict]:
+    """
+    Get the cache tiers of the website: the default ones, updated with the cache_tiers section of the configuration
+
+    :param configuration: the configuration of the website
+    :return: tier name -> settings (extensions, pattern, max_age, s_maxage, stale_while_revalidate, immutable)
+    """
+    tiers = {name: dict(tier) for name, tier in DEFAULT_CACHE_TIERS.items()}
+    for name, tier in (configuration.get('cache_tiers') or {}).items():
+        tiers.setdefault(name, {}).update(tier)
+    return tiers
+
+
+def get_cdn_ttl(tier: Dict) -> int:
+    """
+    :param tier: the tier settings
+    :return: the number of seconds the CDN keeps the objects of the tier
+    """
+    return tier.get('s_maxage', tier.get('max_age', 0))
+
+
+def build_cache_control(tier: Dict) -> str:
+    """
+    Build the Cache-Control header of the objects of a tier
+
+    :param tier: the tier settings
+    :return: the Cache-Control header value
+    """
+    directives = ['public', f'max-age={tier.get("max_age", 0)}']
+    if 's_maxage' in tier:
+        directives.append(f's-maxage={tier["s_maxage"]}')
+    if 'stale_while_revalidate' in tier:
+        directives.append(f'stale-while-revalidate={tier["stale_while_revalidate"]}')
+    if tier.get('immutable'):
+        directives.append('immutable')
+    return ', '.join(directives)
+
+
+def get_object_tier(key: str, tiers: Dict[str, Dict]) -> str:
+    """
+    Find the tier of an object
+
+    :param key: the object key
+    :param tiers: the cache tiers
+    :return: the name of the tier
+    """
+    file_name = posixpath.basename(key)
+    name, _, extension = file_name.rpartition('.')
+    extension = extension.lower()
+    for tier_name, tier in tiers.items():
+        if tier.get('pattern') and re.search(tier['pattern'], name if name else file_name) and (
+                'extensions' not in tier or extension in tier['extensions']):
+            return tier_name
+    for tier_name, tier in tiers.items():
+        if not tier.get('pattern') and extension in tier.get('extensions', []):
+            return tier_name
+    return DEFAULT_TIER_NAME
+
+
+def get_default_behavior_tier(tiers: Dict[str, Dict]) -> str:
+    """
+    Pages are requested without extension, so the tier of the html files is used by the default CDN behavior
+
+    :param tiers: the cache tiers
+    :return: the name of the tier of the html files
+    """
+    for tier_name, tier in tiers.items():
+        if 'html' in tier.get('extensions', []):
+            return tier_name
+    return DEFAULT_TIER_NAME
+
+
+def apply_cache_tiers(objects: List[ArtifactObject], tiers: Dict[str, Dict]):
+    """
+    Set the Cache-Control of every object according to its tier
+
+    :param objects: the objects of the website
+    :param tiers: the cache tiers
+    """
+    for obj in objects:
+        obj.cache_control = build_cache_control(tiers[get_object_tier(obj.key, tiers)])
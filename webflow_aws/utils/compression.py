@@ -0,0 +1,88 @@
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import click
+
+from webflow_aws.utils.artifact import ArtifactObject
+
+# text formats worth compressing. Images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = ('html', 'css', 'js', 'svg', 'json', 'xml', 'txt', 'ico', 'map')
+# encoding name (as in Accept-Encoding / Content-Encoding) -> suffix of the compressed variant
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+DEFAULT_ENCODINGS = ['br', 'gzip']
+
+
+def get_compression_configuration(configuration: Dict) -> Dict:
+    """
+    Get the compression section of the configuration, with the default values
+
+    :param configuration: the configuration of the website
+    :return: a dict with the enabled flag, the list of encodings and the list of compressible extensions
+    """
+    compression = configuration.get('compression') or {}
+    return {
+        'enabled': compression.get('enabled', False),
+        'encodings': compression.get('encodings', DEFAULT_ENCODINGS),
+        'extensions': list(COMPRESSIBLE_EXTENSIONS)
+    }
+
+
+def is_compressible(key: str) -> bool:
+    return key.split('.')[-1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def _compress_file(path: str, encoding: str) -> str:
+    """
+    Compress a file at the maximum level. The output is deterministic, so unchanged files keep the same hash
+
+    :param path: the path of the file to compress
+    :param encoding: br or gzip
+    :return: the path of the compressed file
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if encoding == 'br':
+        import brotli
+        compressed = brotli.compress(content, quality=11)
+    else:
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+    compressed_path = path + ENCODING_SUFFIXES[encoding]
+    with open(compressed_path, 'wb') as f:
+        f.write(compressed)
+    return compressed_path
+
+
+def compress_objects(objects: List[ArtifactObject], encodings: List[str],
+                     workers: Optional[int] = None) -> List[ArtifactObject]:
+    """
+    Create the compressed variants of the text objects, using all the CPU cores. Every compressible object gets a
+    variant for each encoding, even if it's not smaller: the edge function serves a variant without checking that
+    it exists.
+
+    :param objects: the objects of the website
+    :param encodings: the encodings to generate (br, gzip)
+    :param workers: the number of processes to use, by default the number of CPU cores
+    :return: the compressed variants, with the Content-Encoding set
+    """
+    for encoding in encodings:
+        if encoding not in ENCODING_SUFFIXES:
+            raise click.ClickException(f'Unsupported compression encoding {encoding}')
+    if 'br' in encodings:
+        try:
+            import brotli  # noqa: F401
+        except ImportError:
+            raise click.ClickException(
+                'Brotli compression requires the brotli package, install it with pip3 install webflow-aws[brotli]')
+    to_compress = [(obj, encoding) for obj in objects if is_compressible(obj.key) for encoding in encodings]
+    with ProcessPoolExecutor(max_workers=workers if workers else os.cpu_count()) as executor:
+        compressed_paths = list(executor.map(
+            _compress_file, [obj.path for obj, _ in to_compress], [encoding for _, encoding in to_compress],
+            chunksize=16))
+    return [
+        ArtifactObject(
+            key=obj.key + ENCODING_SUFFIXES[encoding], path=compressed_path, content_type=obj.content_type,
+            cache_control=obj.cache_control, content_encoding=encoding)
+        for (obj, encoding), compressed_path in zip(to_compress, compressed_paths)
+    ]
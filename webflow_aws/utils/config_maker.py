@@ -1,11 +1,52 @@
-from typing import Optional, List
+import os
+from typing import Dict, Optional, List
 
 import boto3
 import click
 import yaml
 from botocore.exceptions import ClientError
 
-from webflow_aws.utils.base_utils import get_configuration, configuration_yaml_exists
+from webflow_aws.utils.aws_lookups import get_caller_identity, get_hosted_zone_name
+from webflow_aws.utils.base_utils import CONFIGURATION_FILE_NAME, get_configuration, configuration_yaml_exists
+from webflow_aws.utils.config_schema import validate_configuration
+
+# the settings asked by create-config, and the environment variables setting them with create-config --from-env
+ENVIRONMENT_VARIABLES = {
+    'domain_name': 'WEBFLOW_AWS_DOMAIN_NAME',
+    'CNAMEs': 'WEBFLOW_AWS_CNAMES',
+    'route_53_hosted_zone_id': 'WEBFLOW_AWS_ROUTE_53_HOSTED_ZONE_ID',
+    'route_53_hosted_zone_name': 'WEBFLOW_AWS_ROUTE_53_HOSTED_ZONE_NAME',
+    'aws_profile_name': 'WEBFLOW_AWS_PROFILE_NAME',
+    'bucket_name': 'WEBFLOW_AWS_BUCKET_NAME',
+    'stack_name': 'WEBFLOW_AWS_STACK_NAME'
+}
+# the settings that must be given to create-config --from-env / --from-file, the others are computed
+REQUIRED_ANSWERS = ('domain_name', 'route_53_hosted_zone_id')
+
+
+def read_answers_from_env() -> Dict:
+    """
+    :return: the settings of the configuration set by the WEBFLOW_AWS_* environment variables. WEBFLOW_AWS_CNAMES
+    is a comma separated list
+    """
+    answers = {setting: os.environ[variable] for setting, variable in ENVIRONMENT_VARIABLES.items()
+               if os.environ.get(variable)}
+    if 'CNAMEs' in answers:
+        answers['CNAMEs'] = answers['CNAMEs'].split(',')
+    return answers
+
+
+def read_answers_from_file(path: str) -> Dict:
+    """
+    :param path: a yaml file with the settings of the configuration, as in webflow-aws-config.yaml. It can contain
+    the optional sections too (ex. compression)
+    :return: the settings of the configuration
+    """
+    with open(path) as f:
+        answers = yaml.load(f, Loader=yaml.SafeLoader) or {}
+    if not isinstance(answers, dict):
+        raise click.ClickException(f'{path} must contain the settings of the configuration')
+    return answers
 
 
 class ConfigMaker(object):
@@ -22,6 +63,7 @@ class ConfigMaker(object):
         stack_name: str                 name of the Cloudformation Stack that handles this project
         setup_bucket_name: str          name of the bucket where to store setup files
         setup_stack_name: str           name of the Cloudformation stack that handles the setup part
+        other_settings: dict            the optional sections of the configuration (ex. compression), kept as they are
     """
 
     def __init__(self):
@@ -34,6 +76,7 @@ class ConfigMaker(object):
         self.aws_profile_name: str = "default"
         self.bucket_name: str = ""
         self.stack_name: str = ""
+        self.other_settings: Dict = {}
 
         self._config_loaded: bool = False
         self._load_config()
@@ -47,7 +90,8 @@ class ConfigMaker(object):
         Loads the configuration (if present) and stores the values inside this class
         """
         if configuration_yaml_exists():
-            config = get_configuration()
+            # an invalid configuration can be fixed by create-config
+            config = get_configuration(validate=False) or {}
             self._config_loaded = True
         else:
             config = {}
@@ -58,6 +102,7 @@ class ConfigMaker(object):
         self.bucket_name = config.get('bucket_name', "")
         self.stack_name = config.get('stack_name', "")
         self.aws_profile_name = config.get('aws_profile_name', "default")
+        self.other_settings = {key: value for key, value in config.items() if key not in ENVIRONMENT_VARIABLES}
 
     def _ask_domain_and_cnames(self):
         """
@@ -123,16 +168,15 @@ class ConfigMaker(object):
         Ask final user for the aws profile name choosing between those available
         :return:
         """
+        aws_profiles = boto3.session.Session().available_profiles
         not_confirmed = True
         while not_confirmed:
-            aws_profiles = boto3.session.Session().available_profiles
             user_input = click.prompt(f"Which {click.style('aws profile', bold=True, underline=True)} "
                                       f"would you like to use for deploy?",
                                       default=self.aws_profile_name if len(
                                           self.aws_profile_name) > 0 and self.aws_profile_name in aws_profiles else None,
                                       type=click.Choice(aws_profiles))
-            boto3_session = boto3.session.Session(profile_name=user_input)
-            profile_data = boto3_session.client('sts').get_caller_identity()
+            profile_data = get_caller_identity(user_input)
             aws_account_id = profile_data.get('Account')
             aws_user_arn = profile_data.get('Arn')
             resp = click.confirm(f"  Confirm profile {click.style(user_input, bold=True)} "
@@ -155,25 +199,77 @@ class ConfigMaker(object):
         self._ask_route53()
 
         # these values can be asked as advanced option in a future improvement of this command
-        boto3_session = boto3.session.Session(profile_name=self.aws_profile_name)
-        route53_client = boto3_session.client(service_name='route53')
-        profile_data = boto3_session.client('sts').get_caller_identity()
-        aws_account_id = profile_data.get('Account')
+        self.route_53_hosted_zone_name = None
+        self.bucket_name = ""
+        self.stack_name = ""
+        return self.resolve()
+
+    def load_answers(self, answers: Dict) -> List[str]:
+        """
+        Set the configuration without asking the user (create-config --from-env / --from-file) and check it without
+        calling AWS. The optional sections of the current configuration are kept, unless given
+        :param answers: the settings of the configuration. domain_name and route_53_hosted_zone_id are required, the
+            settings computed by create-config (bucket_name, stack_name, route_53_hosted_zone_name) can be given too
+        :return: the errors found, an empty list if the answers are valid
+        """
+        answers = dict(answers)
+        cnames = answers.pop('CNAMEs', None) or []
+        if isinstance(cnames, list):
+            cnames = [str(cname).strip().lower() for cname in cnames if str(cname).strip()]
+        self.CNAMEs = cnames
+        domain_name = answers.pop('domain_name', None)
+        self.domain_name = domain_name.strip().lower() if isinstance(domain_name, str) else domain_name
+        self.route_53_hosted_zone_id = answers.pop('route_53_hosted_zone_id', None)
+        self.route_53_hosted_zone_name = answers.pop('route_53_hosted_zone_name', None)
+        self.aws_profile_name = answers.pop('aws_profile_name', None) or "default"
+        self.bucket_name = answers.pop('bucket_name', None) or ""
+        self.stack_name = answers.pop('stack_name', None) or ""
+        self.other_settings.update(answers)
+        settings = {
+            'CNAMEs': self.CNAMEs,
+            'bucket_name': self.bucket_name,
+            'domain_name': self.domain_name,
+            'route_53_hosted_zone_id': self.route_53_hosted_zone_id,
+            'route_53_hosted_zone_name': self.route_53_hosted_zone_name,
+            'stack_name': self.stack_name,
+            'aws_profile_name': self.aws_profile_name,
+            **self.other_settings
+        }
+        # the settings still to be computed are checked by resolve
+        errors = validate_configuration(
+            {key: value for key, value in settings.items() if value not in ("", None)}, required=REQUIRED_ANSWERS)
+        if self.aws_profile_name not in boto3.session.Session().available_profiles:
+            errors.append(f'The aws profile {self.aws_profile_name} is not configured')
+        return errors
+
+    def resolve(self) -> bool:
+        """
+        Set the settings read from AWS, if not set yet: the hosted zone name and the account id, part of the bucket
+        name. The lookups are cached, so that they don't call AWS when the same profile and zone are used again
+        :return: True if all the variables have been set correctly
+        """
         try:
-            self.route_53_hosted_zone_name = route53_client.get_hosted_zone(
-                Id=self.route_53_hosted_zone_id)['HostedZone']['Name']
+            if not self.route_53_hosted_zone_name:
+                self.route_53_hosted_zone_name = get_hosted_zone_name(
+                    self.aws_profile_name, self.route_53_hosted_zone_id)
         except ClientError:
             click.echo(click.style('Invalid Route53 Hosted Zone ID', bold=True, underline=True, fg="red"), err=True)
             return False
-        self.bucket_name = f"{self.domain_name}-{aws_account_id}"
-        self.stack_name = self.domain_name.replace(".", "-")
-        return True
+        if not self.bucket_name:
+            aws_account_id = get_caller_identity(self.aws_profile_name).get('Account')
+            self.bucket_name = f"{self.domain_name}-{aws_account_id}"
+        if not self.stack_name:
+            self.stack_name = self.domain_name.replace(".", "-")
+        errors = validate_configuration(self.to_dict())
+        for error in errors:
+            click.echo(click.style(f'Invalid configuration: {error}', bold=True, fg="red"), err=True)
+        return not errors
 
-    def write_config(self):
+    def to_dict(self) -> Dict:
         """
-        Dump the configuration to a file called webflow-aws-config.yaml
+        :return: the configuration, as written in webflow-aws-config.yaml
         """
-        config_dict = {
+        return {
             'CNAMEs': self.CNAMEs,
             'bucket_name': self.bucket_name,
             'domain_name': self.domain_name,
@@ -183,6 +279,12 @@ class ConfigMaker(object):
                } if self.route53_zone_added else {}),
             'stack_name': self.stack_name,
             'aws_profile_name': self.aws_profile_name,
+            **self.other_settings
         }
-        with open('webflow-aws-config.yaml', 'w') as outfile:
-            yaml.dump(config_dict, outfile)
+
+    def write_config(self):
+        """
+        Dump the configuration to a file called webflow-aws-config.yaml
+        """
+        with open(CONFIGURATION_FILE_NAME, 'w') as outfile:
+            yaml.dump(self.to_dict(), outfile)
@@ -0,0 +1,192 @@
+import re
+from typing import Dict, Iterable, List
+
+from webflow_aws.backend.networking.cloudfront_function import (
+    EDGE_RUNTIME_CLOUDFRONT_FUNCTION, EDGE_RUNTIME_LAMBDA_EDGE)
+from webflow_aws.utils.performance import HTTP_VERSIONS, PRICE_CLASSES
+
+REQUIRED_SETTINGS = (
+    'bucket_name', 'domain_name', 'CNAMEs', 'route_53_hosted_zone_id', 'route_53_hosted_zone_name', 'stack_name')
+# the settings that aren't sections: name -> expected type
+SETTINGS = {
+    'bucket_name': str,
+    'domain_name': str,
+    'CNAMEs': list,
+    'route_53_hosted_zone_id': str,
+    'route_53_hosted_zone_name': str,
+    'stack_name': str,
+    'aws_profile_name': str,
+    'edge_runtime': str,
+    'invalidation_max_paths': int
+}
+# the optional sections of the configuration: section -> setting -> expected type
+SECTIONS = {
+    'artifacts_lambda': {'memory_size': int, 'timeout': int, 'upload_concurrency': int},
+    'budgets': {
+        'page_weight_kb': int, 'image_size_kb': int, 'asset_size_kb': int, 'broken_links': int, 'duplicate_assets': int
+    },
+    'compression': {'enabled': bool, 'encodings': list},
+    'images': {'enabled': bool, 'webp': bool, 'webp_quality': int, 'picture': bool},
+    'localization': {'enabled': bool, 'default_locale': str, 'locales': list, 'cookie_name': str},
+    'minify': {
+        'enabled': bool, 'html': bool, 'css': bool, 'js': bool, 'resource_hints': bool, 'inline_css_max_size': int
+    },
+    'performance': {
+        'http_version': str, 'price_class': str, 'origin_shield_region': str, 'error_ttl': int,
+        'timing_allow_origin': str, 'response_headers': dict
+    },
+    'staging': {'enabled': bool, 'domain_name': str},
+    'storage': {'region': str, 'transfer_acceleration': bool}
+}
+# the settings of every tier of the cache_tiers section
+CACHE_TIER_SETTINGS = {
+    'extensions': list, 'pattern': str, 'max_age': int, 's_maxage': int, 'stale_while_revalidate': int,
+    'immutable': bool
+}
+TYPE_NAMES = {str: 'a string', int: 'a number', bool: 'true or false', list: 'a list', dict: 'a section'}
+EDGE_RUNTIMES = (EDGE_RUNTIME_LAMBDA_EDGE, EDGE_RUNTIME_CLOUDFRONT_FUNCTION)
+BUCKET_NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9.-]{1,61}[a-z0-9]$')
+DOMAIN_NAME_PATTERN = re.compile(r'^(?=.{1,253}$)([a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{0,62}$')
+STACK_NAME_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9-]{0,127}$')
+REGION_NAME_PATTERN = re.compile(r'^[a-z]{2}(-[a-z]+)+-[0-9]$')
+HEADER_NAME_PATTERN = re.compile(r'^[A-Za-z0-9-]+$')
+# the Webflow locale subdirectories (ex. it, pt-br)
+LOCALE_PATTERN = re.compile(r'^[A-Za-z]{2,3}(-[A-Za-z0-9]{2,8})*$')
+COOKIE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def _type_error(name: str, value, expected_type: type) -> List[str]:
+    """
+    :param name: the name of the setting, with its section (ex. compression.enabled)
+    :param value: the value of the setting
+    :param expected_type: the type the value must have
+    :return: the error of the setting, an empty list if the value has the expected type
+    """
+    # yaml reads true and false as bool, a subclass of int: they aren't valid numbers
+    if isinstance(value, expected_type) and not (expected_type is int and isinstance(value, bool)):
+        return []
+    return [f'{name} must be {TYPE_NAMES[expected_type]}, found {value!r}']
+
+
+def _section_errors(name: str, section, settings: Dict[str, type]) -> List[str]:
+    """
+    :param name: the name of the section
+    :param section: the value of the section
+    :param settings: the settings of the section, with their expected type
+    :return: the errors of the section
+    """
+    if not isinstance(section, dict):
+        return [f'{name} must be a section with the settings {", ".join(settings)}']
+    errors = []
+    for setting, value in section.items():
+        if setting not in settings:
+            errors.append(f'{name}.{setting} is not a valid setting, the settings are {", ".join(settings)}')
+        elif value is not None:
+            errors += _type_error(f'{name}.{setting}', value, settings[setting])
+    return errors
+
+
+def validate_configuration(configuration: Dict, required: Iterable[str] = REQUIRED_SETTINGS) -> List[str]:
+    """
+    Check the configuration of a website without calling AWS: the required settings, the type of every setting and
+    the format of the names
+
+    :param configuration: the configuration of the website
+    :param required: the settings that must be set
+    :return: the errors found, an empty list if the configuration is valid
+    """
+    if not isinstance(configuration, dict):
+        return ['The configuration must contain the settings of the website']
+    errors = [f'{setting} is required' for setting in required if configuration.get(setting) is None]
+    for name, value in configuration.items():
+        if value is None:
+            continue
+        if name in SETTINGS:
+            errors += _type_error(name, value, SETTINGS[name])
+        elif name in SECTIONS:
+            errors += _section_errors(name, value, SECTIONS[name])
+        elif name == 'cache_tiers':
+            if not isinstance(value, dict):
+                errors.append('cache_tiers must be a section with the tiers')
+                continue
+            for tier, settings in value.items():
+                errors += _section_errors(f'cache_tiers.{tier}', settings, CACHE_TIER_SETTINGS)
+        else:
+            errors.append(f'{name} is not a valid setting')
+    if errors:
+        return errors
+    if 'bucket_name' in configuration and not BUCKET_NAME_PATTERN.match(configuration['bucket_name']):
+        errors.append(f'bucket_name {configuration["bucket_name"]} is not a valid S3 bucket name')
+    domain_names = [('domain_name', configuration.get('domain_name'))] + [
+        ('CNAMEs', name) for name in configuration.get('CNAMEs') or []] + [
+        ('staging.domain_name', (configuration.get('staging') or {}).get('domain_name'))]
+    for setting, domain_name in domain_names:
+        if domain_name is not None and not (isinstance(domain_name, str) and DOMAIN_NAME_PATTERN.match(domain_name)):
+            errors.append(f'{setting} {domain_name} is not a valid domain name')
+    if 'stack_name' in configuration and not STACK_NAME_PATTERN.match(configuration['stack_name']):
+        errors.append(f'stack_name {configuration["stack_name"]} is not a valid CloudFormation stack name')
+    if configuration.get('edge_runtime', EDGE_RUNTIME_LAMBDA_EDGE) not in EDGE_RUNTIMES:
+        errors.append(f'edge_runtime must be one of {", ".join(EDGE_RUNTIMES)}')
+    return errors + _performance_errors(configuration.get('performance') or {}) + _localization_errors(
+        configuration.get('localization') or {}) + _storage_errors(
+        configuration.get('storage') or {}, configuration.get('bucket_name'))
+
+
+def _performance_errors(performance: Dict) -> List[str]:
+    """
+    :param performance: the performance section of the configuration, with valid types
+    :return: the errors of the values of the section
+    """
+    errors = []
+    if performance.get('http_version') not in (None,) + HTTP_VERSIONS:
+        errors.append(f'performance.http_version must be one of {", ".join(HTTP_VERSIONS)}')
+    if performance.get('price_class') not in (None,) + PRICE_CLASSES:
+        errors.append(f'performance.price_class must be one of {", ".join(PRICE_CLASSES)}')
+    region = performance.get('origin_shield_region')
+    if region is not None and not REGION_NAME_PATTERN.match(region):
+        errors.append(f'performance.origin_shield_region {region} is not a valid AWS region')
+    if (performance.get('error_ttl') or 0) < 0:
+        errors.append('performance.error_ttl must be 0 or more seconds')
+    for name, value in (performance.get('response_headers') or {}).items():
+        if not (isinstance(name, str) and HEADER_NAME_PATTERN.match(name) and isinstance(value, str)):
+            errors.append(f'performance.response_headers.{name} must be a header name with a string value')
+    return errors
+
+
+def _localization_errors(localization: Dict) -> List[str]:
+    """
+    :param localization: the localization section of the configuration, with valid types
+    :return: the errors of the values of the section
+    """
+    errors = []
+    locales = localization.get('locales') or []
+    for locale in locales:
+        if not (isinstance(locale, str) and LOCALE_PATTERN.match(locale)):
+            errors.append(f'localization.locales {locale} is not a valid locale (ex. it, pt-br)')
+    default_locale = localization.get('default_locale')
+    if default_locale is not None and not LOCALE_PATTERN.match(default_locale):
+        errors.append(f'localization.default_locale {default_locale} is not a valid locale (ex. en)')
+    elif default_locale is not None and default_locale.lower() in [str(locale).lower() for locale in locales]:
+        errors.append('localization.locales must not contain the default_locale, served from the root')
+    if localization.get('enabled') and not locales:
+        errors.append('localization.locales must contain the locales served from their folder')
+    cookie_name = localization.get('cookie_name')
+    if cookie_name is not None and not COOKIE_NAME_PATTERN.match(cookie_name):
+        errors.append(f'localization.cookie_name {cookie_name} is not a valid cookie name')
+    return errors
+
+
+def _storage_errors(storage: Dict, bucket_name: str) -> List[str]:
+    """
+    :param storage: the storage section of the configuration, with valid types
+    :param bucket_name: the name of the website bucket
+    :return: the errors of the values of the section
+    """
+    errors = []
+    region = storage.get('region')
+    if region is not None and not REGION_NAME_PATTERN.match(region):
+        errors.append(f'storage.region {region} is not a valid AWS region')
+    # the acceleration endpoint is a subdomain of the bucket, so its TLS certificate can't cover the dotted names
+    if storage.get('transfer_acceleration') and bucket_name and '.' in bucket_name:
+        errors.append('storage.transfer_acceleration requires a bucket_name without dots')
+    return errors
@@ -0,0 +1,72 @@
+from typing import Dict, List, Optional
+
+import click
+
+from webflow_aws.backend.networking.cloudfront_function import (
+    EDGE_RUNTIME_CLOUDFRONT_FUNCTION, FunctionCodeTooLarge, build_cloud_front_function_code, get_edge_runtime)
+from webflow_aws.utils.aws_utils import (
+    EDGE_FUNCTION_NAME_OUTPUT_KEY, STAGING_EDGE_FUNCTION_NAME_OUTPUT_KEY, get_stage_output)
+from webflow_aws.utils.compression import get_compression_configuration
+from webflow_aws.utils.localization import get_edge_localization
+from webflow_aws.utils.redirects import REDIRECTS_CONFIGURATION_KEY
+from webflow_aws.utils.stages import PROD_STAGE
+
+
+def build_stage_function_code(configuration: Dict, keys: List[str]) -> Optional[str]:
+    """
+    Build the code of the CloudFront Function rewriting the viewer requests, with the lookup tables of the published
+    pages and of the redirects. If the tables don't fit the CloudFront Function size limit, the code is built
+    without the pages.
+
+    :param configuration: the configuration of the website, with the redirects loaded by load_website_redirects
+    :param keys: the keys of all the published objects
+    :return: the code of the function, None if the website uses the AWS Lambda @edge runtime
+    """
+    if get_edge_runtime(configuration) != EDGE_RUNTIME_CLOUDFRONT_FUNCTION:
+        return None
+    compression = get_compression_configuration(configuration)
+    localization = get_edge_localization(configuration)
+    redirects = configuration.get(REDIRECTS_CONFIGURATION_KEY)
+    try:
+        return build_cloud_front_function_code(
+            compression=compression, keys=keys, localization=localization, redirects=redirects)
+    except FunctionCodeTooLarge as e:
+        click.echo(f'{e}: the CloudFront Function is published without the lookup table of the pages', err=True)
+        try:
+            return build_cloud_front_function_code(
+                compression=compression, localization=localization, redirects=redirects)
+        except FunctionCodeTooLarge as e:
+            raise click.ClickException(
+                f'{e}: the redirects don\'t fit the CloudFront Function, set edge_runtime to lambda_edge')
+
+
+def update_cloud_front_function(session, configuration: Dict, keys: List[str], stage: str = PROD_STAGE):
+    """
+    Embed the lookup tables of the published pages and of the redirects in the CloudFront Function rewriting the
+    viewer requests, and publish it. Every stage has its own function, since the table depends on the release
+    served by the stage. Nothing is done if the website uses the AWS Lambda @edge runtime or the code didn't change.
+
+    :param session: the boto3 session to use
+    :param configuration: the configuration of the website, with the redirects loaded by load_website_redirects
+    :param keys: the keys of all the published objects
+    :param stage: the stage of the website (prod or alpha)
+    """
+    code = build_stage_function_code(configuration, keys)
+    if code is None:
+        return
+    function_name = get_stage_output(
+        session, configuration['stack_name'], stage,
+        EDGE_FUNCTION_NAME_OUTPUT_KEY, STAGING_EDGE_FUNCTION_NAME_OUTPUT_KEY)
+    cloudfront_client = session.client('cloudfront')
+    live_code = cloudfront_client.get_function(Name=function_name, Stage='LIVE')['FunctionCode'].read()
+    if live_code == code.encode('utf-8'):
+        return
+    function = cloudfront_client.describe_function(Name=function_name)
+    function_config = function['FunctionSummary']['FunctionConfig']
+    etag = cloudfront_client.update_function(
+        Name=function_name,
+        IfMatch=function['ETag'],
+        FunctionConfig={'Comment': function_config['Comment'], 'Runtime': function_config['Runtime']},
+        FunctionCode=code.encode('utf-8'))['ETag']
+    cloudfront_client.publish_function(Name=function_name, IfMatch=etag)
+    click.echo(f'CloudFront Function {function_name} updated')
@@ -0,0 +1,126 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+
+from webflow_aws.global_variables import DEFAULT_KEEP_RELEASES
+from webflow_aws.utils.blobs import BlobStore, delete_keys, get_blob_key, is_collectable
+from webflow_aws.utils.manifest import Manifest
+from webflow_aws.utils.releases import (
+    RELEASES_PREFIX, ReleaseIndex, get_release_manifest_key, get_release_status_key)
+from webflow_aws.utils.stages import STAGES
+
+# unreferenced blobs and release folders younger than this are kept: the publish writing them may be still running
+GC_GRACE_PERIOD = 24 * 60 * 60
+
+
+class GarbageReport(object):
+    """
+    The outcome of a garbage collection of the website bucket.
+
+    Attributes:
+        deleted_releases: list      the releases whose folder has been deleted, they can't be served anymore
+        archived_releases: list     the releases whose folder has been emptied, only the manifest is kept: the folder
+                                    is restored from the blobs when the release is served again
+        deleted_blobs: int          the number of unreferenced blobs deleted
+        freed_bytes: int            the size of the objects deleted
+    """
+
+    def __init__(self):
+        self.deleted_releases: List[str] = []
+        self.archived_releases: List[str] = []
+        self.deleted_blobs: int = 0
+        self.freed_bytes: int = 0
+
+
+def _get_retained_releases(indexes: List[ReleaseIndex], keep: int) -> Set[str]:
+    """
+    :param indexes: the release indexes of every stage
+    :param keep: the number of recent releases of every stage to keep
+    :return: the releases that can still be served: the current ones and the last keep of every stage
+    """
+    retained = set()
+    for index in indexes:
+        recent = []
+        for release in reversed(index.releases):
+            if len(recent) == keep:
+                break
+            if release['id'] not in recent:
+                recent.append(release['id'])
+        retained.update(recent)
+        if index.current:
+            retained.add(index.current)
+    return retained
+
+
+def _list_release_folders(s3_client, bucket_name: str) -> Dict[str, List[Dict]]:
+    """
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :return: release id -> the objects of its folder (Key, Size, LastModified)
+    """
+    folders = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=RELEASES_PREFIX):
+        for obj in page.get('Contents', []):
+            folders.setdefault(obj['Key'][len(RELEASES_PREFIX):].split('/')[0], []).append(obj)
+    return folders
+
+
+def collect_garbage(s3_client, bucket_name: str, keep: int = DEFAULT_KEEP_RELEASES, dry_run: bool = False,
+                    grace_period: int = GC_GRACE_PERIOD, now: Optional[datetime] = None) -> GarbageReport:
+    """
+    Free the storage of the releases that are not served anymore:
+
+    - the releases older than the last keep of every stage, and the failed uploads, are deleted
+    - the folders of the other releases, except the current and the previous one of every stage (the rollback
+      targets), are emptied if all their content is stored in the blobs: only the manifest is kept and the folder
+      is restored when the release is served again
+    - the blobs not used by any kept release are deleted
+
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :param keep: the number of recent releases of every stage to keep
+    :param dry_run: compute the report without deleting anything
+    :param grace_period: the number of seconds new blobs and release folders are kept
+    :param now: the current time, timezone aware
+    :return: what has been, or would be with dry_run, deleted
+    """
+    now = now if now else datetime.now(timezone.utc)
+    report = GarbageReport()
+    indexes = [ReleaseIndex.load(s3_client, bucket_name, stage) for stage in STAGES]
+    retained = _get_retained_releases(indexes, keep)
+    served = {release_id for index in indexes for release_id in (index.current, index.previous) if release_id}
+    blob_store = BlobStore(s3_client, bucket_name)
+    blobs = blob_store.list_blobs()
+    referenced: Set[str] = set()
+    to_delete: List[str] = []
+    for release_id, objects in sorted(_list_release_folders(s3_client, bucket_name).items()):
+        manifest_key = get_release_manifest_key(release_id)
+        if release_id not in retained:
+            # a recent folder may be a release still being uploaded, or not recorded in the index yet
+            if all(is_collectable(obj['LastModified'], now, grace_period) for obj in objects):
+                report.deleted_releases.append(release_id)
+                to_delete += [obj['Key'] for obj in objects]
+                # a new publish of the release must not find the outcome of this one
+                to_delete += [get_release_status_key(stage, release_id) for stage in STAGES]
+                report.freed_bytes += sum(obj['Size'] for obj in objects)
+            continue
+        if not any(obj['Key'] == manifest_key for obj in objects):
+            continue
+        entries = Manifest.load(s3_client, bucket_name, manifest_key).entries
+        hashes = {entry['sha256'] for entry in entries.values()}
+        referenced.update(hashes)
+        files = [obj for obj in objects if obj['Key'] != manifest_key]
+        if release_id not in served and files and hashes.issubset(blobs):
+            report.archived_releases.append(release_id)
+            to_delete += [obj['Key'] for obj in files]
+            report.freed_bytes += sum(obj['Size'] for obj in files)
+    unreferenced = [sha256 for sha256, blob in sorted(blobs.items())
+                    if sha256 not in referenced and is_collectable(blob['last_modified'], now, grace_period)]
+    report.deleted_blobs = len(unreferenced)
+    report.freed_bytes += sum(blobs[sha256]['size'] for sha256 in unreferenced)
+    to_delete += [get_blob_key(sha256) for sha256 in unreferenced]
+    if not dry_run:
+        delete_keys(s3_client, bucket_name, to_delete)
+        # the listing is the reference: the catalog is rewritten, fixing it if it drifted
+        blob_store.save_catalog(set(blobs) - set(unreferenced))
+    return report
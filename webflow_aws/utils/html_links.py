@@ -0,0 +1,153 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from webflow_aws.utils.artifact import ArtifactObject
+
+LINK_ATTRIBUTES = ('href', 'src')
+# an attribute inside a start tag, with its value double quoted, single quoted or unquoted
+ATTRIBUTE_REGEX = re.compile(r'''(\s(href|src)\s*=\s*)("[^"]*"|'[^']*'|[^\s"'=<>`]+)''', re.IGNORECASE)
+
+
+def rewrite_link(link: str) -> str:
+    """
+    Remove the .html extension from an internal link, keeping the query and the fragment. External links (with a
+    scheme or a host, ex. https://example.com/page.html or mailto:...) are returned unchanged
+
+    :param link: the value of an href or src attribute
+    :return: the rewritten link
+    """
+    parts = urlsplit(link)
+    if parts.scheme or parts.netloc or not parts.path.endswith('.html'):
+        return link
+    return urlunsplit(parts._replace(path=parts.path[:-len('.html')]))
+
+
+class StartTagFinder(HTMLParser):
+    """
+    Collect the position of the start tags having at least one of the given attributes. Comments, scripts and styles
+    are skipped by the parser, so their content is never rewritten.
+
+    Attributes:
+        attributes: tuple   the names of the attributes to look for
+        tags: list          (offset, tag, attrs, text) of every start tag with one of the attributes
+    """
+
+    def __init__(self, content: str, attributes: Tuple[str, ...] = LINK_ATTRIBUTES):
+        super().__init__(convert_charrefs=False)
+        self.attributes: Tuple[str, ...] = attributes
+        self.tags: List[Tuple[int, str, List[Tuple[str, Optional[str]]], str]] = []
+        # the parser counts the lines by \n only
+        self._line_offsets: List[int] = [0] + [match.end() for match in re.finditer('\n', content)]
+
+    def get_offset(self) -> int:
+        """
+        :return: the position in the content of the tag being parsed
+        """
+        line, column = self.getpos()
+        return self._line_offsets[line - 1] + column
+
+    def handle_tag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if any(name in self.attributes for name, _ in attrs):
+            self.tags.append((self.get_offset(), tag, attrs, self.get_starttag_text()))
+
+    def handle_starttag(self, tag, attrs):
+        self.handle_tag(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_tag(tag, attrs)
+
+
+def replace_start_tags(content: str, tags: List[Tuple[int, str, List, str]], replace: Callable[..., str]) -> str:
+    """
+    Replace the text of some start tags of an html page
+
+    :param content: the html page
+    :param tags: the tags found by StartTagFinder, in order
+    :param replace: function called with (tag, attrs, text), returning the new text of the tag
+    :return: the html page with the tags replaced
+    """
+    chunks = []
+    position = 0
+    for offset, tag, attrs, text in tags:
+        chunks.append(content[position:offset])
+        chunks.append(replace(tag, attrs, text))
+        position = offset + len(text)
+    chunks.append(content[position:])
+    return ''.join(chunks)
+
+
+def rewrite_html(content: str) -> str:
+    """
+    Remove the .html extension from the internal links of an html page. Only the href and src attributes are
+    rewritten, the text of the page is left untouched
+
+    :param content: the html page
+    :return: the rewritten html page
+    """
+    finder = StartTagFinder(content)
+    finder.feed(content)
+    finder.close()
+
+    def replace_attribute(match) -> str:
+        value = match.group(3)
+        quote = value[0] if value[0] in '"\'' else ''
+        link = value[1:-1] if quote else value
+        return f'{match.group(1)}{quote}{rewrite_link(link)}{quote}'
+
+    return replace_start_tags(
+        content, finder.tags, lambda tag, attrs, text: ATTRIBUTE_REGEX.sub(replace_attribute, text))
+
+
+def read_html(path: str) -> str:
+    """
+    :param path: the path of the html file
+    :return: the content of the file. Bytes that are not valid utf-8 are preserved by write_html
+    """
+    with open(path, 'r', encoding='utf-8', errors='surrogateescape', newline='') as f:
+        return f.read()
+
+
+def write_html(path: str, content: str):
+    """
+    :param path: the path of the html file
+    :param content: the content read by read_html, possibly modified
+    """
+    with open(path, 'w', encoding='utf-8', errors='surrogateescape', newline='') as f:
+        f.write(content)
+
+
+def _rewrite_html_file(path: str) -> bool:
+    """
+    Rewrite the links of an html file in place
+
+    :param path: the path of the html file
+    :return: True if the file changed
+    """
+    content = read_html(path)
+    rewritten = rewrite_html(content)
+    if rewritten == content:
+        return False
+    write_html(path, rewritten)
+    return True
+
+
+def rewrite_html_objects(objects: List[ArtifactObject], workers: Optional[int] = None):
+    """
+    Remove the .html extension from the internal links of all the html objects, using all the CPU cores. The pages
+    are then served by the editPathForOrigin edge function, that appends .html to the paths without extension
+
+    :param objects: the objects of the website
+    :param workers: the number of processes to use, by default the number of CPU cores
+    """
+    html_objects = [obj for obj in objects if obj.content_type == 'text/html']
+    if not html_objects:
+        return
+    with ProcessPoolExecutor(max_workers=workers if workers else os.cpu_count()) as executor:
+        changed = list(executor.map(_rewrite_html_file, [obj.path for obj in html_objects], chunksize=16))
+    for obj, obj_changed in zip(html_objects, changed):
+        if obj_changed:
+            obj.invalidate_hash()
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Set
+from urllib.parse import unquote, urlsplit
+
+import click
+
+from webflow_aws.global_variables import LOCAL_STATE_FOLDER
+from webflow_aws.utils.artifact import ArtifactObject, file_sha256
+from webflow_aws.utils.html_links import StartTagFinder, read_html, replace_start_tags, write_html
+
+OPTIMIZABLE_CONTENT_TYPES = ('image/jpeg', 'image/png')
+WEBP_SUFFIX = '.webp'
+WEBP_CONTENT_TYPE = 'image/webp'
+DEFAULT_WEBP_QUALITY = 80
+# optimized images, by hash of the original content and of the settings, reused by the next publishes
+IMAGES_CACHE_FOLDER_NAME = 'images'
+IMAGES_CACHE_FOLDER = os.path.join(LOCAL_STATE_FOLDER, IMAGES_CACHE_FOLDER_NAME)
+# bumped when the results of the optimization change, so that the cached images are processed again
+IMAGES_CACHE_VERSION = 2
+
+
+def get_images_configuration(configuration: Dict) -> Dict:
+    """
+    Get the images section of the configuration, with the default values
+
+    :param configuration: the configuration of the website
+    :return: a dict with the enabled, webp, webp_quality and picture settings
+    """
+    images = configuration.get('images') or {}
+    return {
+        'enabled': images.get('enabled', False),
+        'webp': images.get('webp', True),
+        'webp_quality': images.get('webp_quality', DEFAULT_WEBP_QUALITY),
+        'picture': images.get('picture', True)
+    }
+
+
+def _format_size(size: int) -> str:
+    return f'{size / 1024:.1f} KB'
+
+
+def _optimize_jpeg(path: str, optimized_path: str) -> bool:
+    """
+    Losslessly optimize a JPEG file with jpegtran (Huffman tables optimization and progressive encoding). Pillow
+    can't do it without decoding the image, so the file is left as it is when jpegtran is not installed
+
+    :return: True if the optimized file has been created
+    """
+    jpegtran = shutil.which('jpegtran')
+    if not jpegtran:
+        return False
+    return subprocess.call(
+        [jpegtran, '-copy', 'all', '-optimize', '-progressive', '-outfile', optimized_path, path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+
+
+def _process_image(path: str, cache_folder: str, settings: Dict) -> Dict:
+    """
+    Optimize an image in place and create its WebP variant next to it (path + .webp). The results are stored in the
+    cache folder, so an image already processed with the same settings is just copied
+
+    :param path: the path of the JPEG or PNG image
+    :param cache_folder: the folder of the cache
+    :param settings: the images settings
+    :return: the report of the image: original_size, size, webp_size (None without variant), seconds, cached, error
+    """
+    from PIL import Image
+
+    start = time.perf_counter()
+    report = {'original_size': os.path.getsize(path), 'webp_size': None, 'cached': True, 'error': None}
+    settings_key = json.dumps({
+        'webp': settings['webp'], 'webp_quality': settings['webp_quality'], 'version': IMAGES_CACHE_VERSION},
+        sort_keys=True)
+    cache_key = hashlib.sha256(f'{file_sha256(path)}:{settings_key}'.encode('utf-8')).hexdigest()
+    optimized_cache_path = os.path.join(cache_folder, cache_key)
+    webp_cache_path = optimized_cache_path + WEBP_SUFFIX
+    info_cache_path = optimized_cache_path + '.json'
+    if not os.path.exists(info_cache_path):
+        report['cached'] = False
+        info = {'optimized': False, 'webp': False}
+        try:
+            with Image.open(path) as image:
+                if getattr(image, 'is_animated', False):
+                    raise ValueError('animated images are not supported')
+                if image.format == 'JPEG':
+                    info['optimized'] = _optimize_jpeg(path, optimized_cache_path)
+                elif image.format == 'PNG':
+                    image.save(optimized_cache_path, 'PNG', optimize=True, icc_profile=image.info.get('icc_profile'))
+                    info['optimized'] = True
+                if info['optimized'] and os.path.getsize(optimized_cache_path) >= report['original_size']:
+                    os.remove(optimized_cache_path)
+                    info['optimized'] = False
+                if settings['webp']:
+                    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+                    webp_image = image.convert('RGBA' if has_alpha else 'RGB')
+                    # PNG are mostly graphics, that compress better and without artifacts in lossless mode
+                    webp_image.save(webp_cache_path, 'WEBP', quality=settings['webp_quality'], method=6,
+                                    lossless=image.format == 'PNG', icc_profile=image.info.get('icc_profile'))
+                    # a variant larger than the published image would slow down the browsers supporting WebP
+                    published_size = os.path.getsize(optimized_cache_path) if info['optimized'] else \
+                        report['original_size']
+                    if os.path.getsize(webp_cache_path) < published_size:
+                        info['webp'] = True
+                    else:
+                        os.remove(webp_cache_path)
+        except Exception as e:
+            # the image is published as it is
+            report['error'] = str(e)
+            report['seconds'] = time.perf_counter() - start
+            report['size'] = report['original_size']
+            return report
+        with open(info_cache_path, 'w') as f:
+            json.dump(info, f)
+    with open(info_cache_path) as f:
+        info = json.load(f)
+    if info['optimized']:
+        shutil.copyfile(optimized_cache_path, path)
+    if info['webp']:
+        shutil.copyfile(webp_cache_path, path + WEBP_SUFFIX)
+        report['webp_size'] = os.path.getsize(path + WEBP_SUFFIX)
+    report['size'] = os.path.getsize(path)
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+def _get_webp_srcset(page_key: str, attributes: Dict[str, Optional[str]], webp_keys: Set[str]) -> Optional[str]:
+    """
+    Build the srcset of the WebP source of an img tag
+
+    :param page_key: the key of the html page containing the tag
+    :param attributes: the attributes of the img tag
+    :param webp_keys: the keys of the images having a WebP variant
+    :return: the srcset, or None if one of the images of the tag doesn't have a WebP variant
+    """
+    candidates = attributes['srcset'].split(',') if attributes.get('srcset') else [attributes.get('src') or '']
+    webp_candidates = []
+    for candidate in candidates:
+        url, _, descriptor = candidate.strip().partition(' ')
+        parts = urlsplit(url)
+        if not parts.path or parts.scheme or parts.netloc or parts.query or parts.fragment:
+            return None
+        path = unquote(parts.path)
+        key = path.lstrip('/') if path.startswith('/') else posixpath.join(posixpath.dirname(page_key), path)
+        if posixpath.normpath(key) not in webp_keys:
+            return None
+        webp_candidates.append(f'{url}{WEBP_SUFFIX} {descriptor}'.strip())
+    return ', '.join(webp_candidates)
+
+
+class _ImageTagFinder(StartTagFinder):
+    """
+    Collect the img tags that are not inside a picture element
+
+    Attributes:
+        picture_depth: int  the number of picture elements containing the current position
+    """
+
+    def __init__(self, content: str):
+        super().__init__(content, attributes=('src', 'srcset'))
+        self.picture_depth: int = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'picture':
+            self.picture_depth += 1
+        elif tag == 'img' and not self.picture_depth:
+            self.handle_tag(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == 'img' and not self.picture_depth:
+            self.handle_tag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == 'picture' and self.picture_depth:
+            self.picture_depth -= 1
+
+
+def add_picture_sources(content: str, page_key: str, webp_keys: Set[str]) -> str:
+    """
+    Wrap the img tags of an html page in a picture element with a WebP source, so the browsers supporting WebP
+    download the smaller variant. Images already inside a picture element are left untouched
+
+    :param content: the html page
+    :param page_key: the key of the html page, used to resolve the relative paths of the images
+    :param webp_keys: the keys of the images having a WebP variant
+    :return: the rewritten html page
+    """
+    finder = _ImageTagFinder(content)
+    finder.feed(content)
+    finder.close()
+    tags = []
+    sources = []
+    for tag in finder.tags:
+        attributes = dict(tag[2])
+        srcset = _get_webp_srcset(page_key, attributes, webp_keys)
+        if srcset:
+            tags.append(tag)
+            sizes = f' sizes="{attributes["sizes"]}"' if attributes.get('sizes') else ''
+            sources.append(f'<source type="{WEBP_CONTENT_TYPE}" srcset="{srcset}"{sizes}>')
+    sources.reverse()
+    return replace_start_tags(content, tags, lambda tag, attrs, text: f'<picture>{sources.pop()}{text}</picture>')
+
+
+def _add_picture_sources_file(page: Dict, webp_keys: Set[str]) -> bool:
+    """
+    :param page: the key and the path of the html page
+    :param webp_keys: the keys of the images having a WebP variant
+    :return: True if the page changed
+    """
+    content = read_html(page['path'])
+    rewritten = add_picture_sources(content, page['key'], webp_keys)
+    if rewritten == content:
+        return False
+    write_html(page['path'], rewritten)
+    return True
+
+
+def optimize_images(objects: List[ArtifactObject], settings: Dict, cache_folder: str = IMAGES_CACHE_FOLDER,
+                    workers: Optional[int] = None) -> List[ArtifactObject]:
+    """
+    Optimize the JPEG and PNG images, create their WebP variants and reference them from the html pages, using all
+    the CPU cores. A report with the size and the processing time of every image is printed
+
+    :param objects: the objects of the website
+    :param settings: the images settings
+    :param cache_folder: the folder where the processed images are cached
+    :param workers: the number of processes to use, by default the number of CPU cores
+    :return: the WebP variants
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise click.ClickException(
+            'Images optimization requires the Pillow package, install it with pip3 install webflow-aws[images]')
+    images = [obj for obj in objects if obj.content_type in OPTIMIZABLE_CONTENT_TYPES]
+    if not images:
+        return []
+    os.makedirs(cache_folder, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers if workers else os.cpu_count()) as executor:
+        reports = list(executor.map(
+            partial(_process_image, cache_folder=cache_folder, settings=settings), [obj.path for obj in images]))
+        variants = []
+        for obj, report in zip(images, reports):
+            obj.invalidate_hash()
+            if report['error']:
+                click.echo(f'{obj.key}: not optimized, {report["error"]}')
+                continue
+            webp = f', webp {_format_size(report["webp_size"])}' if report['webp_size'] is not None else ''
+            cached = ' (cached)' if report['cached'] else ''
+            click.echo(f'{obj.key}: {_format_size(report["original_size"])} -> {_format_size(report["size"])}{webp} '
+                       f'in {report["seconds"]:.2f}s{cached}')
+            if report['webp_size'] is not None:
+                variants.append(ArtifactObject(
+                    key=obj.key + WEBP_SUFFIX, path=obj.path + WEBP_SUFFIX, content_type=WEBP_CONTENT_TYPE))
+        original_size = sum(report['original_size'] for report in reports)
+        optimized_size = sum(report['size'] for report in reports)
+        click.echo(f'Optimized {len(images)} images: {_format_size(original_size)} -> '
+                   f'{_format_size(optimized_size)}, {len(variants)} WebP variants')
+        if variants and settings['picture']:
+            pages = [obj for obj in objects if obj.content_type == 'text/html']
+            webp_keys = set(variant.key[:-len(WEBP_SUFFIX)] for variant in variants)
+            changed = list(executor.map(
+                partial(_add_picture_sources_file, webp_keys=webp_keys),
+                [{'key': obj.key, 'path': obj.path} for obj in pages], chunksize=16))
+            for obj, obj_changed in zip(pages, changed):
+                if obj_changed:
+                    obj.invalidate_hash()
+    return variants
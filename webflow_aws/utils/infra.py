@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from webflow_aws.backend.networking.cloudfront_function import EDGE_RUNTIME_CLOUDFRONT_FUNCTION, get_edge_runtime
+from webflow_aws.global_variables import LOCAL_STATE_FOLDER
+from webflow_aws.utils.localization import LOCALIZED_PAGES_CONFIGURATION_KEY
+from webflow_aws.utils.redirects import REDIRECTS_CONFIGURATION_KEY
+
+INFRA_FINGERPRINT_FILE_NAME = 'infra-fingerprint'
+INFRA_FINGERPRINT_KEY = f'infra/{INFRA_FINGERPRINT_FILE_NAME}'
+# configuration values that don't change the synthesized template
+NOT_INFRA_CONFIGURATION_KEYS = ('aws_profile_name', 'budgets')
+
+
+def get_package_folder() -> Path:
+    return Path(__file__).absolute().parent.parent
+
+
+def _get_cdk_lib_version() -> str:
+    try:
+        from importlib.metadata import version
+        return version('aws-cdk-lib')
+    except Exception:
+        return ''
+
+
+def compute_infra_fingerprint(configuration: Dict) -> str:
+    """
+    Compute the fingerprint of the infrastructure of a website. It covers every input of `cdk synth`: the
+    configuration, the CDK app and constructs code, the AWS Lambda functions sources and the aws-cdk-lib version.
+    Two deploys with the same fingerprint produce the same CloudFormation template and assets. The redirects and the
+    translated pages are part of the AWS Lambda @edge code, while the CloudFront Function gets them at publish time:
+    they are left out of the fingerprint of the websites using it.
+
+    :param configuration: the configuration of the website
+    :return: the hex digest of the fingerprint
+    """
+    excluded_keys = NOT_INFRA_CONFIGURATION_KEYS
+    if get_edge_runtime(configuration) == EDGE_RUNTIME_CLOUDFRONT_FUNCTION:
+        excluded_keys += (REDIRECTS_CONFIGURATION_KEY, LOCALIZED_PAGES_CONFIGURATION_KEY)
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        {k: v for k, v in configuration.items() if k not in excluded_keys},
+        sort_keys=True, default=str).encode('utf-8'))
+    digest.update(_get_cdk_lib_version().encode('utf-8'))
+    package_folder = get_package_folder()
+    files = [package_folder / 'app.py'] + sorted(
+        path for path in (package_folder / 'backend').rglob('*')
+        if path.is_file() and 'node_modules' not in path.parts and '__pycache__' not in path.parts)
+    for path in files:
+        digest.update(path.relative_to(package_folder).as_posix().encode('utf-8'))
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def _get_local_fingerprint_path(folder: str) -> str:
+    return os.path.join(folder, LOCAL_STATE_FOLDER, INFRA_FINGERPRINT_FILE_NAME)
+
+
+def get_deployed_fingerprints(s3_client, bucket_name: str, folder: str = '.') -> List[str]:
+    """
+    Get the fingerprints of the last infrastructure deploy: the local copy and the one stored in the website bucket
+    (used when deploying from a new machine, like a CI runner)
+
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :param folder: the website folder
+    :return: the fingerprints found, local first
+    """
+    fingerprints = []
+    local_path = _get_local_fingerprint_path(folder)
+    if os.path.exists(local_path):
+        with open(local_path) as f:
+            fingerprints.append(f.read().strip())
+    try:
+        fingerprints.append(
+            s3_client.get_object(Bucket=bucket_name, Key=INFRA_FINGERPRINT_KEY)['Body'].read().decode('utf-8'))
+    except ClientError:
+        # the bucket doesn't exist yet or the stack has never been deployed by this version of the tool
+        pass
+    return fingerprints
+
+
+def save_deployed_fingerprint(s3_client, bucket_name: str, fingerprint: str, folder: str = '.'):
+    """
+    Store the fingerprint of the deployed infrastructure both locally and in the website bucket
+
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :param fingerprint: the fingerprint to store
+    :param folder: the website folder
+    """
+    local_path = _get_local_fingerprint_path(folder)
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    with open(local_path, 'w') as f:
+        f.write(fingerprint)
+    s3_client.put_object(Bucket=bucket_name, Key=INFRA_FINGERPRINT_KEY, Body=fingerprint.encode('utf-8'))
+
+
+def deploy_stack(configuration: Dict, folder: str = '.', context: Optional[Dict[str, str]] = None,
+                 log_path: Optional[str] = None) -> bool:
+    """
+    Deploy the website stack running `cdk deploy` inside the website folder
+
+    :param configuration: the configuration of the website
+    :param folder: the website folder, containing the webflow-aws-config.yaml file
+    :param context: values passed to the CDK app as context, not part of the configuration (ex. current_release)
+    :param log_path: if set, the output of cdk is written in this file instead of the console
+    :return: True if the deploy succeeded
+    """
+    # nano cdk.json
+    with open(os.path.join(folder, 'cdk.json'), 'w') as outfile:
+        json.dump({'app': 'python3 app.py'}, outfile)
+    # cp app.py .
+    shutil.copyfile(get_package_folder() / 'app.py', os.path.join(folder, 'app.py'))
+    try:
+        context_args = [arg for key, value in (context or {}).items() for arg in ('--context', f'{key}={value}')]
+        # --all: outside us-east-1, the app has the Edge stack too
+        command = ['cdk', 'deploy', '--all', '--profile', configuration.get('aws_profile_name', 'default'),
+                   '--require-approval', 'never', '--strict'] + context_args
+        if not log_path:
+            return subprocess.call(command, cwd=folder) == 0
+        with open(log_path, 'w') as log:
+            return subprocess.call(command, cwd=folder, stdout=log, stderr=subprocess.STDOUT) == 0
+    finally:
+        os.remove(os.path.join(folder, 'cdk.json'))
+        os.remove(os.path.join(folder, 'app.py'))
@@ -0,0 +1,71 @@
+import posixpath
+import time
+from typing import Iterable, List, Optional
+from urllib.parse import quote
+
+import click
+
+from webflow_aws.utils.aws_utils import get_distribution_id
+from webflow_aws.utils.stages import PROD_STAGE
+
+# above this number of paths a single wildcard invalidation is cheaper and faster
+DEFAULT_MAX_INVALIDATION_PATHS = 300
+WILDCARD_PATH = '/*'
+
+
+def get_object_paths(key: str) -> List[str]:
+    """
+    Get all the URL paths serving an object of the website. Other than the object path itself, an html page is
+    served by the path without extension (rewritten to .html by the editPathForOrigin edge function) and an
+    index.html page also by its folder path, with the trailing slash and, with the CloudFront Function, without it.
+
+    :param key: the object key, relative to the stage folder (ex. blog/index.html)
+    :return: the URL paths serving the object
+    """
+    path = quote('/' + key)
+    paths = [path]
+    if key.endswith('.html'):
+        paths.append(path[:-len('.html')])
+        if posixpath.basename(key) == 'index.html':
+            paths.append(path[:-len('index.html')])
+            if path != '/index.html':
+                paths.append(path[:-len('/index.html')])
+    return paths
+
+
+def plan_invalidation(keys: Iterable[str], max_paths: int = DEFAULT_MAX_INVALIDATION_PATHS) -> List[str]:
+    """
+    Compute the minimal list of paths to invalidate after the given objects changed
+
+    :param keys: the keys of the changed objects, relative to the stage folder
+    :param max_paths: maximum number of paths to invalidate before falling back to the wildcard path
+    :return: the paths to invalidate, sorted. The list is empty if there is nothing to invalidate
+    """
+    paths = sorted(set(path for key in keys for path in get_object_paths(key)))
+    if len(paths) > max_paths:
+        return [WILDCARD_PATH]
+    return paths
+
+
+def invalidate_distribution(session, stack_name: str, keys: Iterable[str],
+                            max_paths: int = DEFAULT_MAX_INVALIDATION_PATHS, stage: str = PROD_STAGE) -> Optional[str]:
+    """
+    Invalidate the paths of the CloudFront distribution serving the given objects
+
+    :param session: the boto3 session to use
+    :param stack_name: the CloudFormation stack serving the website
+    :param keys: the keys of the objects to invalidate, relative to the stage folder
+    :param max_paths: maximum number of paths to invalidate before falling back to the wildcard path
+    :param stage: the stage of the website, selecting the distribution to invalidate
+    :return: the id of the invalidation, None if there was nothing to invalidate
+    """
+    paths = plan_invalidation(keys, max_paths=max_paths)
+    if not paths:
+        return None
+    click.echo(f'Invalidating {len(paths)} paths of the CDN')
+    return session.client('cloudfront').create_invalidation(
+        DistributionId=get_distribution_id(session, stack_name, stage),
+        InvalidationBatch={
+            'CallerReference': str(time.time()),
+            'Paths': {'Quantity': len(paths), 'Items': paths}
+        })['Invalidation']['Id']
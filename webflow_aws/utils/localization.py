@@ -0,0 +1,62 @@
+import zipfile
+from typing import Dict, List, Optional
+
+DEFAULT_LOCALE = 'en'
+DEFAULT_LANGUAGE_COOKIE_NAME = 'language'
+# the key of the translated pages in the configuration, see load_localized_pages
+LOCALIZED_PAGES_CONFIGURATION_KEY = 'localized_pages'
+
+
+def get_localization_configuration(configuration: Dict) -> Dict:
+    """
+    Get the localization section of the configuration, with the default values
+
+    :param configuration: the configuration of the website
+    :return: a dict with the enabled flag, the default_locale served from the root of the website, the other
+    locales served from their folder and the name of the cookie with the language chosen by the visitor
+    """
+    localization = configuration.get('localization') or {}
+    return {
+        'enabled': localization.get('enabled', False),
+        'default_locale': localization.get('default_locale', DEFAULT_LOCALE),
+        'locales': localization.get('locales') or [],
+        'cookie_name': localization.get('cookie_name', DEFAULT_LANGUAGE_COOKIE_NAME)
+    }
+
+
+def get_edge_localization(configuration: Dict) -> Optional[Dict]:
+    """
+    :param configuration: the configuration of the website
+    :return: the settings of the language routing of the edge function (see checkLanguage.js), None if the website
+    is not localized
+    """
+    localization = get_localization_configuration(configuration)
+    if not localization['enabled'] or not localization['locales']:
+        return None
+    return {
+        'default': localization['default_locale'].lower(),
+        'locales': [locale.lower() for locale in localization['locales']],
+        'cookie': localization['cookie_name']
+    }
+
+
+def load_localized_pages(configuration: Dict, zip_path: Optional[str]) -> Optional[List[str]]:
+    """
+    Read the pages of the locales other than the default one from the Webflow export. The table is added by the
+    commands to the configuration, as LOCALIZED_PAGES_CONFIGURATION_KEY, so that the AWS Lambda @edge redirects the
+    visitors only to the pages translated in their language. The CloudFront Function gets the pages at publish time
+
+    :param configuration: the configuration of the website
+    :param zip_path: the zip file exported from Webflow, if any
+    :return: the paths of the translated pages without the .html extension (ex. /it/about, /it/blog/index), None if
+    the website is not localized, uses the CloudFront Function or the export is missing
+    """
+    from webflow_aws.backend.networking.cloudfront_function import (
+        EDGE_RUNTIME_LAMBDA_EDGE, get_edge_runtime, get_pages)
+
+    localization = get_edge_localization(configuration)
+    if not localization or not zip_path or get_edge_runtime(configuration) != EDGE_RUNTIME_LAMBDA_EDGE:
+        return None
+    with zipfile.ZipFile(zip_path) as zip_file:
+        keys = [info.filename.lstrip('/') for info in zip_file.infolist() if not info.is_dir()]
+    return [page for page in get_pages(keys) if page.split('/')[1].lower() in localization['locales']]
@@ -0,0 +1,128 @@
+import json
+from typing import Dict, List
+
+from botocore.exceptions import ClientError
+
+from webflow_aws.utils.artifact import ArtifactObject
+from webflow_aws.utils.compression import ENCODING_SUFFIXES
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE_NAME = '.webflow-aws-manifest.json'
+
+
+class ManifestDiff(object):
+    """
+    The difference between the published manifest and the one of the website to publish.
+
+    Attributes:
+        added: list         keys of the objects not published yet
+        changed: list       keys of the objects published with a different content or metadata
+        removed: list       keys of the published objects not contained in the website anymore
+    """
+
+    def __init__(self, added: List[str], changed: List[str], removed: List[str]):
+        self.added: List[str] = added
+        self.changed: List[str] = changed
+        self.removed: List[str] = removed
+
+    @property
+    def to_upload(self) -> List[str]:
+        return self.added + self.changed
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    @property
+    def to_invalidate(self) -> List[str]:
+        # a new page may have been requested before and its 404 response cached, the other new objects don't need
+        # to be invalidated since they have never been cached
+        keys = [key for key in self.added if key.endswith('.html')] + self.changed + self.removed
+        # the compressed variants (ex. style.css.br) are never requested by the viewers, they are served by the path
+        # of the original file, that changes with them
+        originals = set(keys)
+        return [key for key in keys if not any(
+            key.endswith(suffix) and key[:-len(suffix)] in originals for suffix in ENCODING_SUFFIXES.values())]
+
+
+class Manifest(object):
+    """
+    Describes the content of a published website: for every object key it stores the hash of its content and
+    the metadata it is served with.
+
+    Attributes:
+        entries: dict       object key -> {sha256, size, content_type, cache_control, content_encoding}
+    """
+
+    def __init__(self, entries: Dict[str, Dict] = None):
+        self.entries: Dict[str, Dict] = entries if entries else {}
+
+    @classmethod
+    def from_objects(cls, objects: List[ArtifactObject]) -> 'Manifest':
+        """
+        Build the manifest of a list of objects
+
+        :param objects: the objects of the website
+        :return: the manifest describing the objects
+        """
+        return cls({
+            obj.key: {
+                'sha256': obj.sha256,
+                'size': obj.size,
+                'content_type': obj.content_type,
+                'cache_control': obj.cache_control,
+                'content_encoding': obj.content_encoding
+            } for obj in objects
+        })
+
+    @classmethod
+    def load(cls, s3_client, bucket_name: str, key: str) -> 'Manifest':
+        """
+        Load a manifest stored in the S3 bucket. If the manifest doesn't exist, an empty one is returned
+
+        :param s3_client: the boto3 S3 client
+        :param bucket_name: the bucket containing the manifest
+        :param key: the key of the manifest
+        :return: the manifest stored in the bucket
+        """
+        try:
+            body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return cls()
+            raise
+        content = json.loads(body)
+        if content.get('version') != MANIFEST_VERSION:
+            return cls()
+        return cls(content.get('files', {}))
+
+    def save(self, s3_client, bucket_name: str, key: str):
+        """
+        Store the manifest in the S3 bucket
+
+        :param s3_client: the boto3 S3 client
+        :param bucket_name: the bucket where to store the manifest
+        :param key: the key of the manifest
+        """
+        s3_client.put_object(
+            Bucket=bucket_name, Key=key, Body=self.to_json(), ContentType='application/json', CacheControl='no-cache')
+
+    def to_json(self) -> bytes:
+        """
+        :return: the manifest serialized as it's stored in the S3 bucket
+        """
+        return json.dumps({'version': MANIFEST_VERSION, 'files': self.entries}, sort_keys=True).encode('utf-8')
+
+    def diff(self, published: 'Manifest') -> ManifestDiff:
+        """
+        Compute the difference between the published manifest and this one
+
+        :param published: the manifest of the website currently published
+        :return: the objects to add, update and remove to go from the published website to this one
+        """
+        added = sorted(key for key in self.entries if key not in published.entries)
+        changed = sorted(
+            key for key, entry in self.entries.items()
+            if key in published.entries and published.entries[key] != entry)
+        removed = sorted(key for key in published.entries if key not in self.entries)
+        return ManifestDiff(added=added, changed=changed, removed=removed)
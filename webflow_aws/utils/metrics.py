@@ -0,0 +1,86 @@
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+METRICS_VERSION = 1
+
+
+class PhaseTimer(object):
+    """
+    Measures the duration of the phases of a command (ex. cdk_deploy, upload, invalidate). A phase can be run more
+    than once: its durations are summed. Phases can be measured from many threads.
+
+    Attributes:
+        phases: dict        the duration in seconds of every phase, in the order they started
+        started: float      the perf_counter value when the timer was created
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.started: float = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Measure the duration of the code run inside the with block
+
+        :param name: the name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    @property
+    def total_seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    def to_dict(self, **values) -> Dict:
+        """
+        :param values: other values describing the command (ex. release_id)
+        :return: the JSON-serializable metrics
+        """
+        return dict(values, version=METRICS_VERSION, total_seconds=round(self.total_seconds, 3), phases=[
+            {'name': name, 'seconds': round(seconds, 3)} for name, seconds in self.phases.items()])
+
+    def format_summary(self) -> str:
+        """
+        :return: one line with the duration of every phase, ex. "build 1.2s, upload 8.4s, total 10.1s"
+        """
+        return ', '.join(
+            [f'{name} {seconds:.1f}s' for name, seconds in self.phases.items()] + [f'total {self.total_seconds:.1f}s'])
+
+
+def write_metrics(path: str, metrics):
+    """
+    :param path: the path of the JSON file
+    :param metrics: the metrics to write, a dict or a list of dicts
+    """
+    with open(path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+
+
+@contextmanager
+def profile(path: Optional[str]):
+    """
+    Profile the code run inside the with block with cProfile and write the stats in a pstats file, readable with
+    `python -m pstats <path>` or snakeviz. The processes of the parallel stages are not profiled.
+
+    :param path: the path of the pstats file, None to disable the profiling
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
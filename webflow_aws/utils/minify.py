@@ -0,0 +1,344 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import click
+
+from webflow_aws.global_variables import LOCAL_STATE_FOLDER
+from webflow_aws.utils.artifact import ArtifactObject, file_sha256
+from webflow_aws.utils.html_links import StartTagFinder, read_html, replace_start_tags, write_html
+
+# minified files, by hash of the original content and of the settings, reused by the next publishes
+MINIFY_CACHE_FOLDER_NAME = 'minify'
+MINIFY_REPORT_FILE_NAME = 'minify-report.json'
+# bumped when the output of the stage changes, so that the cached files are not reused
+MINIFY_CACHE_VERSION = 1
+KIND_BY_CONTENT_TYPE = {'text/html': 'html', 'text/css': 'css', 'application/javascript': 'js'}
+# comments and elements whose content must be kept as it is by the html minifier
+PROTECTED_HTML_REGEX = re.compile(r'<!--.*?-->|<(pre|textarea|script|style)\b[^>]*>(.*?)</\1\s*>', re.S | re.I)
+SCRIPT_TYPE_REGEX = re.compile(r'''\stype\s*=\s*["']?([^"'\s>]+)''', re.I)
+JS_SCRIPT_TYPES = ('text/javascript', 'application/javascript', 'module')
+CSS_URL_REGEX = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''', re.I)
+# more preconnects compete with the requests of the page
+MAX_PRECONNECTS = 4
+# the Webflow pages load the Google fonts with the WebFont loader: the stylesheet and the fonts come from these origins
+GOOGLE_FONTS_ORIGINS = ('https://fonts.googleapis.com', 'https://fonts.gstatic.com')
+
+
+def get_minify_configuration(configuration: Dict) -> Dict:
+    """
+    Get the minify section of the configuration, with the default values
+
+    :param configuration: the configuration of the website
+    :return: a dict with the enabled flag, the html, css and js flags of the files to minify, the resource_hints
+    flag and the inline_css_max_size in bytes of the stylesheets inlined in the pages (0 to never inline them)
+    """
+    minify = configuration.get('minify') or {}
+    return {
+        'enabled': minify.get('enabled', False),
+        'html': minify.get('html', True),
+        'css': minify.get('css', True),
+        'js': minify.get('js', True),
+        'resource_hints': minify.get('resource_hints', True),
+        'inline_css_max_size': minify.get('inline_css_max_size', 0)
+    }
+
+
+def _format_size(size: int) -> str:
+    return f'{size / 1024:.1f} KB'
+
+
+def minify_css(content: str) -> str:
+    import rcssmin
+    return rcssmin.cssmin(content)
+
+
+def minify_js(content: str) -> str:
+    import rjsmin
+    return rjsmin.jsmin(content)
+
+
+def _collapse_whitespace(text: str) -> str:
+    # browsers render any run of whitespace between inline elements as a single space
+    return re.sub(r'\s+', lambda match: '\n' if '\n' in match.group(0) else ' ', text)
+
+
+def minify_html(content: str, settings: Dict) -> str:
+    """
+    Minify an html page: remove the comments (except the conditional ones), collapse the whitespace and minify the
+    inline styles and scripts. The content of pre and textarea elements is kept as it is
+
+    :param content: the html page
+    :param settings: the minify settings, with the css and js flags
+    :return: the minified page
+    """
+    def replace(match) -> str:
+        text = match.group(0)
+        if text.startswith('<!--'):
+            return text if text.startswith(('<!--[if', '<!--<![endif]')) else ''
+        tag, body = match.group(1).lower(), match.group(2)
+        start = text[:match.start(2) - match.start(0)]
+        if tag == 'style' and settings['css']:
+            return f'{start}{minify_css(body)}</style>'
+        script_type = SCRIPT_TYPE_REGEX.search(start)
+        if tag == 'script' and settings['js'] and (not script_type or script_type.group(1).lower() in JS_SCRIPT_TYPES):
+            return f'{start}{minify_js(body)}</script>'
+        return text
+
+    chunks = []
+    position = 0
+    for match in PROTECTED_HTML_REGEX.finditer(content):
+        chunks.append(_collapse_whitespace(content[position:match.start()]))
+        chunks.append(replace(match))
+        position = match.end()
+    chunks.append(_collapse_whitespace(content[position:]))
+    return ''.join(chunks).strip() + '\n'
+
+
+def _get_origin(url: str) -> Optional[str]:
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https', '') or not parts.netloc:
+        return None
+    return f'{parts.scheme or "https"}://{parts.netloc}'
+
+
+def _resolve_key(page_key: str, url: str) -> Optional[str]:
+    """
+    :param page_key: the key of the html page containing the link
+    :param url: the link, relative to the page or to the website
+    :return: the key of the linked object, None if the link is external
+    """
+    parts = urlsplit(url)
+    if not parts.path or parts.scheme or parts.netloc:
+        return None
+    path = unquote(parts.path)
+    return posixpath.normpath(path.lstrip('/') if path.startswith('/') else posixpath.join(
+        posixpath.dirname(page_key), path))
+
+
+class _ResourceFinder(StartTagFinder):
+    """
+    Collect the resources of an html page worth a resource hint
+
+    Attributes:
+        insert_offset: int      the position after the head start tag (or its meta charset), where the hints are
+                                added. None if the page has no head
+        origins: dict           the external origins of the scripts and stylesheets -> True if they are requested
+                                with CORS, in order of appearance
+        scripts: list           the attributes of the blocking scripts of the body, discovered late by the browser
+        hinted: set             the href of the preconnect and preload links already in the page
+        stylesheets: list       (offset, tag, attrs, text) of the stylesheet links, that can be inlined
+    """
+
+    def __init__(self, content: str):
+        super().__init__(content, attributes=('href', 'src'))
+        self.insert_offset: Optional[int] = None
+        self.origins: Dict[str, bool] = {}
+        self.scripts: List[Dict[str, Optional[str]]] = []
+        self.hinted = set()
+        self.stylesheets: List[Tuple[int, str, List, str]] = []
+        self._in_body = False
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == 'head' and self.insert_offset is None:
+            self.insert_offset = self.get_offset() + len(self.get_starttag_text())
+        elif tag == 'meta' and 'charset' in attributes and not self._in_body and self.insert_offset is not None:
+            # the charset must stay in the first bytes of the page
+            self.insert_offset = self.get_offset() + len(self.get_starttag_text())
+        elif tag == 'body':
+            self._in_body = True
+        elif tag == 'link':
+            rel = (attributes.get('rel') or '').lower().split()
+            if 'preconnect' in rel or 'preload' in rel:
+                self.hinted.add(attributes.get('href'))
+            elif 'stylesheet' in rel and attributes.get('href'):
+                self.stylesheets.append((self.get_offset(), tag, attrs, self.get_starttag_text()))
+                self._add_origin(attributes['href'], 'crossorigin' in attributes)
+        elif tag == 'script' and attributes.get('src'):
+            self._add_origin(attributes['src'], 'crossorigin' in attributes)
+            script_type = (attributes.get('type') or 'text/javascript').lower()
+            if self._in_body and script_type in JS_SCRIPT_TYPES and 'async' not in attributes and \
+                    'defer' not in attributes and script_type != 'module':
+                self.scripts.append(attributes)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def _add_origin(self, url: str, cors: bool):
+        origin = _get_origin(url)
+        if not origin:
+            return
+        self.origins[origin] = self.origins.get(origin, False) or cors
+        if origin == GOOGLE_FONTS_ORIGINS[0] or 'webfont' in url.lower():
+            # the fonts are always requested with CORS
+            self.origins.setdefault(GOOGLE_FONTS_ORIGINS[0], False)
+            self.origins[GOOGLE_FONTS_ORIGINS[1]] = True
+
+
+def add_resource_hints(content: str, page_key: str, settings: Dict, inline_css: Dict[str, str]) -> str:
+    """
+    Add the resource hints to an html page: a preconnect to the external origins of its scripts, stylesheets and
+    fonts (ex. the Webflow CDN and the Google fonts), and a preload of the blocking scripts at the end of the body,
+    so the browser downloads them while it's parsing the page. The small stylesheets are inlined in the page
+
+    :param content: the html page
+    :param page_key: the key of the html page, used to resolve the relative paths of the stylesheets
+    :param settings: the minify settings
+    :param inline_css: the content of the stylesheets to inline, by key
+    :return: the page with the hints
+    """
+    finder = _ResourceFinder(content)
+    finder.feed(content)
+    finder.close()
+    hints = []
+    if settings['resource_hints']:
+        for origin, cors in list(finder.origins.items())[:MAX_PRECONNECTS]:
+            if origin not in finder.hinted:
+                hints.append(f'<link rel="preconnect" href="{origin}"{" crossorigin" if cors else ""}>')
+        for script in finder.scripts:
+            if script['src'] in finder.hinted:
+                continue
+            integrity = f' integrity="{script["integrity"]}"' if script.get('integrity') else ''
+            crossorigin = f' crossorigin="{script["crossorigin"]}"' if script.get('crossorigin') else \
+                (' crossorigin' if 'crossorigin' in script else '')
+            hints.append(f'<link rel="preload" href="{script["src"]}" as="script"{integrity}{crossorigin}>')
+    tags = []
+    for tag in finder.stylesheets:
+        attributes = dict(tag[2])
+        key = _resolve_key(page_key, attributes['href'])
+        if key in inline_css and (attributes.get('media') or 'all') in ('all', 'screen'):
+            tags.append(tag)
+    if hints and finder.insert_offset is not None:
+        # an empty tag at the insertion point, replaced by the hints
+        tags = sorted(tags + [(finder.insert_offset, '', [], '')], key=lambda tag: (tag[0], bool(tag[1])))
+
+    def replace(tag, attrs, text) -> str:
+        if not tag:
+            return ''.join(hints)
+        return f'<style>{inline_css[_resolve_key(page_key, dict(attrs)["href"])]}</style>'
+
+    return replace_start_tags(content, tags, replace)
+
+
+def rebase_css_urls(content: str, css_key: str) -> str:
+    """
+    Make the relative urls of a stylesheet (images, fonts, imports) relative to the root of the website, so that
+    the stylesheet can be inlined in pages of any folder
+
+    :param content: the stylesheet
+    :param css_key: the key of the stylesheet
+    :return: the rebased stylesheet
+    """
+    def rebase(match) -> str:
+        url = match.group(2).strip()
+        parts = urlsplit(url)
+        if parts.scheme or parts.netloc or url.startswith(('/', '#')):
+            return match.group(0)
+        return f'url({match.group(1)}/{posixpath.normpath(posixpath.join(posixpath.dirname(css_key), url))}' \
+               f'{match.group(1)})'
+
+    return CSS_URL_REGEX.sub(rebase, content)
+
+
+def _minify_file(item: Dict, cache_folder: str, settings_key: str, settings: Dict,
+                 inline_css: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Minify a file in place. The result is stored in the cache folder, so a file already minified with the same
+    settings is just copied
+
+    :param item: the key, the path and the kind (html, css or js) of the file
+    :param cache_folder: the folder of the cache
+    :param settings_key: the settings changing the output, part of the cache key
+    :param settings: the minify settings
+    :param inline_css: the content of the stylesheets to inline in the pages, by key
+    :return: the report of the file: key, original_size, size and cached
+    """
+    path = item['path']
+    report = {'key': item['key'], 'original_size': os.path.getsize(path), 'cached': True}
+    cache_key = hashlib.sha256(f'{file_sha256(path)}:{item["key"]}:{settings_key}'.encode('utf-8')).hexdigest()
+    cache_path = os.path.join(cache_folder, cache_key)
+    if not os.path.exists(cache_path):
+        report['cached'] = False
+        content = read_html(path)
+        if item['kind'] == 'html':
+            if settings['resource_hints'] or inline_css:
+                content = add_resource_hints(content, item['key'], settings, inline_css or {})
+            if settings['html']:
+                content = minify_html(content, settings)
+        elif item['kind'] == 'css':
+            content = minify_css(content)
+        else:
+            content = minify_js(content)
+        temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+        write_html(temporary_path, content)
+        os.replace(temporary_path, cache_path)
+    shutil.copyfile(cache_path, path)
+    report['size'] = os.path.getsize(path)
+    return report
+
+
+def minify_objects(objects: List[ArtifactObject], settings: Dict, state_folder: str = LOCAL_STATE_FOLDER,
+                   workers: Optional[int] = None):
+    """
+    Minify the html, css and js files, add the resource hints to the pages and inline the small stylesheets, using
+    all the CPU cores. Files already minified (.min.css, .min.js) are skipped. The size of every file before and
+    after is written in the minify report of the state folder
+
+    :param objects: the objects of the website
+    :param settings: the minify settings
+    :param state_folder: the local state folder of the website, containing the cache and the report
+    :param workers: the number of processes to use, by default the number of CPU cores
+    """
+    if settings['css'] or settings['js'] or settings['html']:
+        try:
+            import rcssmin  # noqa: F401
+            import rjsmin  # noqa: F401
+        except ImportError:
+            raise click.ClickException(
+                'Minification requires the rcssmin and rjsmin packages, install them with '
+                'pip3 install webflow-aws[minify]')
+    items = {'html': [], 'css': [], 'js': []}
+    for obj in objects:
+        kind = KIND_BY_CONTENT_TYPE.get(obj.content_type)
+        if kind and not obj.key.endswith(('.min.css', '.min.js')) and (kind == 'html' or settings[kind]):
+            items[kind].append(obj)
+    if not any(items.values()):
+        return
+    cache_folder = os.path.join(state_folder, MINIFY_CACHE_FOLDER_NAME)
+    os.makedirs(cache_folder, exist_ok=True)
+    settings_key = json.dumps(dict(settings, version=MINIFY_CACHE_VERSION), sort_keys=True)
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers if workers else os.cpu_count()) as executor:
+        assets = items['css'] + items['js']
+        reports += executor.map(
+            partial(_minify_file, cache_folder=cache_folder, settings_key=settings_key, settings=settings),
+            [{'key': obj.key, 'path': obj.path, 'kind': KIND_BY_CONTENT_TYPE[obj.content_type]} for obj in assets])
+        inline_css = {}
+        for obj in items['css']:
+            if os.path.getsize(obj.path) <= settings['inline_css_max_size']:
+                inline_css[obj.key] = rebase_css_urls(read_html(obj.path), obj.key)
+        # the pages embed the inlined stylesheets, that are part of their cache key
+        pages_settings_key = settings_key + hashlib.sha256(
+            json.dumps(inline_css, sort_keys=True).encode('utf-8')).hexdigest()
+        if settings['html'] or settings['resource_hints'] or inline_css:
+            reports += executor.map(
+                partial(_minify_file, cache_folder=cache_folder, settings_key=pages_settings_key, settings=settings,
+                        inline_css=inline_css),
+                [{'key': obj.key, 'path': obj.path, 'kind': 'html'} for obj in items['html']], chunksize=16)
+    for obj in objects:
+        obj.invalidate_hash()
+    original_size = sum(report['original_size'] for report in reports)
+    size = sum(report['size'] for report in reports)
+    report_path = os.path.join(state_folder, MINIFY_REPORT_FILE_NAME)
+    with open(report_path, 'w') as f:
+        json.dump({'original_size': original_size, 'size': size, 'files': reports}, f, indent=2)
+    click.echo(f'Minified {len(reports)} files: {_format_size(original_size)} -> {_format_size(size)} '
+               f'({sum(report["cached"] for report in reports)} cached), the size of every file is in {report_path}')
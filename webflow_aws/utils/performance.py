@@ -0,0 +1,48 @@
+from typing import Dict, List, Tuple
+
+from webflow_aws.utils.compression import get_compression_configuration
+
+HTTP_VERSIONS = ('http1.1', 'http2', 'http2and3', 'http3')
+# the CloudFront price classes, from the cheapest (North America and Europe only) to all the edge locations
+PRICE_CLASSES = ('PriceClass_100', 'PriceClass_200', 'PriceClass_All')
+DEFAULT_HTTP_VERSION = 'http2'
+DEFAULT_PRICE_CLASS = 'PriceClass_100'
+# how long CloudFront caches the 404 page returned for a missing object
+DEFAULT_ERROR_TTL = 300
+
+
+def get_performance_configuration(configuration: Dict) -> Dict:
+    """
+    Get the performance section of the configuration, with the default values
+
+    :param configuration: the configuration of the website
+    :return: a dict with the http_version, the price_class, the origin_shield_region (None to disable Origin
+    Shield), the error_ttl in seconds, the timing_allow_origin (None to not send the header) and the
+    response_headers added to every response
+    """
+    performance = configuration.get('performance') or {}
+    return {
+        'http_version': performance.get('http_version', DEFAULT_HTTP_VERSION),
+        'price_class': performance.get('price_class', DEFAULT_PRICE_CLASS),
+        'origin_shield_region': performance.get('origin_shield_region'),
+        'error_ttl': performance.get('error_ttl', DEFAULT_ERROR_TTL),
+        'timing_allow_origin': performance.get('timing_allow_origin'),
+        'response_headers': performance.get('response_headers') or {}
+    }
+
+
+def get_response_headers(configuration: Dict) -> List[Tuple[str, str]]:
+    """
+    :param configuration: the configuration of the website
+    :return: the (name, value) of the headers added by the CDN to every response, sorted by name
+    """
+    performance = get_performance_configuration(configuration)
+    headers = dict(performance['response_headers'])
+    if get_compression_configuration(configuration)['enabled']:
+        # the edge function serves the br, gzip or identity variant of the same URL by Accept-Encoding: the browser
+        # and proxy caches must not serve a compressed body to a client that can't decode it. S3 can't store a Vary
+        # header with the objects, so it's added by the CDN
+        headers.setdefault('Vary', 'Accept-Encoding')
+    if performance['timing_allow_origin']:
+        headers['Timing-Allow-Origin'] = performance['timing_allow_origin']
+    return sorted(headers.items())
@@ -0,0 +1,84 @@
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import click
+
+from webflow_aws.global_variables import LOCAL_STATE_FOLDER
+from webflow_aws.utils.artifact import ArtifactObject, pack_artifact, unpack_artifact
+from webflow_aws.utils.cache_tiers import apply_cache_tiers, get_cache_tiers
+from webflow_aws.utils.compression import compress_objects, get_compression_configuration
+from webflow_aws.utils.edge_function import build_stage_function_code
+from webflow_aws.utils.html_links import rewrite_html_objects
+from webflow_aws.utils.images import IMAGES_CACHE_FOLDER_NAME, get_images_configuration, optimize_images
+from webflow_aws.utils.manifest import MANIFEST_FILE_NAME, Manifest
+from webflow_aws.utils.metrics import PhaseTimer
+from webflow_aws.utils.minify import get_minify_configuration, minify_objects
+
+
+def build_objects(zip_path: str, work_dir: str, configuration: Dict, state_folder: str = LOCAL_STATE_FOLDER,
+                  timer: Optional[PhaseTimer] = None) -> List[ArtifactObject]:
+    """
+    Unpack the Webflow export and run all the processing stages enabled in the configuration
+
+    :param zip_path: the path of the zip file exported from Webflow
+    :param work_dir: the folder where the processed files are stored
+    :param configuration: the configuration of the website
+    :param state_folder: the local state folder of the website, containing the caches
+    :param timer: the timer measuring every stage, if any
+    :return: the objects to publish
+    """
+    timer = timer if timer else PhaseTimer()
+    with timer.phase('unpack'):
+        objects = unpack_artifact(zip_path, work_dir)
+    with timer.phase('rewrite_html'):
+        rewrite_html_objects(objects)
+    images = get_images_configuration(configuration)
+    if images['enabled']:
+        with timer.phase('images'):
+            objects += optimize_images(
+                objects, images, cache_folder=os.path.join(state_folder, IMAGES_CACHE_FOLDER_NAME))
+    minify = get_minify_configuration(configuration)
+    if minify['enabled']:
+        with timer.phase('minify'):
+            minify_objects(objects, minify, state_folder=state_folder)
+    apply_cache_tiers(objects, get_cache_tiers(configuration))
+    compression = get_compression_configuration(configuration)
+    if compression['enabled']:
+        with timer.phase('compression'):
+            variants = compress_objects(objects, encodings=compression['encodings'])
+        click.echo(f'Compressed {len(variants)} variants of {len(objects)} files')
+        objects += variants
+    return objects
+
+
+def build_package(zip_path: str, package_path: str, configuration: Dict, state_folder: str = LOCAL_STATE_FOLDER,
+                  timer: Optional[PhaseTimer] = None) -> Manifest:
+    """
+    Build the package extracted by the s3TriggerArtifactsUpload lambda, with the processed objects, their metadata,
+    the manifest of the release and the code of the CloudFront Function serving it, if any. The package gets the same
+    modification time as the Webflow export, so that an interrupted upload of the same export can be resumed.
+
+    :param zip_path: the path of the zip file exported from Webflow
+    :param package_path: the path of the package to create
+    :param configuration: the configuration of the website, with the redirects loaded by load_website_redirects
+    :param state_folder: the local state folder of the website, containing the caches
+    :param timer: the timer measuring every stage, if any
+    :return: the manifest of the objects contained in the package
+    """
+    timer = timer if timer else PhaseTimer()
+    os.makedirs(os.path.dirname(os.path.abspath(package_path)), exist_ok=True)
+    with tempfile.TemporaryDirectory() as work_dir:
+        objects = build_objects(zip_path, work_dir, configuration, state_folder=state_folder, timer=timer)
+        with timer.phase('package'):
+            manifest = Manifest.from_objects(objects)
+            manifest_path = os.path.join(work_dir, MANIFEST_FILE_NAME)
+            with open(manifest_path, 'wb') as f:
+                f.write(manifest.to_json())
+            pack_artifact(objects + [ArtifactObject(
+                key=MANIFEST_FILE_NAME, path=manifest_path, content_type='application/json',
+                cache_control='no-cache')], package_path,
+                edge_function_code=build_stage_function_code(configuration, list(manifest.entries)))
+    zip_stat = os.stat(zip_path)
+    os.utime(package_path, (zip_stat.st_atime, zip_stat.st_mtime))
+    return manifest
@@ -0,0 +1,105 @@
+import tempfile
+from typing import Dict, Optional
+
+import click
+from boto3.s3.transfer import TransferConfig
+
+from webflow_aws.global_variables import DEFAULT_PART_SIZE_MB, DEFAULT_TRANSFER_CONCURRENCY, LOCAL_STATE_FOLDER, MB
+from webflow_aws.utils.aws_utils import get_upload_client
+from webflow_aws.utils.blobs import BlobStore
+from webflow_aws.utils.edge_function import update_cloud_front_function
+from webflow_aws.utils.manifest import MANIFEST_FILE_NAME, Manifest, ManifestDiff
+from webflow_aws.utils.metrics import PhaseTimer
+from webflow_aws.utils.pipeline import build_objects
+from webflow_aws.utils.releases import (
+    ReleaseIndex, activate_release, get_legacy_prefix, get_release_id, get_release_prefix, load_published_manifest,
+    release_exists)
+
+
+class IncrementalPublisher(object):
+    """
+    Publishes a Webflow export as a new release, uploading only the content never published before: every content
+    is stored once in the blobs of the bucket (see BlobStore) and the release folder is created by copying them
+    inside the bucket. The objects are uploaded directly, without going through the artifacts AWS Lambda function.
+
+    Attributes:
+        configuration: dict     the configuration of the website
+        bucket_name: str        the bucket where the website is published
+        stack_name: str         the CloudFormation stack serving the website
+        stage: str              the stage of the website (prod or alpha)
+        concurrency: int        the number of parallel uploads
+        part_size: int          the part size in bytes used for the multipart upload of big files
+        state_folder: str       the local state folder of the website, containing the caches
+        show_progress: bool     show the progress bars of the transfers
+        timer: PhaseTimer       the timer measuring every phase of the publish
+        invalidation_id: str    the id of the invalidation of the last publish, None if nothing was invalidated
+    """
+
+    def __init__(self, session, configuration: Dict, stage: str = 'prod',
+                 concurrency: int = DEFAULT_TRANSFER_CONCURRENCY, part_size: int = DEFAULT_PART_SIZE_MB * MB,
+                 state_folder: str = LOCAL_STATE_FOLDER, show_progress: bool = True,
+                 timer: Optional[PhaseTimer] = None):
+        self.configuration: Dict = configuration
+        self.bucket_name: str = configuration['bucket_name']
+        self.stack_name: str = configuration['stack_name']
+        self.stage: str = stage
+        self.concurrency: int = concurrency
+        self.part_size: int = part_size
+        self.state_folder: str = state_folder
+        self.show_progress: bool = show_progress
+        self.timer: PhaseTimer = timer if timer else PhaseTimer()
+        self.invalidation_id: Optional[str] = None
+        self._session = session
+        self._s3_client = session.client('s3')
+        self._upload_client = get_upload_client(session, configuration)
+        # files are already transferred in parallel, so every single file is sent with one thread
+        self._transfer_config = TransferConfig(
+            multipart_threshold=part_size, multipart_chunksize=part_size, use_threads=False)
+
+    def publish(self, zip_path: str) -> ManifestDiff:
+        """
+        Publish the zip file exported from Webflow
+
+        :param zip_path: the path of the zip file
+        :return: the difference between the previously published website and the new one
+        """
+        self.invalidation_id = None
+        with self.timer.phase('load_release'):
+            index = ReleaseIndex.load(self._s3_client, self.bucket_name, self.stage)
+            published_prefix = get_release_prefix(index.current) if index.current else get_legacy_prefix(self.stage)
+            published_manifest = load_published_manifest(self._s3_client, self.bucket_name, index)
+        with tempfile.TemporaryDirectory() as work_dir:
+            objects = build_objects(
+                zip_path, work_dir, self.configuration, state_folder=self.state_folder, timer=self.timer)
+            manifest = Manifest.from_objects(objects)
+            release_id = get_release_id(manifest)
+            diff = manifest.diff(published_manifest)
+            click.echo(f'{len(diff.added)} new, {len(diff.changed)} changed and {len(diff.removed)} removed files')
+            if release_exists(self._s3_client, self.bucket_name, release_id):
+                click.echo(f'Release {release_id} already uploaded')
+            else:
+                prefix = get_release_prefix(release_id)
+                blob_store = BlobStore(
+                    self._s3_client, self.bucket_name, concurrency=self.concurrency, show_progress=self.show_progress,
+                    transfer_config=self._transfer_config, upload_client=self._upload_client)
+                with self.timer.phase('upload'):
+                    uploaded = blob_store.store(
+                        objects, published_entries=published_manifest.entries, published_prefix=published_prefix)
+                click.echo(f'{len(uploaded)} new contents uploaded ({sum(obj.size for obj in uploaded)} bytes), '
+                           f'the others are already stored')
+                with self.timer.phase('copy'):
+                    copied = blob_store.materialize(manifest.entries, prefix)
+                click.echo(f'{copied} files copied in the release folder')
+                # the manifest is uploaded last: its presence marks the release as complete
+                manifest.save(self._s3_client, self.bucket_name, prefix + MANIFEST_FILE_NAME)
+        if index.current == release_id:
+            click.echo(f'Release {release_id} is already served')
+            # the release id doesn't cover the redirects, that may have changed without the files
+            with self.timer.phase('edge_function'):
+                update_cloud_front_function(
+                    self._session, self.configuration, list(manifest.entries), stage=self.stage)
+            return diff
+        self.invalidation_id = activate_release(
+            self._session, self.configuration, index, release_id, manifest, published_manifest, timer=self.timer)
+        click.echo(f'Release {release_id} published')
+        return diff
@@ -0,0 +1,126 @@
+import csv
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import click
+import yaml
+
+# the redirects of a website, in the website folder next to webflow-aws-config.yaml
+REDIRECTS_FILE_NAMES = ('webflow-aws-redirects.csv', 'webflow-aws-redirects.yaml')
+# the key of the compiled redirects in the configuration, see load_website_redirects
+REDIRECTS_CONFIGURATION_KEY = 'redirects'
+SOURCE_PATTERN = re.compile(r'^/[^\s?#]*$')
+TARGET_PATTERN = re.compile(r'^(/|https?://)\S*$')
+
+
+def find_redirects_file(folder: str = '.') -> Optional[str]:
+    """
+    :param folder: the website folder
+    :return: the path of the redirects file of the website, None if the website has no redirects
+    """
+    for file_name in REDIRECTS_FILE_NAMES:
+        path = os.path.join(folder, file_name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def normalize_path(path: str) -> str:
+    """
+    :param path: a path of the website (ex. /blog/)
+    :return: the path without the trailing slash, as looked up by the edge function (ex. /blog)
+    """
+    return path[:-1] if len(path) > 1 and path.endswith('/') else path
+
+
+def read_redirects(path: str) -> List[Tuple[str, str]]:
+    """
+    Read a redirects file: a CSV file with the source and the target of every redirect (the Webflow export format,
+    with or without the header row), or a YAML file with the target of every source
+
+    :param path: the path of the redirects file
+    :return: the (source, target) of every redirect, in the order of the file
+    """
+    with open(path, newline='') as f:
+        if path.endswith('.yaml'):
+            content = yaml.load(f, Loader=yaml.SafeLoader) or {}
+            if not isinstance(content, dict):
+                raise click.ClickException(f'{path} must contain the target of every source path')
+            return [(str(source).strip(), str(target).strip()) for source, target in content.items()]
+        redirects = []
+        first_row = True
+        for row in csv.reader(f):
+            cells = [cell.strip() for cell in row]
+            if not cells or not cells[0] or cells[0].startswith('#'):
+                continue
+            # the header row (ex. source,target)
+            is_header = first_row and not cells[0].startswith('/')
+            first_row = False
+            if not is_header:
+                redirects.append((cells[0], cells[1] if len(cells) > 1 else ''))
+        return redirects
+
+
+def compile_redirects(redirects: List[Tuple[str, str]]) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Check the redirects without calling AWS and compile them in the lookup table of the edge function. The chains
+    (/a -> /b -> /c) are collapsed, so that every redirect is answered with a single round trip
+
+    :param redirects: the (source, target) of every redirect
+    :return: the lookup table, normalized source path -> target, and the warnings about the collapsed chains
+    :raise click.ClickException: with all the errors found: invalid paths, sources with different targets, loops
+    """
+    errors = []
+    table: Dict[str, str] = {}
+    for source, target in redirects:
+        if not SOURCE_PATTERN.match(source):
+            errors.append(f'{source} is not a valid source path, it must start with / and have no query string')
+        elif not TARGET_PATTERN.match(target):
+            errors.append(f'{source}: {target} is not a valid target, it must be a path or an http(s) URL')
+        elif table.get(normalize_path(source), target) != target:
+            errors.append(f'{source} is redirected both to {table[normalize_path(source)]} and to {target}')
+        else:
+            table[normalize_path(source)] = target
+    warnings = []
+    compiled = {}
+    loops = set()
+    for source, target in table.items():
+        hops = [source]
+        while target.startswith('/') and normalize_path(re.split('[?#]', target)[0]) in table:
+            next_source = normalize_path(re.split('[?#]', target)[0])
+            if next_source in hops:
+                loop = hops[hops.index(next_source):]
+                # every path of the loop finds it, it's reported once
+                if frozenset(loop) not in loops:
+                    loops.add(frozenset(loop))
+                    errors.append(f'redirect loop: {" -> ".join(loop + [next_source])}')
+                break
+            hops.append(next_source)
+            target = table[next_source]
+        else:
+            if len(hops) > 1:
+                warnings.append(f'redirect chain {" -> ".join(hops + [target])} served as {source} -> {target}')
+            compiled[source] = target
+    if errors:
+        raise click.ClickException('Invalid redirects:\n' + '\n'.join(f'  - {error}' for error in errors))
+    return compiled, warnings
+
+
+def load_website_redirects(folder: str = '.', show_warnings: bool = True) -> Dict[str, str]:
+    """
+    Read and compile the redirects of a website. The table is added by the commands to the configuration, as
+    REDIRECTS_CONFIGURATION_KEY, so that the edge functions built from it answer the redirects
+
+    :param folder: the website folder
+    :param show_warnings: print the redirect chains that have been collapsed
+    :return: the lookup table of the redirects, empty if the website has no redirects file
+    """
+    path = find_redirects_file(folder)
+    if not path:
+        return {}
+    compiled, warnings = compile_redirects(read_redirects(path))
+    if show_warnings:
+        for warning in warnings:
+            click.echo(f'Warning: {warning}', err=True)
+    return compiled
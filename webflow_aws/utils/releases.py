@@ -0,0 +1,279 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from webflow_aws.utils.aws_utils import get_distribution_id
+from webflow_aws.utils.blobs import BlobStore
+from webflow_aws.utils.edge_function import update_cloud_front_function
+from webflow_aws.utils.invalidation import DEFAULT_MAX_INVALIDATION_PATHS, invalidate_distribution
+from webflow_aws.utils.manifest import MANIFEST_FILE_NAME, Manifest
+from webflow_aws.utils.metrics import PhaseTimer
+
+RELEASES_PREFIX = 'src/releases/'
+RELEASE_INDEX_VERSION = 1
+RELEASE_ID_LENGTH = 16
+# outcome of the extraction of a release by the artifacts lambda, stored in the release status object
+RELEASE_STATUS_LIVE = 'live'
+RELEASE_STATUS_FAILED = 'failed'
+
+
+def get_release_prefix(release_id: str) -> str:
+    """
+    :param release_id: the id of the release
+    :return: the immutable folder containing the objects of the release
+    """
+    return f'{RELEASES_PREFIX}{release_id}/'
+
+
+def get_release_origin_path(release_id: Optional[str], stage: str = 'prod') -> str:
+    """
+    :param release_id: the id of the current release, None if the stage has never been released
+    :param stage: the stage of the website (prod or alpha)
+    :return: the origin path of the CloudFront distribution serving the release
+    """
+    if not release_id:
+        return f'/src/{stage}'
+    return '/' + get_release_prefix(release_id).rstrip('/')
+
+
+def get_legacy_prefix(stage: str) -> str:
+    """
+    :param stage: the stage of the website (prod or alpha)
+    :return: the folder served before the releases were introduced, overwritten at every publish
+    """
+    return f'src/{stage}/'
+
+
+def get_release_manifest_key(release_id: str) -> str:
+    """
+    :param release_id: the id of the release
+    :return: the key of the manifest of the release. It's uploaded last, so it exists only for complete releases
+    """
+    return get_release_prefix(release_id) + MANIFEST_FILE_NAME
+
+
+def get_release_status_key(stage: str, release_id: str) -> str:
+    """
+    :param stage: the stage of the website (prod or alpha)
+    :param release_id: the id of the release
+    :return: the key of the object written by the artifacts lambda once it served the release, or failed to
+    """
+    return f'releases/{stage}/{release_id}.json'
+
+
+def load_release_status(s3_client, bucket_name: str, stage: str, release_id: str) -> Optional[Dict]:
+    """
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :param stage: the stage of the website
+    :param release_id: the id of the release
+    :return: the status written by the artifacts lambda (status, invalidation_id, error, finished), None if the
+    lambda has not finished yet
+    """
+    try:
+        body = s3_client.get_object(Bucket=bucket_name, Key=get_release_status_key(stage, release_id))['Body'].read()
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(body)
+
+
+def get_release_id(manifest: Manifest) -> str:
+    """
+    The id of a release is the hash of its manifest: the same website always produces the same release
+
+    :param manifest: the manifest of the website
+    :return: the id of the release
+    """
+    content = json.dumps(manifest.entries, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(content).hexdigest()[:RELEASE_ID_LENGTH]
+
+
+def release_exists(s3_client, bucket_name: str, release_id: str) -> bool:
+    """
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :param release_id: the id of the release
+    :return: True if all the objects of the release have already been uploaded
+    """
+    try:
+        s3_client.head_object(Bucket=bucket_name, Key=get_release_manifest_key(release_id))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return False
+        raise
+    return True
+
+
+class ReleaseIndex(object):
+    """
+    The releases of a stage of the website, stored in the S3 bucket. The same index is updated by the artifacts
+    AWS Lambda function at the end of a publish.
+
+    Attributes:
+        stage: str          the stage of the website (prod or alpha)
+        current: str        the id of the release served by the CDN, None if the stage has never been released
+        releases: list      the published releases, oldest first: {id, published (ISO 8601), files}
+    """
+
+    def __init__(self, stage: str, current: Optional[str] = None, releases: Optional[List[Dict]] = None):
+        self.stage: str = stage
+        self.current: Optional[str] = current
+        self.releases: List[Dict] = releases if releases else []
+
+    @staticmethod
+    def get_key(stage: str) -> str:
+        return f'releases/{stage}.json'
+
+    @classmethod
+    def load(cls, s3_client, bucket_name: str, stage: str = 'prod') -> 'ReleaseIndex':
+        """
+        Load the index of the releases of a stage. If it doesn't exist, an empty one is returned
+
+        :param s3_client: the boto3 S3 client
+        :param bucket_name: the website bucket
+        :param stage: the stage of the website
+        :return: the index of the releases
+        """
+        try:
+            body = s3_client.get_object(Bucket=bucket_name, Key=cls.get_key(stage))['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404', 'NoSuchBucket'):
+                return cls(stage)
+            raise
+        content = json.loads(body)
+        if content.get('version') != RELEASE_INDEX_VERSION:
+            return cls(stage)
+        return cls(stage, current=content.get('current'), releases=content.get('releases', []))
+
+    def save(self, s3_client, bucket_name: str):
+        """
+        Store the index in the S3 bucket
+
+        :param s3_client: the boto3 S3 client
+        :param bucket_name: the website bucket
+        """
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=self.get_key(self.stage),
+            Body=json.dumps(
+                {'version': RELEASE_INDEX_VERSION, 'current': self.current, 'releases': self.releases},
+                indent=2).encode('utf-8'),
+            ContentType='application/json')
+
+    def get(self, release_id: str) -> Optional[Dict]:
+        """
+        :param release_id: the id of the release
+        :return: the last record of the release, None if it has never been published
+        """
+        for release in reversed(self.releases):
+            if release['id'] == release_id:
+                return release
+        return None
+
+    @property
+    def previous(self) -> Optional[str]:
+        """
+        The release published before the current one, the default target of a rollback
+        """
+        ids = [release['id'] for release in self.releases]
+        if self.current not in ids:
+            return None
+        position = len(ids) - 1 - ids[::-1].index(self.current)
+        for release_id in reversed(ids[:position]):
+            if release_id != self.current:
+                return release_id
+        return None
+
+    def add(self, release_id: str, files: int):
+        """
+        Record a new publish of a release and make it the current one
+
+        :param release_id: the id of the release
+        :param files: the number of files of the release
+        """
+        self.releases.append({
+            'id': release_id,
+            'published': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'files': files
+        })
+        self.current = release_id
+
+
+def switch_release(session, stack_name: str, release_id: str, stage: str = 'prod'):
+    """
+    Atomically point the CloudFront distribution of a stage to a release, updating the origin path of its S3 origin.
+    No object is uploaded or copied: the switch takes the time of a distribution update
+
+    :param session: the boto3 session to use
+    :param stack_name: the CloudFormation stack serving the website
+    :param release_id: the id of the release to serve
+    :param stage: the stage of the website
+    """
+    cloudfront_client = session.client('cloudfront')
+    distribution_id = get_distribution_id(session, stack_name, stage)
+    response = cloudfront_client.get_distribution_config(Id=distribution_id)
+    distribution_config = response['DistributionConfig']
+    origin_path = get_release_origin_path(release_id, stage)
+    origins = [origin for origin in distribution_config['Origins']['Items'] if 'S3OriginConfig' in origin]
+    if all(origin['OriginPath'] == origin_path for origin in origins):
+        return
+    for origin in origins:
+        origin['OriginPath'] = origin_path
+    cloudfront_client.update_distribution(
+        Id=distribution_id, IfMatch=response['ETag'], DistributionConfig=distribution_config)
+
+
+def load_published_manifest(s3_client, bucket_name: str, index: ReleaseIndex) -> Manifest:
+    """
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :param index: the index of the releases of the stage
+    :return: the manifest of the website currently served by the CDN, empty if unknown
+    """
+    if index.current:
+        return Manifest.load(s3_client, bucket_name, get_release_manifest_key(index.current))
+    return Manifest.load(s3_client, bucket_name, get_legacy_prefix(index.stage) + MANIFEST_FILE_NAME)
+
+
+def activate_release(session, configuration: Dict, index: ReleaseIndex, release_id: str, manifest: Manifest,
+                     published_manifest: Manifest, record: bool = True,
+                     timer: Optional[PhaseTimer] = None) -> Optional[str]:
+    """
+    Serve an uploaded release: restore its folder if the garbage collection emptied it, switch the CDN to it,
+    invalidate the paths that changed from the release previously served and update the index of the releases
+
+    :param session: the boto3 session to use
+    :param configuration: the configuration of the website
+    :param index: the index of the releases of the stage
+    :param release_id: the id of the release to serve
+    :param manifest: the manifest of the release to serve
+    :param published_manifest: the manifest of the release served until now
+    :param record: True to record a new publish of the release in the index, False for a rollback
+    :param timer: the timer measuring every phase, if any
+    :return: the id of the invalidation, None if no path changed
+    """
+    timer = timer if timer else PhaseTimer()
+    with timer.phase('materialize'):
+        # the folder of an old release may have been emptied by the garbage collection
+        BlobStore(session.client('s3'), configuration['bucket_name']).ensure_materialized(
+            manifest.entries, get_release_prefix(release_id))
+    with timer.phase('switch_release'):
+        switch_release(session, configuration['stack_name'], release_id, stage=index.stage)
+    with timer.phase('invalidate'):
+        invalidation_id = invalidate_distribution(
+            session, configuration['stack_name'], manifest.diff(published_manifest).to_invalidate,
+            max_paths=configuration.get('invalidation_max_paths', DEFAULT_MAX_INVALIDATION_PATHS), stage=index.stage)
+    with timer.phase('record_release'):
+        if record:
+            index.add(release_id, files=len(manifest.entries))
+        else:
+            index.current = release_id
+        index.save(session.client('s3'), configuration['bucket_name'])
+    with timer.phase('edge_function'):
+        update_cloud_front_function(session, configuration, list(manifest.entries), stage=index.stage)
+    return invalidation_id
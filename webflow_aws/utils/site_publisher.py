@@ -0,0 +1,287 @@
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import click
+import yaml
+
+from webflow_aws.global_variables import (
+    DEFAULT_PART_SIZE_MB, DEFAULT_TRANSFER_CONCURRENCY, DEFAULT_WAIT_TIMEOUT, LOCAL_STATE_FOLDER, MB)
+from webflow_aws.backend.networking.cloudfront_function import EDGE_RUNTIME_CLOUDFRONT_FUNCTION, get_edge_runtime
+from webflow_aws.utils.analyzer import analyze_artifact, get_budgets_configuration
+from webflow_aws.utils.aws_utils import get_session, get_upload_client
+from webflow_aws.utils.base_utils import CONFIGURATION_FILE_NAME, get_configuration
+from webflow_aws.utils.edge_function import update_cloud_front_function
+from webflow_aws.utils.infra import (
+    compute_infra_fingerprint, deploy_stack, get_deployed_fingerprints, save_deployed_fingerprint)
+from webflow_aws.utils.metrics import PhaseTimer
+from webflow_aws.utils.pipeline import build_package
+from webflow_aws.utils.publisher import IncrementalPublisher
+from webflow_aws.utils.localization import LOCALIZED_PAGES_CONFIGURATION_KEY, load_localized_pages
+from webflow_aws.utils.redirects import REDIRECTS_CONFIGURATION_KEY, load_website_redirects
+from webflow_aws.utils.releases import (
+    ReleaseIndex, activate_release, get_release_id, get_release_status_key, load_published_manifest, release_exists)
+from webflow_aws.utils.stages import PROD_STAGE, STAGING_STAGE, check_stage, get_staging_configuration
+from webflow_aws.utils.transfer import MultipartUploader
+from webflow_aws.utils.wait import wait_for_cdn, wait_for_extraction
+
+# folders never containing a website, skipped when looking for the sites
+SKIPPED_FOLDERS = (LOCAL_STATE_FOLDER, 'cdk.out', 'node_modules', '.git')
+
+
+def find_zip_file(folder: str) -> Optional[str]:
+    """
+    :param folder: the website folder
+    :return: the path of the zip file exported from Webflow, None if the folder doesn't contain it
+    """
+    zip_files = sorted(glob.glob(os.path.join(folder, '*.zip')))
+    return zip_files[0] if zip_files else None
+
+
+def find_sites(root: str) -> List[str]:
+    """
+    Find the website folders inside a directory tree: every folder containing a webflow-aws-config.yaml file
+
+    :param root: the root of the directory tree
+    :return: the website folders, sorted
+    """
+    sites = []
+    for folder, folders, files in os.walk(root):
+        folders[:] = [name for name in folders if name not in SKIPPED_FOLDERS]
+        if CONFIGURATION_FILE_NAME in files:
+            sites.append(folder)
+    return sorted(sites)
+
+
+def load_sites_file(path: str) -> List[str]:
+    """
+    Load the list of website folders from a yaml file, containing a list of folders relative to the file
+    (ex. `- marketing/site-a`)
+
+    :param path: the path of the yaml file
+    :return: the website folders
+    """
+    with open(path) as f:
+        folders = yaml.load(f, Loader=yaml.SafeLoader) or []
+    if not isinstance(folders, list):
+        raise click.ClickException(f'{path} must contain a list of website folders')
+    return [os.path.join(os.path.dirname(os.path.abspath(path)), str(folder)) for folder in folders]
+
+
+def _get_releases_context(s3_client, bucket_name: str) -> Dict[str, str]:
+    """
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :return: the cdk context with the release served by every stage, so that a deploy keeps serving them
+    """
+    context = {}
+    for context_key, stage in (('current_release', PROD_STAGE), ('current_staging_release', STAGING_STAGE)):
+        index = ReleaseIndex.load(s3_client, bucket_name, stage)
+        if index.current:
+            context[context_key] = index.current
+    return context
+
+
+def _republish_cloud_front_functions(session, configuration: Dict, s3_client, bucket_name: str):
+    """
+    The CloudFront Functions deployed by CDK don't have the lookup table of the pages: after a deploy, publish again
+    the function of every stage with the pages of the release it serves
+
+    :param session: the boto3 session to use
+    :param configuration: the configuration of the website, with the redirects loaded by load_website_redirects
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    """
+    if get_edge_runtime(configuration) != EDGE_RUNTIME_CLOUDFRONT_FUNCTION:
+        return
+    stages = (PROD_STAGE, STAGING_STAGE) if get_staging_configuration(configuration)['enabled'] else (PROD_STAGE,)
+    for stage in stages:
+        manifest = load_published_manifest(s3_client, bucket_name, ReleaseIndex.load(s3_client, bucket_name, stage))
+        if manifest.entries:
+            update_cloud_front_function(session, configuration, list(manifest.entries), stage=stage)
+
+
+def publish_site(session, configuration: Dict, folder: str = '.', stage: str = PROD_STAGE, incremental: bool = False,
+                 concurrency: int = DEFAULT_TRANSFER_CONCURRENCY, part_size: int = DEFAULT_PART_SIZE_MB * MB,
+                 force_infra: bool = False, quiet: bool = False, timer: Optional[PhaseTimer] = None,
+                 wait: bool = False, wait_timeout: int = DEFAULT_WAIT_TIMEOUT, enforce_budget: bool = False) -> str:
+    """
+    Publish the Webflow export contained in a website folder: deploy the infrastructure if it changed, then upload
+    the website as a new release. Only the files of the website folder are used, so many websites can be published
+    at the same time from different threads
+
+    :param session: the session to use, boto3 or CachedSession
+    :param configuration: the configuration of the website
+    :param folder: the website folder, containing the configuration and the zip file
+    :param stage: the stage to publish, prod or alpha (served by the staging distribution)
+    :param incremental: upload only the files changed since the last publish
+    :param concurrency: the number of parallel upload requests
+    :param part_size: the part size in bytes of the multipart uploads
+    :param force_infra: run cdk deploy even if the infrastructure didn't change
+    :param quiet: hide the progress bars and write the cdk output in the state folder instead of the console
+    :param timer: the timer measuring every phase of the publish, if any
+    :param wait: return only when the release is served by every CloudFront edge location
+    :param wait_timeout: the maximum number of seconds to wait for the release to be live
+    :param enforce_budget: analyze the zip file and fail before any deploy or upload if a budget is exceeded
+    :return: the id of the published release
+    """
+    timer = timer if timer else PhaseTimer()
+    # the wait timeout starts with the publish, the build and the upload are part of the time to live
+    deadline = time.monotonic() + wait_timeout
+    check_stage(configuration, stage)
+    # checked before any deploy or upload, the edge functions answer them
+    configuration = dict(configuration)
+    configuration[REDIRECTS_CONFIGURATION_KEY] = load_website_redirects(folder)
+    zip_path = find_zip_file(folder)
+    if not zip_path:
+        raise click.ClickException(f'The folder {folder} doesn\'t contain a .zip file')
+    configuration[LOCALIZED_PAGES_CONFIGURATION_KEY] = load_localized_pages(configuration, zip_path)
+    if enforce_budget:
+        with timer.phase('analyze'):
+            report = analyze_artifact(
+                zip_path, get_budgets_configuration(configuration),
+                redirects=configuration[REDIRECTS_CONFIGURATION_KEY])
+        if report.violations:
+            raise click.ClickException(
+                f'{configuration["domain_name"]}: the budgets are exceeded, the website has not been published:\n' +
+                '\n'.join(f'  - {violation}' for violation in report.violations))
+    state_folder = os.path.join(folder, LOCAL_STATE_FOLDER)
+    os.makedirs(state_folder, exist_ok=True)
+    s3_client = session.client('s3')
+    bucket_name = configuration['bucket_name']
+    with timer.phase('infra_check'):
+        infra_fingerprint = compute_infra_fingerprint(configuration)
+        infra_deployed = not force_infra and infra_fingerprint in get_deployed_fingerprints(
+            s3_client, bucket_name, folder=folder)
+    if infra_deployed:
+        click.echo(f'{configuration["domain_name"]}: the infrastructure is up to date, skipping cdk deploy')
+    else:
+        # the stack keeps serving the current releases, switched outside of CloudFormation
+        with timer.phase('cdk_deploy'):
+            if not deploy_stack(
+                    configuration, folder=folder, context=_get_releases_context(s3_client, bucket_name) or None,
+                    log_path=os.path.join(state_folder, 'cdk-deploy.log') if quiet else None):
+                raise click.ClickException('cdk deploy failed, the website has not been published')
+        save_deployed_fingerprint(s3_client, bucket_name, infra_fingerprint, folder=folder)
+        with timer.phase('edge_function'):
+            _republish_cloud_front_functions(session, configuration, s3_client, bucket_name)
+    if incremental:
+        publisher = IncrementalPublisher(
+            session=session, configuration=configuration, stage=stage, concurrency=concurrency, part_size=part_size,
+            state_folder=state_folder, show_progress=not quiet, timer=timer)
+        publisher.publish(zip_path)
+        if wait:
+            with timer.phase('wait'):
+                wait_for_cdn(session, configuration['stack_name'], stage, publisher.invalidation_id, deadline)
+        return ReleaseIndex.load(s3_client, bucket_name, stage).current
+    package_path = os.path.join(state_folder, 'package.zip')
+    manifest = build_package(zip_path, package_path, configuration, state_folder=state_folder, timer=timer)
+    release_id = get_release_id(manifest)
+    if release_exists(s3_client, bucket_name, release_id):
+        # the same website has already been published: serve it again without uploading it
+        index = ReleaseIndex.load(s3_client, bucket_name, stage)
+        invalidation_id = None
+        if index.current != release_id:
+            invalidation_id = activate_release(
+                session, configuration, index, release_id, manifest,
+                load_published_manifest(s3_client, bucket_name, index), timer=timer)
+        else:
+            # the release id doesn't cover the redirects, that may have changed without the files
+            with timer.phase('edge_function'):
+                update_cloud_front_function(session, configuration, list(manifest.entries), stage=stage)
+        if wait:
+            with timer.phase('wait'):
+                wait_for_cdn(session, configuration['stack_name'], stage, invalidation_id, deadline)
+    else:
+        # the artifacts lambda extracts the package in the release folder, switches the CDN of the stage to it and
+        # then publishes the CloudFront Function with the pages of the release
+        with timer.phase('upload'):
+            # the status of a previous upload of the same release (ex. failed) would be read as the outcome of this one
+            s3_client.delete_object(Bucket=bucket_name, Key=get_release_status_key(stage, release_id))
+            MultipartUploader(
+                s3_client=get_upload_client(session, configuration), concurrency=concurrency, part_size=part_size,
+                checkpoint_folder=state_folder, show_progress=not quiet).upload(
+                filename=package_path, bucket_name=bucket_name, key=f'artifacts/{stage}/{release_id}.zip')
+        if wait:
+            with timer.phase('wait'):
+                invalidation_id = wait_for_extraction(s3_client, bucket_name, stage, release_id, deadline)
+            # usually nothing to do, the lambda has already published the same code
+            with timer.phase('edge_function'):
+                update_cloud_front_function(session, configuration, list(manifest.entries), stage=stage)
+            with timer.phase('wait'):
+                wait_for_cdn(session, configuration['stack_name'], stage, invalidation_id, deadline)
+    os.remove(package_path)
+    return release_id
+
+
+class SiteResult(object):
+    """
+    The outcome of the publish of a website of a batch.
+
+    Attributes:
+        folder: str             the website folder
+        domain_name: str        the domain of the website, if the configuration could be read
+        release_id: str         the id of the published release, if the publish succeeded
+        error: str              the error that stopped the publish, if any
+        seconds: float          the duration of the publish
+        metrics: dict           the duration of every phase of the publish, see PhaseTimer.to_dict
+    """
+
+    def __init__(self, folder: str, domain_name: Optional[str] = None, release_id: Optional[str] = None,
+                 error: Optional[str] = None, seconds: float = 0, metrics: Optional[Dict] = None):
+        self.folder: str = folder
+        self.domain_name: Optional[str] = domain_name
+        self.release_id: Optional[str] = release_id
+        self.error: Optional[str] = error
+        self.seconds: float = seconds
+        self.metrics: Dict = metrics if metrics else {}
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+def format_summary(results: List[SiteResult]) -> str:
+    """
+    :param results: the results of the publish of every website
+    :return: a table with one row per website
+    """
+    rows = [('SITE', 'DOMAIN', 'STATUS', 'RELEASE', 'TIME')] + [(
+        result.folder, result.domain_name or '-', 'published' if result.succeeded else f'failed: {result.error}',
+        result.release_id or '-', f'{result.seconds:.1f}s') for result in results]
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]) - 1)]
+    return '\n'.join(
+        '  '.join(value.ljust(width) for value, width in zip(row, widths)) + '  ' + row[-1] for row in rows)
+
+
+def publish_sites(folders: List[str], jobs: int, **options) -> List[SiteResult]:
+    """
+    Publish many websites, jobs at a time. The failure of a website doesn't stop the others. The websites using the
+    same AWS profile share the same session and connection pools
+
+    :param folders: the website folders
+    :param jobs: the maximum number of websites published at the same time
+    :param options: the options of publish_site (stage, incremental, concurrency, part_size, force_infra, wait,
+    wait_timeout, enforce_budget)
+    :return: the result of every website, in the same order as the folders
+    """
+    def publish_folder(folder: str) -> SiteResult:
+        timer = PhaseTimer()
+        result = SiteResult(folder)
+        try:
+            with timer.phase('config'):
+                configuration = get_configuration(folder)
+            result.domain_name = configuration.get('domain_name')
+            result.release_id = publish_site(
+                get_session(configuration), configuration, folder=folder, quiet=True, timer=timer, **options)
+        except Exception as e:
+            result.error = str(e) or e.__class__.__name__
+        result.seconds = timer.total_seconds
+        result.metrics = timer.to_dict(
+            folder=folder, domain_name=result.domain_name, release_id=result.release_id, error=result.error)
+        return result
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(publish_folder, folders))
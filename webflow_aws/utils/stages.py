@@ -0,0 +1,35 @@
+from typing import Dict
+
+import click
+
+PROD_STAGE = 'prod'
+# the stage served by the staging distribution, used to verify a release before promoting it to prod
+STAGING_STAGE = 'alpha'
+STAGES = (PROD_STAGE, STAGING_STAGE)
+
+
+def get_staging_configuration(configuration: Dict) -> Dict:
+    """
+    Get the staging section of the configuration, with the default values
+
+    :param configuration: the configuration of the website
+    :return: a dict with the enabled and domain_name settings. Without a domain name, the staging distribution is
+    served on its CloudFront domain (ex. d111111abcdef8.cloudfront.net)
+    """
+    staging = configuration.get('staging') or {}
+    return {
+        'enabled': staging.get('enabled', False),
+        'domain_name': staging.get('domain_name')
+    }
+
+
+def check_stage(configuration: Dict, stage: str):
+    """
+    Check that a stage is served by the infrastructure of the website
+
+    :param configuration: the configuration of the website
+    :param stage: the stage of the website (prod or alpha)
+    """
+    if stage == STAGING_STAGE and not get_staging_configuration(configuration)['enabled']:
+        raise click.ClickException(
+            'The staging distribution is not enabled: set staging.enabled to true in webflow-aws-config.yaml')
@@ -0,0 +1,42 @@
+from typing import Dict, Optional
+
+from webflow_aws.global_variables import AWS_REGION_NAME
+
+# CloudFront reads the SSL certificates and the AWS Lambda @edge functions from this region only
+EDGE_REGION_NAME = AWS_REGION_NAME
+# the stack with the resources in EDGE_REGION_NAME, when the website is in another region
+EDGE_STACK_NAME_SUFFIX = '-edge'
+
+
+def get_storage_configuration(configuration: Dict) -> Dict:
+    """
+    Get the storage section of the configuration, with the default values
+
+    :param configuration: the configuration of the website
+    :return: a dict with the region of the bucket, of the artifacts lambda and of the stack, and the
+    transfer_acceleration flag of the bucket
+    """
+    storage = configuration.get('storage') or {}
+    return {
+        'region': storage.get('region') or AWS_REGION_NAME,
+        'transfer_acceleration': storage.get('transfer_acceleration', False)
+    }
+
+
+def get_region_name(configuration: Dict) -> str:
+    """
+    :param configuration: the configuration of the website
+    :return: the region of the stack of the website
+    """
+    return get_storage_configuration(configuration)['region']
+
+
+def get_edge_stack_name(configuration: Dict) -> Optional[str]:
+    """
+    :param configuration: the configuration of the website
+    :return: the name of the stack with the SSL certificate and the AWS Lambda @edge function, None if the website
+    is in EDGE_REGION_NAME and they are part of its stack
+    """
+    if get_region_name(configuration) == EDGE_REGION_NAME:
+        return None
+    return configuration['stack_name'] + EDGE_STACK_NAME_SUFFIX
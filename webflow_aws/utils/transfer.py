@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from botocore.exceptions import ClientError
+from tqdm import tqdm
+
+from webflow_aws.global_variables import DEFAULT_PART_SIZE_MB, DEFAULT_TRANSFER_CONCURRENCY, LOCAL_STATE_FOLDER, MB
+
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10000
+
+
+class MultipartUploader(object):
+    """
+    Uploads a file in the S3 bucket with a multipart upload whose parts are sent in parallel.
+    Every completed part is stored in a local checkpoint file, so that an interrupted upload of the same file
+    restarts from the parts still missing instead of from scratch.
+
+    Attributes:
+        concurrency: int            number of parts uploaded in parallel
+        part_size: int              size in bytes of every part (the last one can be smaller)
+        checkpoint_folder: str      folder where the checkpoint files are stored
+        show_progress: bool         show a progress bar with the upload throughput
+    """
+
+    def __init__(self, s3_client, concurrency: int = DEFAULT_TRANSFER_CONCURRENCY,
+                 part_size: int = DEFAULT_PART_SIZE_MB * MB, checkpoint_folder: str = LOCAL_STATE_FOLDER,
+                 show_progress: bool = True):
+        self.concurrency: int = concurrency
+        self.part_size: int = max(part_size, MIN_PART_SIZE)
+        self.checkpoint_folder: str = checkpoint_folder
+        self.show_progress: bool = show_progress
+        self._s3_client = s3_client
+        self._lock = threading.Lock()
+
+    def _get_checkpoint_path(self, bucket_name: str, key: str) -> str:
+        name = hashlib.sha1(f'{bucket_name}/{key}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.checkpoint_folder, f'upload-{name}.json')
+
+    def _load_checkpoint(self, checkpoint_path: str, file_info: Dict) -> Optional[Dict]:
+        """
+        Load the checkpoint of a previous upload, if it refers to the same file and the multipart upload is still
+        open on S3
+
+        :param checkpoint_path: the path of the checkpoint file
+        :param file_info: bucket, key, size, mtime and part size of the file to upload
+        :return: the checkpoint, or None if the upload has to start from scratch
+        """
+        if not os.path.exists(checkpoint_path):
+            return None
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if any(checkpoint.get(k) != v for k, v in file_info.items()):
+            return None
+        try:
+            # trust only the parts S3 received, with the same ETag stored locally
+            uploaded = {}
+            paginator = self._s3_client.get_paginator('list_parts')
+            for page in paginator.paginate(
+                    Bucket=file_info['bucket_name'], Key=file_info['key'], UploadId=checkpoint['upload_id']):
+                for part in page.get('Parts', []):
+                    uploaded[str(part['PartNumber'])] = part['ETag']
+        except ClientError:
+            return None
+        checkpoint['parts'] = {n: etag for n, etag in checkpoint['parts'].items() if uploaded.get(n) == etag}
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint_path: str, checkpoint: Dict):
+        os.makedirs(self.checkpoint_folder, exist_ok=True)
+        tmp_path = checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, checkpoint_path)
+
+    def upload(self, filename: str, bucket_name: str, key: str, extra_args: Optional[Dict] = None):
+        """
+        Upload a file, resuming the previous upload of the same file if it has been interrupted
+
+        :param filename: the path of the file to upload
+        :param bucket_name: the destination bucket
+        :param key: the destination key
+        :param extra_args: the additional parameters of the object, like ContentType
+        """
+        extra_args = extra_args if extra_args else {}
+        file_size = os.path.getsize(filename)
+        # S3 accepts at most 10000 parts per upload
+        part_size = max(self.part_size, -(-file_size // MAX_PARTS))
+        parts_count = max(1, -(-file_size // part_size))
+        file_info = {
+            'bucket_name': bucket_name,
+            'key': key,
+            'size': file_size,
+            'mtime': os.path.getmtime(filename),
+            'part_size': part_size
+        }
+        checkpoint_path = self._get_checkpoint_path(bucket_name, key)
+        checkpoint = self._load_checkpoint(checkpoint_path, file_info)
+        if checkpoint is None:
+            upload_id = self._s3_client.create_multipart_upload(Bucket=bucket_name, Key=key, **extra_args)['UploadId']
+            checkpoint = {**file_info, 'upload_id': upload_id, 'parts': {}}
+            self._save_checkpoint(checkpoint_path, checkpoint)
+        missing_parts = [n for n in range(1, parts_count + 1) if str(n) not in checkpoint['parts']]
+        uploaded_bytes = file_size - sum(min(part_size, file_size - (n - 1) * part_size) for n in missing_parts)
+
+        with tqdm(total=file_size, initial=uploaded_bytes, unit='B', unit_scale=True, unit_divisor=1024,
+                  desc=os.path.basename(filename), disable=not self.show_progress) as progress:
+            def upload_part(part_number: int):
+                with open(filename, 'rb') as f:
+                    f.seek((part_number - 1) * part_size)
+                    body = f.read(part_size)
+                etag = self._s3_client.upload_part(
+                    Bucket=bucket_name, Key=key, UploadId=checkpoint['upload_id'], PartNumber=part_number,
+                    Body=body)['ETag']
+                with self._lock:
+                    checkpoint['parts'][str(part_number)] = etag
+                    self._save_checkpoint(checkpoint_path, checkpoint)
+                progress.update(len(body))
+
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                # list() re-raises the first upload error, if any. The checkpoint is kept to resume the upload
+                list(executor.map(upload_part, missing_parts))
+
+        self._s3_client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=checkpoint['upload_id'],
+            MultipartUpload={'Parts': [
+                {'PartNumber': int(n), 'ETag': etag}
+                for n, etag in sorted(checkpoint['parts'].items(), key=lambda p: int(p[0]))]})
+        os.remove(checkpoint_path)
@@ -0,0 +1,81 @@
+import time
+from typing import Callable, Optional
+
+import click
+
+from webflow_aws.utils.aws_utils import get_distribution_id
+from webflow_aws.utils.releases import RELEASE_STATUS_FAILED, load_release_status
+
+# the first checks are close, since the artifacts lambda of a small website ends in a few seconds
+INITIAL_POLL_DELAY = 2
+MAX_POLL_DELAY = 30
+POLL_BACKOFF_FACTOR = 1.5
+
+
+def poll(check: Callable[[], Optional[object]], description: str, deadline: float):
+    """
+    Call check until it returns a value other than None, waiting between the calls with an exponential backoff
+
+    :param check: the function checking the condition. It raises a ClickException if the condition can't be met
+    :param description: what is awaited, used in the timeout error
+    :param deadline: the time.monotonic value after which the wait fails
+    :return: the value returned by check
+    """
+    delay = INITIAL_POLL_DELAY
+    while True:
+        result = check()
+        if result is not None:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise click.ClickException(f'Timed out waiting for {description}')
+        time.sleep(min(delay, remaining))
+        delay = min(delay * POLL_BACKOFF_FACTOR, MAX_POLL_DELAY)
+
+
+def wait_for_extraction(s3_client, bucket_name: str, stage: str, release_id: str, deadline: float) -> Optional[str]:
+    """
+    Wait until the artifacts lambda has extracted a release, switched the CDN to it and invalidated it
+
+    :param s3_client: the boto3 S3 client
+    :param bucket_name: the website bucket
+    :param stage: the stage of the website
+    :param release_id: the id of the release uploaded
+    :param deadline: the time.monotonic value after which the wait fails
+    :return: the id of the invalidation created by the lambda
+    """
+    def check():
+        status = load_release_status(s3_client, bucket_name, stage, release_id)
+        if not status:
+            return None
+        if status['status'] == RELEASE_STATUS_FAILED:
+            raise click.ClickException(f'The artifacts lambda failed to publish release {release_id}: '
+                                       f'{status.get("error")}')
+        return status
+
+    return poll(check, f'the artifacts lambda to publish release {release_id}', deadline).get('invalidation_id')
+
+
+def wait_for_cdn(session, stack_name: str, stage: str, invalidation_id: Optional[str], deadline: float):
+    """
+    Wait until the CloudFront distribution of a stage has deployed its last change (the switch of the release) to
+    all the edge locations and the invalidation is completed
+
+    :param session: the boto3 session to use
+    :param stack_name: the CloudFormation stack serving the website
+    :param stage: the stage of the website
+    :param invalidation_id: the id of the invalidation to wait for, None if nothing has been invalidated
+    :param deadline: the time.monotonic value after which the wait fails
+    """
+    cloudfront_client = session.client('cloudfront')
+    distribution_id = get_distribution_id(session, stack_name, stage)
+
+    def check():
+        if cloudfront_client.get_distribution(Id=distribution_id)['Distribution']['Status'] != 'Deployed':
+            return None
+        if invalidation_id and cloudfront_client.get_invalidation(
+                DistributionId=distribution_id, Id=invalidation_id)['Invalidation']['Status'] != 'Completed':
+            return None
+        return True
+
+    poll(check, f'the CloudFront distribution {distribution_id} to be deployed', deadline)
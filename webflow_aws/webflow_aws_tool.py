@@ -1,18 +1,15 @@
-import glob
-import json
-import os
-import shutil
-
-import boto3
 import click
-import emoji as emoji
 
-from webflow_aws.global_variables import AWS_REGION_NAME, GITHUB_REPOSITORY_URL
-from webflow_aws.utils.base_utils import configuration_yaml_exists, get_configuration
-from webflow_aws.utils.config_maker import ConfigMaker
+from webflow_aws.global_variables import (
+    DEFAULT_KEEP_RELEASES, DEFAULT_PART_SIZE_MB, DEFAULT_TRANSFER_CONCURRENCY, DEFAULT_WAIT_TIMEOUT,
+    GITHUB_REPOSITORY_URL, MB, VERSION)
+from webflow_aws.utils.stages import PROD_STAGE, STAGES, STAGING_STAGE, check_stage, get_staging_configuration
+
+# the commands import boto3, yaml and the processing stages when they run, so that --help, --version and the
+# argument errors don't pay for them: keep the module level imports light (checked by tests/test_startup.py)
 
 
-@click.version_option()
+@click.version_option(version=VERSION)
 @click.group()
 def cli():
     # eventually we can set a --verbose @click.option at this level. See https://www.youtube.com/watch?v=kNke39OZ2k0
@@ -21,11 +18,35 @@ def cli():
 
 
 @cli.command(short_help='Create the webflow-aws-config.yaml file')
-def create_config():
+@click.option('--from-env', is_flag=True, default=False,
+              help='Read the settings from the WEBFLOW_AWS_* environment variables instead of asking them')
+@click.option('--from-file', type=click.Path(exists=True, dir_okay=False),
+              help='Read the settings from this yaml file instead of asking them')
+def create_config(from_env: bool, from_file: str):
     """
     Creates the configuration file. If a file is already present, asks the user if he'd like to overwrite it or keep
     the current configuration.
+
+    With --from-env or --from-file the configuration is created without asking anything, for example in a CI, and
+    an existing file is overwritten. The settings are checked before calling AWS, then the account id and the hosted
+    zone name are read from AWS and cached for a day in ~/.webflow-aws/aws-lookups.json.
     """
+    from webflow_aws.utils.base_utils import configuration_yaml_exists
+    from webflow_aws.utils.config_maker import ConfigMaker, read_answers_from_env, read_answers_from_file
+
+    if from_env or from_file:
+        if from_env and from_file:
+            raise click.UsageError('Use either --from-env or --from-file')
+        config_maker = ConfigMaker()
+        errors = config_maker.load_answers(read_answers_from_env() if from_env else read_answers_from_file(from_file))
+        if errors:
+            raise click.ClickException('Invalid configuration:\n' + '\n'.join(f'  - {error}' for error in errors))
+        if not config_maker.resolve():
+            raise click.ClickException('The configuration has not been created')
+        config_maker.write_config()
+        click.echo(f'webflow-aws-config.yaml created for {config_maker.domain_name}')
+        return
+
     # check if configuration is not already present. In case it's present, ask the user confirmation to edit.
     config_exists = configuration_yaml_exists()
     if config_exists:
@@ -43,42 +64,336 @@ def create_config():
 
 
 @cli.command(short_help="Publish your website in production")
+@click.option('--stage', type=click.Choice(STAGES), default=PROD_STAGE, show_default=True,
+              help='The stage to publish: alpha is served by the staging distribution, see the promote command')
+@click.option('--incremental', is_flag=True, default=False,
+              help='Upload only the files that changed since the last publish, instead of the whole zip file')
+@click.option('--concurrency', type=click.IntRange(min=1), default=DEFAULT_TRANSFER_CONCURRENCY, show_default=True,
+              help='Number of parallel upload requests')
+@click.option('--part-size', type=click.IntRange(min=5), default=DEFAULT_PART_SIZE_MB, show_default=True,
+              help='Size in MB of every part of a multipart upload')
+@click.option('--force-infra', is_flag=True, default=False,
+              help='Run cdk deploy even if the infrastructure didn\'t change since the last deploy')
+@click.option('--metrics-json', type=click.Path(dir_okay=False),
+              help='Write the duration of every phase of the publish in this JSON file')
+@click.option('--profile', 'profile_path', type=click.Path(dir_okay=False),
+              help='Profile the publish with cProfile and write the stats in this pstats file')
+@click.option('--wait', is_flag=True, default=False,
+              help='Wait until the release is served by every CloudFront edge location, failing if it isn\'t')
+@click.option('--wait-timeout', type=click.IntRange(min=1), default=DEFAULT_WAIT_TIMEOUT, show_default=True,
+              help='Maximum number of seconds to wait for the release with --wait')
+@click.option('--enforce-budget', is_flag=True, default=False,
+              help='Analyze the zip file and fail before deploying if the budgets are exceeded, see analyze')
 @click.pass_context
-def publish(ctx):
+def publish(ctx, stage: str, incremental: bool, concurrency: int, part_size: int, force_infra: bool,
+            metrics_json: str, profile_path: str, wait: bool, wait_timeout: int, enforce_budget: bool):
     """
     Publish the zip file contained in the current folder. It uploads the file in the correct S3 bucket and once the
-    upload is finished, a trigger starts and the CDN invalidation starts
+    upload is finished, a trigger starts and the CDN invalidation starts.
+
+    Every publish creates an immutable release, served by switching the CDN origin once all its files are
+    uploaded: visitors never see a mix of old and new pages. See the releases and rollback commands.
+
+    With --stage alpha, the website is published on the staging distribution instead (the staging section of
+    webflow-aws-config.yaml must be enabled). Once verified, the promote command serves the same release in prod.
+
+    With --incremental, the zip file is unpacked locally and compared with the manifest of the last publish: only
+    the new and changed files are uploaded, the unchanged ones are copied inside the bucket.
+
+    The zip file is sent with a parallel multipart upload. If the upload is interrupted, running publish again
+    resumes it from the parts still missing.
+
+    The infrastructure is deployed with cdk only if the configuration or the webflow-aws version changed since the
+    last deploy, unless --force-infra is set.
+
+    The duration of every phase (cdk deploy, processing, upload, ...) is printed at the end and, with
+    --metrics-json, written in a JSON file.
+
+    With --wait, the command returns only once the release is live: extracted by the artifacts lambda, deployed on
+    every CloudFront edge location and invalidated. It fails if the lambda fails or after --wait-timeout seconds,
+    and prints the time to live, from the start of the publish.
+
+    With --enforce-budget, the zip file is analyzed as the analyze command does and the publish fails, before
+    deploying anything, if a budget of webflow-aws-config.yaml is exceeded.
     """
+    import emoji
+
+    from webflow_aws.utils.aws_utils import STAGING_DOMAIN_NAME_OUTPUT_KEY, get_session, get_stack_outputs
+    from webflow_aws.utils.base_utils import configuration_yaml_exists, get_configuration
+    from webflow_aws.utils.metrics import PhaseTimer, profile, write_metrics
+    from webflow_aws.utils.site_publisher import find_zip_file, publish_site
+
     # check if the configuration.yaml file exists
     if not configuration_yaml_exists():
-        ctx.forward(create_config)
+        ctx.invoke(create_config)
     # check if there's a .zip file inside the websites folder
-    zip_files = glob.glob('./*.zip')
-    if not zip_files:
+    if not find_zip_file('.'):
         click.echo('The folder doesn\'t contain a .zip file')
         return
-    configuration = get_configuration()
-    session = boto3.session.Session(
-        profile_name=configuration.get('aws_profile_name', 'default'),
-        region_name=AWS_REGION_NAME)
-    # nano cdk.json
-    with open('cdk.json', 'w') as outfile:
-        json.dump({'app': 'python3 app.py'}, outfile)
-    # cp app.py .
-    dest = shutil.copyfile(os.path.dirname(os.path.abspath(__file__)) + '/app.py', 'app.py')
-    # exec cdk deploy
-    os.system(f'cdk deploy --profile {configuration["aws_profile_name"]} --require-approval never --strict')
-    os.remove('cdk.json')
-    os.remove('app.py')
-    s3_resource = session.resource(service_name='s3')
-    s3_resource.meta.client.upload_file(
-        Bucket=configuration['bucket_name'],
-        Filename=zip_files[0],
-        Key=f'artifacts/prod/package.zip')
+    timer = PhaseTimer()
+    with profile(profile_path):
+        with timer.phase('config'):
+            configuration = get_configuration()
+        session = get_session(configuration)
+        release_id = publish_site(
+            session, configuration, stage=stage, incremental=incremental, concurrency=concurrency,
+            part_size=part_size * MB, force_infra=force_infra, timer=timer, wait=wait, wait_timeout=wait_timeout,
+            enforce_budget=enforce_budget)
+    time_to_live = timer.total_seconds if wait else None
+    click.echo(f'Publish timings: {timer.format_summary()}')
+    if wait:
+        click.echo(f'Release {release_id} is live, time to live {time_to_live:.1f}s')
+    if metrics_json:
+        write_metrics(metrics_json, timer.to_dict(
+            command='publish', domain_name=configuration['domain_name'], stage=stage, release_id=release_id,
+            incremental=incremental, time_to_live_seconds=round(time_to_live, 3) if wait else None))
     click.echo('')
     click.echo('------------------------------------------------------------------------------------------------')
     click.echo('')
+    if stage == STAGING_STAGE:
+        domain_name = get_staging_configuration(configuration)['domain_name'] or get_stack_outputs(
+            session, configuration['stack_name'])[STAGING_DOMAIN_NAME_OUTPUT_KEY]
+        click.echo(
+            f'Release {release_id} has been published on staging and you can visit it on https://{domain_name}. '
+            f'Run webflow-aws promote to serve it in production')
+        return
     click.echo(
         f'You website has been published and you can visit it on https://{configuration["domain_name"]}. '
         f'Thanks for using webflow-aws!\n'
         f'If you find our project useful, please {emoji.emojize(":star:")} us on github {GITHUB_REPOSITORY_URL}')
+
+
+@cli.command(short_help='Publish many websites in parallel')
+@click.argument('root', type=click.Path(exists=True, file_okay=False), default='.')
+@click.option('--sites-file', type=click.Path(exists=True, dir_okay=False),
+              help='Yaml file with the list of the website folders, instead of searching them in ROOT')
+@click.option('--jobs', type=click.IntRange(min=1), default=4, show_default=True,
+              help='Number of websites published at the same time')
+@click.option('--stage', type=click.Choice(STAGES), default=PROD_STAGE, show_default=True,
+              help='The stage to publish: alpha is served by the staging distribution, see the promote command')
+@click.option('--incremental', is_flag=True, default=False,
+              help='Upload only the files that changed since the last publish, instead of the whole zip file')
+@click.option('--concurrency', type=click.IntRange(min=1), default=DEFAULT_TRANSFER_CONCURRENCY, show_default=True,
+              help='Number of parallel upload requests of every website')
+@click.option('--part-size', type=click.IntRange(min=5), default=DEFAULT_PART_SIZE_MB, show_default=True,
+              help='Size in MB of every part of a multipart upload')
+@click.option('--force-infra', is_flag=True, default=False,
+              help='Run cdk deploy even if the infrastructure didn\'t change since the last deploy')
+@click.option('--metrics-json', type=click.Path(dir_okay=False),
+              help='Write the duration of every phase of the publish of every website in this JSON file')
+@click.option('--wait', is_flag=True, default=False,
+              help='Wait until the release is served by every CloudFront edge location, failing if it isn\'t')
+@click.option('--wait-timeout', type=click.IntRange(min=1), default=DEFAULT_WAIT_TIMEOUT, show_default=True,
+              help='Maximum number of seconds to wait for the release with --wait')
+@click.option('--enforce-budget', is_flag=True, default=False,
+              help='Fail the websites exceeding their budgets before deploying them, see analyze')
+def publish_all(root: str, sites_file: str, jobs: int, stage: str, incremental: bool, concurrency: int,
+                part_size: int, force_infra: bool, metrics_json: str, wait: bool, wait_timeout: int,
+                enforce_budget: bool):
+    """
+    Publish all the websites found in the ROOT directory tree (every folder with a webflow-aws-config.yaml file and
+    a .zip file), or listed in --sites-file. Up to --jobs websites are published at the same time, each one as the
+    publish command does. A failed website doesn't stop the others: a summary of all the websites is printed at the
+    end and the command fails if any website failed. The output of cdk is written in the .webflow-aws/cdk-deploy.log
+    file of every website. With --wait, a website is published only when its release is live, see the publish
+    command.
+    """
+    from webflow_aws.utils.metrics import write_metrics
+    from webflow_aws.utils.site_publisher import find_sites, format_summary, load_sites_file, publish_sites
+
+    folders = load_sites_file(sites_file) if sites_file else find_sites(root)
+    if not folders:
+        raise click.ClickException('No website found')
+    click.echo(f'Publishing {len(folders)} websites, {jobs} at a time')
+    results = publish_sites(
+        folders, jobs=jobs, stage=stage, incremental=incremental, concurrency=concurrency, part_size=part_size * MB,
+        force_infra=force_infra, wait=wait, wait_timeout=wait_timeout, enforce_budget=enforce_budget)
+    click.echo('')
+    click.echo(format_summary(results))
+    if metrics_json:
+        write_metrics(metrics_json, [result.metrics for result in results])
+    failed = [result for result in results if not result.succeeded]
+    if failed:
+        raise click.ClickException(f'{len(failed)} of {len(results)} websites failed')
+
+
+@cli.command(short_help='List the published releases')
+@click.option('--stage', type=click.Choice(STAGES), default=PROD_STAGE, show_default=True,
+              help='The stage of the releases')
+def releases(stage: str):
+    """
+    List the releases of a stage of the website, oldest first. The release currently served is marked with *
+    """
+    from webflow_aws.utils.aws_utils import get_session
+    from webflow_aws.utils.base_utils import configuration_yaml_exists, get_configuration
+    from webflow_aws.utils.releases import ReleaseIndex
+
+    if not configuration_yaml_exists():
+        raise click.ClickException('The folder doesn\'t contain the webflow-aws-config.yaml file')
+    configuration = get_configuration()
+    index = ReleaseIndex.load(get_session(configuration).client('s3'), configuration['bucket_name'], stage)
+    if not index.releases:
+        click.echo(f'The {stage} stage of the website has not been released yet')
+        return
+    current = index.get(index.current) if index.current else None
+    for release in index.releases:
+        marker = '*' if release is current else ' '
+        click.echo(f'{marker} {release["id"]}  {release["published"]}  {release["files"]} files')
+
+
+@cli.command(short_help='Serve a previous release')
+@click.argument('release_id', required=False)
+@click.option('--stage', type=click.Choice(STAGES), default=PROD_STAGE, show_default=True,
+              help='The stage to roll back')
+def rollback(release_id: str, stage: str):
+    """
+    Serve again a release already published, by default the one published before the current release. The CDN is
+    switched to the release folder: nothing is uploaded or extracted.
+    """
+    from webflow_aws.utils.aws_utils import get_session
+    from webflow_aws.utils.base_utils import configuration_yaml_exists, get_configuration
+    from webflow_aws.utils.manifest import Manifest
+    from webflow_aws.utils.releases import (
+        ReleaseIndex, activate_release, get_release_manifest_key, load_published_manifest, release_exists)
+    from webflow_aws.utils.redirects import REDIRECTS_CONFIGURATION_KEY, load_website_redirects
+
+    if not configuration_yaml_exists():
+        raise click.ClickException('The folder doesn\'t contain the webflow-aws-config.yaml file')
+    configuration = get_configuration()
+    check_stage(configuration, stage)
+    # the CloudFront Function is published again with the lookup tables
+    configuration[REDIRECTS_CONFIGURATION_KEY] = load_website_redirects()
+    session = get_session(configuration)
+    s3_client = session.client('s3')
+    index = ReleaseIndex.load(s3_client, configuration['bucket_name'], stage)
+    release_id = release_id if release_id else index.previous
+    if not release_id:
+        raise click.ClickException('There is no previous release to roll back to')
+    if not index.get(release_id) or not release_exists(s3_client, configuration['bucket_name'], release_id):
+        raise click.ClickException(f'Release {release_id} not found, run webflow-aws releases to list them')
+    if release_id == index.current:
+        click.echo(f'Release {release_id} is already served')
+        return
+    activate_release(
+        session, configuration, index, release_id,
+        Manifest.load(s3_client, configuration['bucket_name'], get_release_manifest_key(release_id)),
+        load_published_manifest(s3_client, configuration['bucket_name'], index), record=False)
+    click.echo(f'Release {release_id} is now served')
+
+
+@cli.command(short_help='Serve in production the release verified on staging')
+@click.argument('release_id', required=False)
+def promote(release_id: str):
+    """
+    Serve in production a release published on the alpha stage, by default the one currently served by the staging
+    distribution. Releases are immutable and shared by the stages, so nothing is uploaded or copied: the production
+    CDN is switched to the release folder and only the paths that changed from the release served until now are
+    invalidated.
+    """
+    from webflow_aws.utils.aws_utils import get_session
+    from webflow_aws.utils.base_utils import configuration_yaml_exists, get_configuration
+    from webflow_aws.utils.manifest import Manifest
+    from webflow_aws.utils.releases import (
+        ReleaseIndex, activate_release, get_release_manifest_key, load_published_manifest, release_exists)
+    from webflow_aws.utils.redirects import REDIRECTS_CONFIGURATION_KEY, load_website_redirects
+
+    if not configuration_yaml_exists():
+        raise click.ClickException('The folder doesn\'t contain the webflow-aws-config.yaml file')
+    configuration = get_configuration()
+    check_stage(configuration, STAGING_STAGE)
+    # the CloudFront Function is published again with the lookup tables
+    configuration[REDIRECTS_CONFIGURATION_KEY] = load_website_redirects()
+    session = get_session(configuration)
+    s3_client = session.client('s3')
+    staging_index = ReleaseIndex.load(s3_client, configuration['bucket_name'], STAGING_STAGE)
+    release_id = release_id if release_id else staging_index.current
+    if not release_id:
+        raise click.ClickException('There is no staging release to promote, publish one with --stage alpha')
+    if not staging_index.get(release_id) or not release_exists(s3_client, configuration['bucket_name'], release_id):
+        raise click.ClickException(
+            f'Release {release_id} not found, run webflow-aws releases --stage alpha to list them')
+    index = ReleaseIndex.load(s3_client, configuration['bucket_name'], PROD_STAGE)
+    if release_id == index.current:
+        click.echo(f'Release {release_id} is already served in production')
+        return
+    activate_release(
+        session, configuration, index, release_id,
+        Manifest.load(s3_client, configuration['bucket_name'], get_release_manifest_key(release_id)),
+        load_published_manifest(s3_client, configuration['bucket_name'], index))
+    click.echo(f'Release {release_id} is now served in production on https://{configuration["domain_name"]}')
+
+
+@cli.command(name='check-redirects', short_help='Check the redirects of the website')
+def check_redirects():
+    """
+    Check the redirects of the website, listed in the webflow-aws-redirects.csv (source,target on every line) or
+    webflow-aws-redirects.yaml (source: target) file, without calling AWS. Invalid paths, sources redirected to
+    different targets and loops are errors. Chains (/a -> /b -> /c) are collapsed, so that every redirect is
+    answered by the edge function with a single round trip. The publish runs the same checks.
+    """
+    from webflow_aws.utils.redirects import compile_redirects, find_redirects_file, read_redirects
+
+    path = find_redirects_file()
+    if not path:
+        raise click.ClickException('The folder doesn\'t contain a webflow-aws-redirects.csv or .yaml file')
+    compiled, warnings = compile_redirects(read_redirects(path))
+    for warning in warnings:
+        click.echo(f'Warning: {warning}')
+    click.echo(f'{len(compiled)} redirects are valid, {len(warnings)} chains collapsed')
+
+
+@cli.command(short_help='Analyze the website against its performance budgets')
+@click.argument('zip_path', type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option('--report-json', type=click.Path(dir_okay=False), help='Write the full report in this JSON file')
+@click.option('--enforce-budget', is_flag=True, default=False, help='Fail if a budget is exceeded')
+def analyze(zip_path: str, report_json: str, enforce_budget: bool):
+    """
+    Analyze the zip file exported from Webflow (by default the one of the current folder) without extracting it and
+    without calling AWS: the weight of every page (its html with the local stylesheets, scripts and images it loads),
+    the oversized and the duplicate files, and the broken internal links. The results are checked against the
+    budgets section of webflow-aws-config.yaml, when the file exists, or against the default budgets.
+    """
+    from webflow_aws.utils.analyzer import analyze_artifact, get_budgets_configuration, write_report
+    from webflow_aws.utils.base_utils import configuration_yaml_exists, get_configuration
+    from webflow_aws.utils.redirects import load_website_redirects
+    from webflow_aws.utils.site_publisher import find_zip_file
+
+    zip_path = zip_path if zip_path else find_zip_file('.')
+    if not zip_path:
+        raise click.ClickException('The folder doesn\'t contain a .zip file')
+    configuration = get_configuration() if configuration_yaml_exists() else {}
+    report = analyze_artifact(
+        zip_path, get_budgets_configuration(configuration), redirects=load_website_redirects(show_warnings=False))
+    click.echo(report.format_summary())
+    if report_json:
+        write_report(report_json, report)
+    if enforce_budget and report.violations:
+        raise click.ClickException(f'{len(report.violations)} budgets exceeded')
+
+
+@cli.command(short_help='Delete the old releases and the unused files')
+@click.option('--keep', type=click.IntRange(min=1), default=DEFAULT_KEEP_RELEASES, show_default=True,
+              help='Number of recent releases of every stage that can still be served')
+@click.option('--dry-run', is_flag=True, default=False, help='Show what would be deleted, without deleting it')
+def gc(keep: int, dry_run: bool):
+    """
+    Free the storage of the website bucket. The releases older than the last --keep of every stage are deleted. The
+    files of every stage are stored once in the blobs/ folder of the bucket: the folders of the kept releases that
+    are not served, nor the previous release of a stage, are emptied and restored from the blobs if the release is
+    served again (rollback or promote). Finally, the blobs not used by any kept release are deleted. Blobs and
+    releases written in the last 24 hours are never deleted, since a publish may be using them.
+    """
+    from webflow_aws.utils.aws_utils import get_session
+    from webflow_aws.utils.base_utils import configuration_yaml_exists, get_configuration
+    from webflow_aws.utils.garbage_collection import collect_garbage
+
+    if not configuration_yaml_exists():
+        raise click.ClickException('The folder doesn\'t contain the webflow-aws-config.yaml file')
+    configuration = get_configuration()
+    report = collect_garbage(
+        get_session(configuration).client('s3'), configuration['bucket_name'], keep=keep, dry_run=dry_run)
+    action = 'would be' if dry_run else 'have been'
+    click.echo(f'{len(report.deleted_releases)} releases {action} deleted: {", ".join(report.deleted_releases) or "-"}')
+    click.echo(f'{len(report.archived_releases)} releases {action} archived: '
+               f'{", ".join(report.archived_releases) or "-"}')
+    click.echo(f'{report.deleted_blobs} unused blobs {action} deleted, {report.freed_bytes / 1024 / 1024:.1f} MB freed')